@@ -1,6 +1,8 @@
 from logging.config import fileConfig
+from typing import Optional
 
 from sqlalchemy import engine_from_config
+from sqlalchemy.sql.schema import SchemaItem
 from sqlalchemy import pool
 
 from alembic import context
@@ -18,15 +20,39 @@ if config.config_file_name is not None:
 # for 'autogenerate' support
 # from myapp import mymodel
 # target_metadata = mymodel.Base.metadata
+from karaoke.config import load_database_config
 from karaoke.core.base import Base
 from karaoke.core.song import *
 from karaoke.core.user import *
 from karaoke.core.rating import *
 from karaoke.core.session import *
+from karaoke.core.song_search import SEARCH_TABLES
 
 target_metadata = Base.metadata
 
 
+def include_object(
+    object: SchemaItem,
+    name: Optional[str],
+    type_: str,
+    reflected: bool,
+    compare_to: Optional[SchemaItem],
+) -> bool:
+    # The search index is created by migrations and `song_search`, and
+    # autogenerate would otherwise drop it.
+    return not (type_ == "table" and name in SEARCH_TABLES)
+
+
+# Migrate the database the server and the CLI use, unless another one is
+# given with `alembic -x url=...`.
+config.set_main_option(
+    "sqlalchemy.url",
+    context.get_x_argument(as_dictionary=True).get(
+        "url", load_database_config().url
+    ),
+)
+
+
 # other values from the config, defined by the needs of env.py,
 # can be acquired:
 # my_important_option = config.get_main_option("my_important_option")
@@ -49,6 +75,7 @@ def run_migrations_offline() -> None:
     context.configure(
         url=url,
         target_metadata=target_metadata,
+        include_object=include_object,
         literal_binds=True,
         dialect_opts={"paramstyle": "named"},
     )
@@ -72,7 +99,9 @@ def run_migrations_online() -> None:
 
     with connectable.connect() as connection:
         context.configure(
-            connection=connection, target_metadata=target_metadata
+            connection=connection,
+            target_metadata=target_metadata,
+            include_object=include_object,
         )
 
         with context.begin_transaction():
@@ -0,0 +1,66 @@
+"""song youtube id
+
+Revision ID: 0f3b8e5d2c71
+Revises: a4f19c2e7b60
+Create Date: 2026-10-18 13:02:14.118903
+
+"""
+
+from typing import Optional, Sequence, Union
+import re
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = "0f3b8e5d2c71"
+down_revision: Union[str, None] = "a4f19c2e7b60"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# Frozen copy of `karaoke.core.song.parse_youtube_id`.
+YOUTUBE_ID_PATTERN = re.compile(r"(?:v=|\/)([0-9A-Za-z_-]{11}).*")
+
+
+def parse_youtube_id(url: str) -> Optional[str]:
+    is_youtube_url = "youtube.com" in url or "youtu.be" in url
+    if ("http" in url or "." in url) and not is_youtube_url:
+        return None
+    if not is_youtube_url:
+        url = f"https://www.youtube.com/watch?v={url}"
+    if (match := YOUTUBE_ID_PATTERN.search(url)) is None:
+        return None
+    return match.group(1)
+
+
+def upgrade() -> None:
+    op.add_column(
+        "song", sa.Column("youtube_id", sa.String(11), nullable=True)
+    )
+
+    song = sa.table(
+        "song",
+        sa.column("id", sa.Integer),
+        sa.column("video_link", sa.String),
+        sa.column("youtube_id", sa.String),
+    )
+    connection = op.get_bind()
+    rows = [
+        {"song_id": song_id, "youtube_id": youtube_id}
+        for song_id, video_link in connection.execute(
+            sa.select(song.c.id, song.c.video_link)
+        )
+        if (youtube_id := parse_youtube_id(video_link)) is not None
+    ]
+    if rows:
+        connection.execute(
+            song.update()
+            .where(song.c.id == sa.bindparam("song_id"))
+            .values(youtube_id=sa.bindparam("youtube_id")),
+            rows,
+        )
+
+
+def downgrade() -> None:
+    with op.batch_alter_table("song") as batch_op:
+        batch_op.drop_column("youtube_id")
@@ -0,0 +1,69 @@
+"""song rating aggregates
+
+Revision ID: 5b1e0c7a9f42
+Revises: d3ffc33b9de0
+Create Date: 2026-10-18 10:12:31.418204
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "5b1e0c7a9f42"
+down_revision: Union[str, None] = "d3ffc33b9de0"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column(
+        "song",
+        sa.Column(
+            "rating_score", sa.Integer(), nullable=False, server_default="0"
+        ),
+    )
+    op.add_column(
+        "song",
+        sa.Column(
+            "rating_count", sa.Integer(), nullable=False, server_default="0"
+        ),
+    )
+    op.create_index(
+        "ix_song_rating_score",
+        "song",
+        [sa.text("rating_score DESC"), "id"],
+    )
+
+    # Backfill from the existing ratings. Ratings are stored by name.
+    op.execute(
+        """
+        UPDATE song SET
+            rating_score = (
+                SELECT COALESCE(SUM(
+                    CASE rating
+                        WHEN 'DONT_KNOW' THEN -1
+                        WHEN 'SING_ALONG' THEN 1
+                        WHEN 'CAN_TAKE_THE_MIC' THEN 2
+                        WHEN 'NEED_THE_MIC' THEN 5
+                        ELSE 0
+                    END
+                ), 0)
+                FROM user_song_rating
+                WHERE user_song_rating.song_id = song.id
+            ),
+            rating_count = (
+                SELECT COUNT(*)
+                FROM user_song_rating
+                WHERE user_song_rating.song_id = song.id
+            )
+        """
+    )
+
+
+def downgrade() -> None:
+    op.drop_index("ix_song_rating_score", table_name="song")
+    op.drop_column("song", "rating_count")
+    op.drop_column("song", "rating_score")
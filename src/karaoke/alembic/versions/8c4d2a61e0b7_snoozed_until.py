@@ -0,0 +1,63 @@
+"""snoozed until
+
+Revision ID: 8c4d2a61e0b7
+Revises: 5b1e0c7a9f42
+Create Date: 2026-10-18 11:03:47.902115
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "8c4d2a61e0b7"
+down_revision: Union[str, None] = "5b1e0c7a9f42"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column(
+        "karaoke_session",
+        sa.Column(
+            "played_count", sa.Integer(), nullable=False, server_default="0"
+        ),
+    )
+    op.add_column(
+        "karaoke_session_song",
+        sa.Column(
+            "snoozed_until", sa.Integer(), nullable=False, server_default="0"
+        ),
+    )
+    # Every session starts counting from 0, so the remaining TTL is exactly
+    # the played count the song is snoozed until.
+    op.execute("UPDATE karaoke_session_song SET snoozed_until = snooze_ttl")
+    with op.batch_alter_table("karaoke_session_song") as batch_op:
+        batch_op.drop_column("snooze_ttl")
+
+
+def downgrade() -> None:
+    op.add_column(
+        "karaoke_session_song",
+        sa.Column(
+            "snooze_ttl", sa.Integer(), nullable=False, server_default="0"
+        ),
+    )
+    remaining = """
+        snoozed_until - (
+            SELECT played_count
+            FROM karaoke_session
+            WHERE karaoke_session.id = karaoke_session_song.karaoke_session_id
+        )
+    """
+    op.execute(
+        f"""
+        UPDATE karaoke_session_song
+        SET snooze_ttl = CASE WHEN {remaining} > 0 THEN {remaining} ELSE 0 END
+        """
+    )
+    with op.batch_alter_table("karaoke_session_song") as batch_op:
+        batch_op.drop_column("snoozed_until")
+    op.drop_column("karaoke_session", "played_count")
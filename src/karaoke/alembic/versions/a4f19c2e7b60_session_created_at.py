@@ -0,0 +1,37 @@
+"""session created at
+
+Revision ID: a4f19c2e7b60
+Revises: e27f9b3c5d18
+Create Date: 2026-10-18 12:20:31.540871
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "a4f19c2e7b60"
+down_revision: Union[str, None] = "e27f9b3c5d18"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column(
+        "karaoke_session",
+        sa.Column("created_at", sa.DateTime(), nullable=True),
+    )
+    # We don't know when existing sessions started, so treat them as new:
+    # their display IDs become reusable once SESSION_TTL passes.
+    op.execute("UPDATE karaoke_session SET created_at = CURRENT_TIMESTAMP")
+    with op.batch_alter_table("karaoke_session") as batch_op:
+        batch_op.alter_column(
+            "created_at", existing_type=sa.DateTime(), nullable=False
+        )
+
+
+def downgrade() -> None:
+    with op.batch_alter_table("karaoke_session") as batch_op:
+        batch_op.drop_column("created_at")
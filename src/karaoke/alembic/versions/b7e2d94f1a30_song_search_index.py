@@ -0,0 +1,74 @@
+"""song search index
+
+Revision ID: b7e2d94f1a30
+Revises: 0f3b8e5d2c71
+Create Date: 2026-10-18 14:02:47.815362
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "b7e2d94f1a30"
+down_revision: Union[str, None] = "0f3b8e5d2c71"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# Frozen copy of `karaoke.core.song_search.create_search_index`.
+CREATE_STATEMENTS = [
+    """
+    CREATE VIRTUAL TABLE IF NOT EXISTS song_search USING fts5(
+        title, artist,
+        content='song', content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2'
+    )
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS song_search_insert
+    AFTER INSERT ON song BEGIN
+        INSERT INTO song_search (rowid, title, artist)
+        VALUES (new.id, new.title, new.artist);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS song_search_delete
+    AFTER DELETE ON song BEGIN
+        INSERT INTO song_search (song_search, rowid, title, artist)
+        VALUES ('delete', old.id, old.title, old.artist);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS song_search_update
+    AFTER UPDATE OF title, artist ON song BEGIN
+        INSERT INTO song_search (song_search, rowid, title, artist)
+        VALUES ('delete', old.id, old.title, old.artist);
+        INSERT INTO song_search (rowid, title, artist)
+        VALUES (new.id, new.title, new.artist);
+    END
+    """,
+    "INSERT INTO song_search (song_search) VALUES ('rebuild')",
+]
+
+DROP_STATEMENTS = [
+    "DROP TRIGGER IF EXISTS song_search_insert",
+    "DROP TRIGGER IF EXISTS song_search_delete",
+    "DROP TRIGGER IF EXISTS song_search_update",
+    "DROP TABLE IF EXISTS song_search",
+]
+
+
+def upgrade() -> None:
+    # FTS5 is SQLite's; other databases search without an index.
+    if op.get_bind().dialect.name != "sqlite":
+        return
+    for statement in CREATE_STATEMENTS:
+        op.execute(statement)
+
+
+def downgrade() -> None:
+    if op.get_bind().dialect.name != "sqlite":
+        return
+    for statement in DROP_STATEMENTS:
+        op.execute(statement)
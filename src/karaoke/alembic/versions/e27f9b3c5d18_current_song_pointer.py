@@ -0,0 +1,76 @@
+"""current song pointer
+
+Revision ID: e27f9b3c5d18
+Revises: 8c4d2a61e0b7
+Create Date: 2026-10-18 11:41:09.377520
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.sql import expression
+
+# revision identifiers, used by Alembic.
+revision: str = "e27f9b3c5d18"
+down_revision: Union[str, None] = "8c4d2a61e0b7"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    with op.batch_alter_table("karaoke_session") as batch_op:
+        batch_op.add_column(
+            sa.Column("current_song_id", sa.Integer(), nullable=True)
+        )
+        batch_op.create_foreign_key(
+            "fk_karaoke_session_current_song_id_song",
+            "song",
+            ["current_song_id"],
+            ["id"],
+        )
+        batch_op.create_index(
+            "ix_karaoke_session_current_song_id", ["current_song_id"]
+        )
+
+    op.execute("""
+        UPDATE karaoke_session SET current_song_id = (
+            SELECT song_id
+            FROM karaoke_session_song
+            WHERE karaoke_session_song.karaoke_session_id = karaoke_session.id
+                AND karaoke_session_song.current_song
+            LIMIT 1
+        )
+        """)
+
+    with op.batch_alter_table("karaoke_session_song") as batch_op:
+        batch_op.drop_column("current_song")
+
+
+def downgrade() -> None:
+    op.add_column(
+        "karaoke_session_song",
+        sa.Column(
+            "current_song",
+            sa.Boolean(),
+            nullable=False,
+            server_default=expression.false(),
+        ),
+    )
+    op.execute("""
+        UPDATE karaoke_session_song SET current_song = EXISTS (
+            SELECT 1
+            FROM karaoke_session
+            WHERE karaoke_session.id = karaoke_session_song.karaoke_session_id
+                AND karaoke_session.current_song_id
+                    = karaoke_session_song.song_id
+        )
+        """)
+
+    with op.batch_alter_table("karaoke_session") as batch_op:
+        batch_op.drop_index("ix_karaoke_session_current_song_id")
+        batch_op.drop_constraint(
+            "fk_karaoke_session_current_song_id_song", type_="foreignkey"
+        )
+        batch_op.drop_column("current_song_id")
@@ -0,0 +1,73 @@
+"""Requests-per-second for the endpoints companion phones poll.
+
+Run with ``python -m karaoke.benchmarks.polling``. Pass
+``--per-request-engine`` to reproduce the old behaviour of building a new
+engine for every request, for a before/after comparison.
+"""
+
+import os
+import tempfile
+import time
+
+import click
+
+from karaoke import db
+from karaoke.benchmarks.synthetic import populate
+from karaoke.core.base import Base
+from karaoke.core.utils import create_karaoke_session
+
+POLLING_ENDPOINTS = [
+    "/api/get-current-song",
+    "/api/get-current-scores",
+]
+
+
+def setup_database(url: str, users: int, songs: int) -> str:
+    """Create a session with a song playing and return its display ID."""
+    db.configure(url)
+    Base.metadata.create_all(db.engine)
+    with db.session_factory() as session:
+        user_ids = populate(session, users=users, songs=songs, density=0.5)
+        karaoke_session = create_karaoke_session(user_ids, session)
+        karaoke_session.current_song_id = karaoke_session.songs[0].song_id
+        session.commit()
+        return karaoke_session.display_id
+
+
+def measure(path: str, requests: int) -> float:
+    from karaoke.server import app
+
+    client = app.test_client()
+    client.get(path)  # Warm up.
+    start = time.perf_counter()
+    for _ in range(requests):
+        client.get(path)
+    return requests / (time.perf_counter() - start)
+
+
+@click.command()
+@click.option("--requests", "-n", type=int, default=500)
+@click.option("--users", type=int, default=30)
+@click.option("--songs", type=int, default=300)
+@click.option("--per-request-engine", is_flag=True)
+def main(
+    requests: int, users: int, songs: int, per_request_engine: bool
+) -> None:
+    with tempfile.TemporaryDirectory() as tmp:
+        url = f"sqlite:///{os.path.join(tmp, 'bench.sqlite')}"
+        display_id = setup_database(url, users, songs)
+        if per_request_engine:
+            from karaoke.server import app
+
+            @app.before_request
+            def reconfigure() -> None:
+                db.configure(url)
+
+        for endpoint in POLLING_ENDPOINTS:
+            rps = measure(f"{endpoint}?s={display_id}", requests)
+            click.echo(f"{endpoint}: {rps:.1f} requests/s")
+        db.engine.dispose()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+"""Combined-score ranking of a session's queue, old vs. rating matrix.
+
+Run with ``python -m karaoke.benchmarks.scoring``.
+"""
+
+import time
+
+import click
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from karaoke.benchmarks.synthetic import populate
+from karaoke.core.base import Base
+from karaoke.core.rating import Rating
+from karaoke.core.session import KaraokeSession, KaraokeSessionSong
+from karaoke.core.utils import create_karaoke_session
+
+
+def legacy_combined_score(
+    karaoke_session: KaraokeSession, song: KaraokeSessionSong
+) -> int:
+    """`KaraokeSession.get_combined_score` before the rating matrix."""
+    score = 0
+    for user in karaoke_session.users:
+        score += karaoke_session.get_rating_score(
+            {rating.user: rating.rating for rating in song.song.ratings}.get(
+                user.user, Rating.DONT_KNOW
+            )
+        )
+    return score
+
+
+@click.command()
+@click.option("--users", type=int, default=50)
+@click.option("--songs", type=int, default=5000)
+@click.option("--density", type=float, default=0.5)
+def main(users: int, songs: int, density: float) -> None:
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(engine)
+    with sessionmaker(bind=engine)() as session:
+        user_ids = populate(session, users=users, songs=songs, density=density)
+        karaoke_session = create_karaoke_session(user_ids, session)
+        queue = list(karaoke_session.songs)
+        click.echo(f"{len(user_ids)} users, {len(queue)} songs in queue")
+
+        # Warm up the ORM relationships so both sides do only scoring.
+        for song in queue:
+            song.song.ratings
+        for user in karaoke_session.users:
+            user.user
+
+        start = time.perf_counter()
+        legacy = sorted(
+            queue,
+            key=lambda s: legacy_combined_score(karaoke_session, s),
+            reverse=True,
+        )
+        legacy_time = time.perf_counter() - start
+
+        karaoke_session.invalidate_rating_matrix()
+        start = time.perf_counter()
+        karaoke_session.get_rating_matrix()
+        build_time = time.perf_counter() - start
+        start = time.perf_counter()
+        ranked = karaoke_session.sort_by_combined_score(queue)
+        matrix_time = time.perf_counter() - start
+
+        assert ranked == legacy, "Rating matrix changed the ranking"
+        click.echo(f"legacy: {legacy_time * 1000:.1f} ms")
+        click.echo(
+            f"matrix: {matrix_time * 1000:.1f} ms "
+            f"(+ {build_time * 1000:.1f} ms to build)"
+        )
+
+
+if __name__ == "__main__":
+    main()
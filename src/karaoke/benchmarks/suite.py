@@ -0,0 +1,253 @@
+"""Latency and SQL statement counts of the song selection hot paths.
+
+Run with ``kr bench`` (or ``python -m karaoke.benchmarks.suite``). Every
+operation runs against the same seeded synthetic catalog, with `random`
+reseeded before each iteration, so two runs with the same options do the
+same work. ``--output`` writes the results as JSON and ``--baseline``
+compares against such a file.
+"""
+
+from dataclasses import dataclass, field
+from typing import Any, Callable, Optional
+import importlib.metadata
+import json
+import logging
+import math
+import platform
+import random
+import time
+
+import click
+from sqlalchemy import create_engine
+from sqlalchemy.orm import Session, sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from karaoke.benchmarks.synthetic import populate
+from karaoke.core.base import Base
+from karaoke.core.live_session import LiveSessionState
+from karaoke.core.session import KaraokeSession, KaraokeSessionUser
+from karaoke.core.simulation import simulate_playlist
+from karaoke.core.utils import create_karaoke_session, get_any_unrated_song
+from karaoke.query_stats import track_queries
+
+
+def percentile(values: list[float], p: float) -> float:
+    """Nearest-rank percentile of `values`."""
+    ordered = sorted(values)
+    return ordered[max(math.ceil(p / 100 * len(ordered)) - 1, 0)]
+
+
+@dataclass
+class Result:
+    durations: list[float] = field(default_factory=list)
+    statements: list[int] = field(default_factory=list)
+
+    def summary(self) -> dict[str, float]:
+        durations_ms = [d * 1000 for d in self.durations]
+        return {
+            "iterations": len(self.durations),
+            "p50_ms": percentile(durations_ms, 50),
+            "p95_ms": percentile(durations_ms, 95),
+            "max_ms": max(durations_ms),
+            "statements": sum(self.statements) / len(self.statements),
+        }
+
+
+@dataclass
+class Context:
+    session: Session
+    user_ids: list[int]
+    # Used by the transition benchmarks; one per benchmark, created lazily.
+    karaoke_sessions: dict[str, KaraokeSession] = field(default_factory=dict)
+
+    def karaoke_session(self, name: str) -> KaraokeSession:
+        if name not in self.karaoke_sessions:
+            random.seed(0)
+            self.karaoke_sessions[name] = create_karaoke_session(
+                self.user_ids, self.session
+            )
+        return self.karaoke_sessions[name]
+
+
+def bench_create_karaoke_session(context: Context) -> Callable[[], Any]:
+    return lambda: create_karaoke_session(context.user_ids, context.session)
+
+
+def bench_generate_song_queue(context: Context) -> Callable[[], Any]:
+    # The users are added outside of the timed part.
+    karaoke_session = KaraokeSession()
+    karaoke_session.generate_display_id(context.session)
+    context.session.add_all(
+        KaraokeSessionUser(
+            karaoke_session_id=karaoke_session.id, user_id=user_id
+        )
+        for user_id in context.user_ids
+    )
+    context.session.commit()
+    return lambda: karaoke_session.generate_song_queue(context.session)
+
+
+def bench_get_next_song(context: Context) -> Callable[[], Any]:
+    karaoke_session = context.karaoke_session("get_next_song")
+
+    def run() -> None:
+        karaoke_session.mark_current_song_as_played(session=context.session)
+        karaoke_session.get_next_song(session=context.session)
+        context.session.commit()
+
+    return run
+
+
+def bench_live_get_next_song(context: Context) -> Callable[[], Any]:
+    state = LiveSessionState.load(
+        context.karaoke_session("live_get_next_song"), context.session
+    )
+
+    def run() -> None:
+        state.mark_current_song_as_played()
+        state.get_next_song()
+
+    return run
+
+
+def bench_get_any_unrated_song(context: Context) -> Callable[[], Any]:
+    return lambda: get_any_unrated_song(
+        random.choice(context.user_ids), context.session
+    )
+
+
+def bench_simulate_playlist(context: Context) -> Callable[[], Any]:
+    return lambda: simulate_playlist(context.user_ids, context.session)
+
+
+# Each benchmark sets up its state and returns the operation to time.
+BENCHMARKS: dict[str, Callable[[Context], Callable[[], Any]]] = {
+    "create_karaoke_session": bench_create_karaoke_session,
+    "generate_song_queue": bench_generate_song_queue,
+    "get_next_song": bench_get_next_song,
+    "live_get_next_song": bench_live_get_next_song,
+    "get_any_unrated_song": bench_get_any_unrated_song,
+    "simulate_playlist": bench_simulate_playlist,
+}
+
+# Benchmarks that change what they measure each time, so only run once.
+SINGLE_SHOT = {"generate_song_queue"}
+
+
+def run_benchmark(
+    name: str, context: Context, iterations: int, seed: int
+) -> Result:
+    operation = BENCHMARKS[name](context)
+    result = Result()
+    for iteration in range(1 if name in SINGLE_SHOT else iterations):
+        random.seed(seed + iteration)
+        with track_queries() as stats:
+            start = time.perf_counter()
+            operation()
+            result.durations.append(time.perf_counter() - start)
+        result.statements.append(stats.count)
+        context.session.expire_all()
+    return result
+
+
+def karaoke_version() -> str:
+    try:
+        return importlib.metadata.version("karaoke")
+    except importlib.metadata.PackageNotFoundError:
+        return "unknown"
+
+
+# (label, summary key, decimals, unit) of each number printed per benchmark.
+REPORTED = [
+    ("p50", "p50_ms", 3, " ms"),
+    ("p95", "p95_ms", 3, " ms"),
+    ("statements", "statements", 1, ""),
+]
+
+
+def format_change(current: float, baseline: Optional[float]) -> str:
+    if not baseline:
+        return ""
+    return f" ({(current - baseline) / baseline:+.0%})"
+
+
+@click.command()
+@click.option("--users", type=int, default=30)
+@click.option("--songs", type=int, default=2000)
+@click.option("--density", type=float, default=0.5)
+@click.option("--seed", type=int, default=0)
+@click.option("--iterations", "-n", type=int, default=20)
+@click.option(
+    "--only",
+    type=click.Choice(list(BENCHMARKS)),
+    multiple=True,
+    help="Benchmarks to run (default: all)",
+)
+@click.option(
+    "--output", "-o", type=click.Path(dir_okay=False), help="Write JSON here"
+)
+@click.option(
+    "--baseline",
+    type=click.Path(exists=True, dir_okay=False),
+    help="JSON results of an earlier run to compare with",
+)
+def main(
+    users: int,
+    songs: int,
+    density: float,
+    seed: int,
+    iterations: int,
+    only: tuple[str, ...],
+    output: Optional[str],
+    baseline: Optional[str],
+) -> None:
+    logging.disable(logging.WARNING)
+    baseline_results: dict[str, dict[str, float]] = {}
+    if baseline is not None:
+        with open(baseline) as file:
+            baseline_results = json.load(file)["results"]
+
+    engine = create_engine("sqlite://", poolclass=StaticPool)
+    Base.metadata.create_all(engine)
+    results: dict[str, dict[str, float]] = {}
+    with sessionmaker(bind=engine)() as session:
+        user_ids = populate(
+            session, users=users, songs=songs, density=density, seed=seed
+        )
+        context = Context(session=session, user_ids=user_ids)
+        for name in only or BENCHMARKS:
+            summary = run_benchmark(name, context, iterations, seed).summary()
+            results[name] = summary
+            previous = baseline_results.get(name, {})
+            click.echo(
+                f"{name}: "
+                + ", ".join(
+                    f"{label} {summary[key]:.{precision}f}{unit}"
+                    + format_change(summary[key], previous.get(key))
+                    for label, key, precision, unit in REPORTED
+                )
+            )
+
+    if output is not None:
+        with open(output, "w") as file:
+            json.dump(
+                {
+                    "version": karaoke_version(),
+                    "python": platform.python_version(),
+                    "parameters": {
+                        "users": users,
+                        "songs": songs,
+                        "density": density,
+                        "seed": seed,
+                        "iterations": iterations,
+                    },
+                    "results": results,
+                },
+                file,
+                indent=2,
+            )
+            file.write("\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+import random
+
+from sqlalchemy import insert
+from sqlalchemy.orm import Session
+
+from karaoke.core.rating import (
+    UserSongRating,
+    Rating,
+    refresh_rating_aggregates,
+)
+from karaoke.core.song import Song
+from karaoke.core.user import User
+
+RATINGS = [
+    Rating.DONT_KNOW,
+    Rating.SING_ALONG,
+    Rating.CAN_TAKE_THE_MIC,
+    Rating.NEED_THE_MIC,
+]
+
+
+def populate(
+    session: Session,
+    *,
+    users: int,
+    songs: int,
+    density: float,
+    seed: int = 0,
+) -> list[int]:
+    """Fill `session` with a synthetic catalog and return the user IDs.
+
+    Each user rates roughly `density` of the catalog with a uniformly random
+    rating. The same seed always produces the same data.
+    """
+    rng = random.Random(seed)
+
+    user_ids = [
+        row[0]
+        for row in session.execute(
+            insert(User).returning(User.id, sort_by_parameter_order=True),
+            [{"name": f"user{i}"} for i in range(users)],
+        )
+    ]
+    song_ids = [
+        row[0]
+        for row in session.execute(
+            insert(Song).returning(Song.id, sort_by_parameter_order=True),
+            [
+                {
+                    "title": f"Song {i}",
+                    "artist": f"Artist {i % max(songs // 10, 1)}",
+                    "video_link": f"https://videos.example/{i}.mp4",
+                }
+                for i in range(songs)
+            ],
+        )
+    ]
+    session.execute(
+        insert(UserSongRating),
+        [
+            {
+                "user_id": user_id,
+                "song_id": song_id,
+                "rating": rng.choice(RATINGS),
+            }
+            for user_id in user_ids
+            for song_id in song_ids
+            if rng.random() < density
+        ],
+    )
+    # The bulk insert bypasses `rate_songs`, which keeps these up to date.
+    refresh_rating_aggregates(song_ids, session)
+    session.commit()
+    return user_ids
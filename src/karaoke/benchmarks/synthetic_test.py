@@ -0,0 +1,15 @@
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+
+from karaoke.benchmarks.synthetic import populate
+from karaoke.core.rating import UserSongRating
+from karaoke.core.song import Song
+
+
+def test_populate_sets_rating_aggregates(session: Session) -> None:
+    populate(session, users=5, songs=20, density=0.5)
+
+    ratings = session.query(func.count()).select_from(UserSongRating).scalar()
+    assert ratings > 0
+    assert session.query(func.sum(Song.rating_count)).scalar() == ratings
+    assert session.query(func.max(Song.rating_score)).scalar() > 0
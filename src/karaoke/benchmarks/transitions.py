@@ -0,0 +1,63 @@
+"""Latency of a player transition (mark as played + pick the next song).
+
+Compares the in-memory `LiveSessionState` with the ORM-backed
+`KaraokeSession`. Run with ``python -m karaoke.benchmarks.transitions``.
+"""
+
+import logging
+import statistics
+import time
+
+import click
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from karaoke.benchmarks.synthetic import populate
+from karaoke.core.base import Base
+from karaoke.core.live_session import LiveSessionState
+from karaoke.core.utils import create_karaoke_session
+
+
+def report(name: str, durations: list[float]) -> None:
+    durations_ms = sorted(d * 1000 for d in durations)
+    click.echo(
+        f"{name}: p50 {statistics.median(durations_ms):.3f} ms, "
+        f"max {durations_ms[-1]:.3f} ms"
+    )
+
+
+@click.command()
+@click.option("--users", type=int, default=30)
+@click.option("--songs", type=int, default=2000)
+@click.option("--picks", type=int, default=100)
+def main(users: int, songs: int, picks: int) -> None:
+    logging.disable(logging.WARNING)
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(engine)
+    with sessionmaker(bind=engine)() as session:
+        user_ids = populate(session, users=users, songs=songs, density=0.5)
+        karaoke_session = create_karaoke_session(user_ids, session)
+        state = LiveSessionState.load(karaoke_session, session)
+
+        live: list[float] = []
+        for _ in range(picks):
+            start = time.perf_counter()
+            state.mark_current_song_as_played()
+            state.get_next_song()
+            live.append(time.perf_counter() - start)
+
+        orm: list[float] = []
+        for _ in range(picks):
+            start = time.perf_counter()
+            karaoke_session.mark_current_song_as_played(session=session)
+            session.commit()
+            karaoke_session.get_next_song(session=session)
+            session.commit()
+            orm.append(time.perf_counter() - start)
+
+    report("live state", live)
+    report("ORM", orm)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,9 +1,9 @@
 from typing import Optional
+import time
 
 import click
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker
 
+from karaoke import db
 from karaoke.core.utils import get_any_unrated_song, create_karaoke_session
 from karaoke.core.user import User
 from karaoke.core.song import Song
@@ -13,6 +13,17 @@ from karaoke.core.session import (
     KaraokeSessionSong,
     KaraokeSessionUser,
 )
+from karaoke.core.simulation import simulate_playlist
+from karaoke.core.catalog import (
+    FORMATS,
+    export_songs,
+    format_from_path,
+    import_ratings,
+    import_songs,
+    read_ratings,
+    read_songs,
+    write_songs,
+)
 from karaoke.core.base import Base
 import logging
 
@@ -22,9 +33,6 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
-LOCAL_DB = "sqlite:///karaoke.sqlite"
-ECHO = False
-
 
 def format_song(song: Song) -> str:
     return (
@@ -35,16 +43,14 @@ def format_song(song: Song) -> str:
 
 @click.command()
 def _init_db() -> None:
-    engine = create_engine(LOCAL_DB, echo=ECHO)
-    Base.metadata.create_all(engine)
+    Base.metadata.create_all(db.engine)
     click.echo("Initialized database.")
 
 
 @click.command()
 @click.option("--name", "-n", type=str, help="Name")
 def _create_user(name: Optional[str]) -> None:
-    engine = create_engine(LOCAL_DB, echo=ECHO)
-    with sessionmaker(bind=engine)() as session:
+    with db.session_factory() as session:
         if name is None:
             name = click.prompt("Name")
         user = User(name=name)
@@ -55,8 +61,7 @@ def _create_user(name: Optional[str]) -> None:
 
 @click.command()
 def _list_users() -> None:
-    engine = create_engine(LOCAL_DB, echo=ECHO)
-    with sessionmaker(bind=engine)() as session:
+    with db.session_factory() as session:
         all_users = session.query(User).all()
         click.echo(f"Found {len(all_users)} users:")
         for user in all_users:
@@ -66,8 +71,7 @@ def _list_users() -> None:
 @click.command()
 @click.option("--user-id", "-u", type=int, help="User ID")
 def _rate_song(user_id: int) -> None:
-    engine = create_engine(LOCAL_DB, echo=ECHO)
-    with sessionmaker(bind=engine)() as session:
+    with db.session_factory() as session:
         user: Optional[User] = (
             session.query(User).filter_by(id=user_id).first()
         )
@@ -101,11 +105,7 @@ def _rate_song(user_id: int) -> None:
             for score, rating in sorted(ratings.items()):
                 click.echo(f"{score}: {rating_names[rating]}")
             score = click.prompt("Score", type=int)
-            user_song_rating = UserSongRating(
-                user_id=user.id, song_id=unrated_song.id, rating=ratings[score]
-            )
-            session.add(user_song_rating)
-            session.commit()
+            user.rate_song(unrated_song, ratings[score], session=session)
             click.echo()
 
 
@@ -114,8 +114,7 @@ def _rate_song(user_id: int) -> None:
 @click.option("--artist", "-a", type=str, help="Artist")
 @click.option("--video-link", "-l", type=str, help="Video Link")
 def _create_song(title: str, artist: str, video_link: str) -> None:
-    engine = create_engine(LOCAL_DB, echo=ECHO)
-    with sessionmaker(bind=engine)() as session:
+    with db.session_factory() as session:
         if title is None:
             title = click.prompt("Title")
         if artist is None:
@@ -130,19 +129,102 @@ def _create_song(title: str, artist: str, video_link: str) -> None:
 
 @click.command()
 def _list_songs() -> None:
-    engine = create_engine(LOCAL_DB, echo=ECHO)
-    with sessionmaker(bind=engine)() as session:
+    with db.session_factory() as session:
         all_songs = session.query(Song).all()
         click.echo(f"Found {len(all_songs)} songs:")
         for song in all_songs:
             click.echo(f"{song.id}: {format_song(song)}")
 
 
+def _catalog_format(path: str, catalog_format: Optional[str]) -> str:
+    if catalog_format is not None:
+        return catalog_format
+    try:
+        return format_from_path(path)
+    except ValueError as e:
+        raise click.BadParameter(str(e), param_hint="--format")
+
+
+@click.command()
+@click.argument("path", type=click.Path(exists=True, dir_okay=False))
+@click.option(
+    "--format",
+    "-f",
+    "catalog_format",
+    type=click.Choice(FORMATS),
+    help="File format (default: from the extension)",
+)
+def _import_songs(path: str, catalog_format: Optional[str]) -> None:
+    catalog_format = _catalog_format(path, catalog_format)
+    start = time.perf_counter()
+    with db.session_factory() as session, open(
+        path, newline="", encoding="utf-8"
+    ) as file:
+        try:
+            result = import_songs(read_songs(file, catalog_format), session)
+        except ValueError as e:
+            raise click.ClickException(f"{path}: {e}")
+    elapsed = time.perf_counter() - start
+    click.echo(
+        f"Imported {result.imported} songs "
+        f"({result.duplicates} duplicates skipped) in {elapsed:.2f}s, "
+        f"{(result.imported + result.duplicates) / elapsed:.0f} songs/s"
+    )
+
+
+@click.command()
+@click.argument("path", type=click.Path(exists=True, dir_okay=False))
+@click.option(
+    "--format",
+    "-f",
+    "catalog_format",
+    type=click.Choice(FORMATS),
+    help="File format (default: from the extension)",
+)
+def _import_ratings(path: str, catalog_format: Optional[str]) -> None:
+    catalog_format = _catalog_format(path, catalog_format)
+    start = time.perf_counter()
+    with db.session_factory() as session, open(
+        path, newline="", encoding="utf-8"
+    ) as file:
+        try:
+            count = import_ratings(read_ratings(file, catalog_format), session)
+        except ValueError as e:
+            raise click.ClickException(f"{path}: {e}")
+    elapsed = time.perf_counter() - start
+    click.echo(
+        f"Imported {count} ratings in {elapsed:.2f}s, "
+        f"{count / elapsed:.0f} ratings/s"
+    )
+
+
+@click.command()
+@click.argument("path", type=click.Path(dir_okay=False, writable=True))
+@click.option(
+    "--format",
+    "-f",
+    "catalog_format",
+    type=click.Choice(FORMATS),
+    help="File format (default: from the extension)",
+)
+def _export_songs(path: str, catalog_format: Optional[str]) -> None:
+    catalog_format = _catalog_format(path, catalog_format)
+    start = time.perf_counter()
+    with db.session_factory() as session, open(
+        path, "w", newline="", encoding="utf-8"
+    ) as file:
+        count = write_songs(export_songs(session), file, catalog_format)
+    elapsed = time.perf_counter() - start
+    click.echo(
+        f"Exported {count} songs in {elapsed:.2f}s, "
+        f"{count / elapsed:.0f} songs/s"
+    )
+
+
 @click.command()
 @click.option("--user-id", "-u", type=int, help="User ID", multiple=True)
 def _create_session(user_id: list[int]) -> None:
-    engine = create_engine(LOCAL_DB, echo=ECHO)
-    with sessionmaker(bind=engine)() as session:
+    with db.session_factory() as session:
         karaoke_session = create_karaoke_session(
             session=session, user_ids=user_id
         )
@@ -151,8 +233,7 @@ def _create_session(user_id: list[int]) -> None:
 
 @click.command()
 def _list_sessions() -> None:
-    engine = create_engine(LOCAL_DB, echo=ECHO)
-    with sessionmaker(bind=engine)() as session:
+    with db.session_factory() as session:
         all_karaoke_sessions = session.query(KaraokeSession).all()
         click.echo(f"Found {len(all_karaoke_sessions)} sessions:")
         for ksession in all_karaoke_sessions:
@@ -168,8 +249,7 @@ def _list_sessions() -> None:
 @click.command()
 @click.option("--session-id", "-s", type=str, help="Session ID")
 def _next_song(session_id: str) -> None:
-    engine = create_engine(LOCAL_DB, echo=ECHO)
-    with sessionmaker(bind=engine)() as session:
+    with db.session_factory() as session:
         karaoke_session = (
             session.query(KaraokeSession)
             .filter_by(display_id=session_id)
@@ -187,6 +267,42 @@ def _next_song(session_id: str) -> None:
         karaoke_session.mark_current_song_as_played(session=session)
 
 
+@click.command()
+@click.option("--user-id", "-u", type=int, help="User ID", multiple=True)
+@click.option("--limit", "-n", type=int, help="Stop after this many songs")
+def _simulate_session(user_id: list[int], limit: Optional[int]) -> None:
+    with db.session_factory() as session:
+        playlist = simulate_playlist(list(user_id), session, limit=limit)
+        songs_by_id: dict[int, Song] = {
+            song.id: song
+            for song in session.query(Song).filter(
+                Song.id.in_(entry.song_id for entry in playlist)
+            )
+        }
+        for index, entry in enumerate(playlist, start=1):
+            scores = ", ".join(
+                f"{uid}: {score}" for uid, score in entry.scores.items()
+            )
+            click.echo(
+                f"{index}. {format_song(songs_by_id[entry.song_id])} "
+                f"({scores})"
+            )
+
+
+@click.command(
+    context_settings={"ignore_unknown_options": True},
+    add_help_option=False,
+)
+@click.argument("args", nargs=-1, type=click.UNPROCESSED)
+def _bench(args: tuple[str, ...]) -> None:
+    """Benchmark the song selection hot paths."""
+    # Only import the suite when it runs. Its own options, --help included,
+    # are parsed by `karaoke.benchmarks.suite.main`.
+    from karaoke.benchmarks.suite import main
+
+    main.main(list(args), prog_name="kr bench")
+
+
 @click.group()
 def _cli() -> None:
     pass
@@ -219,15 +335,21 @@ _cli.add_command(_user, name="user")
 _user.add_command(_create_user, name="create")
 _user.add_command(_list_users, name="list")
 _user.add_command(_rate_song, name="rate")
+_user.add_command(_import_ratings, name="import-ratings")
 
 _cli.add_command(_song, name="song")
 _song.add_command(_create_song, name="create")
 _song.add_command(_list_songs, name="list")
+_song.add_command(_import_songs, name="import")
+_song.add_command(_export_songs, name="export")
+
+_cli.add_command(_bench, name="bench")
 
 _cli.add_command(_session, name="session")
 _session.add_command(_create_session, name="create")
 _session.add_command(_list_sessions, name="list")
 _session.add_command(_next_song, name="next")
+_session.add_command(_simulate_session, name="simulate")
 
 
 def main() -> None:
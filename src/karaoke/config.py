@@ -0,0 +1,160 @@
+"""Settings shared by the server, the CLI and migrations.
+
+A setting comes from its environment variable if that's set, otherwise from
+the config file, otherwise it has a default. The config file is TOML, read
+from `$KARAOKE_CONFIG` or `karaoke.toml` in the working directory::
+
+    [database]
+    url = "postgresql+psycopg://karaoke@localhost/karaoke"
+    pool_size = 10
+
+    [server]
+    port = 8000
+    redis_url = "redis://localhost:6379/0"
+
+PostgreSQL needs a driver installed, e.g. `pip install psycopg`.
+"""
+
+from dataclasses import dataclass, fields
+from typing import Any, Mapping, Optional, TypeVar
+import os
+import tomllib
+
+DEFAULT_CONFIG_FILE = "karaoke.toml"
+
+T = TypeVar("T")
+
+
+@dataclass(frozen=True)
+class DatabaseConfig:
+    url: str = "sqlite:///karaoke.sqlite"
+    pool_size: int = 5
+    max_overflow: int = 10
+    pool_timeout: float = 30
+    echo: bool = False
+
+
+# Environment variable of each `DatabaseConfig` field.
+DATABASE_ENVIRONMENT = {
+    "url": "KARAOKE_DB_URL",
+    "pool_size": "KARAOKE_DB_POOL_SIZE",
+    "max_overflow": "KARAOKE_DB_MAX_OVERFLOW",
+    "pool_timeout": "KARAOKE_DB_POOL_TIMEOUT",
+    "echo": "KARAOKE_DB_ECHO",
+}
+
+
+@dataclass(frozen=True)
+class ServerConfig:
+    host: str = "0.0.0.0"
+    port: int = 5000
+    # Worker threads of the production server. Every open companion or
+    # splash page holds one for its event stream, so this must leave room
+    # for other requests above `max_event_streams`.
+    threads: int = 32
+    # Event streams open at once, per process. Pages beyond that poll for
+    # changes instead. Raise it along with `threads` for bigger parties.
+    max_event_streams: int = 24
+    # Use Flask's development server, with the reloader and debugger.
+    debug: bool = False
+    # Share live sessions with the other processes using this Redis server,
+    # e.g. "redis://localhost:6379/0". Empty to keep them in this process.
+    redis_url: str = ""
+    # cProfile requests into this directory, see `karaoke.profiling`. Empty
+    # to turn profiling off.
+    profile_dir: str = ""
+    # Fraction of requests to profile, on top of those asking for it.
+    profile_sample_rate: float = 0.0
+    # Picks per session to keep a decision trace of, see `/api/pick-trace`.
+    # Tracing is off when this is 0.
+    pick_trace_size: int = 0
+
+    def __post_init__(self) -> None:
+        if not 0 <= self.profile_sample_rate <= 1:
+            raise ValueError(
+                "Invalid value for profile_sample_rate:"
+                f" {self.profile_sample_rate!r}"
+            )
+        if self.pick_trace_size < 0:
+            raise ValueError(
+                f"Invalid value for pick_trace_size: {self.pick_trace_size!r}"
+            )
+
+
+SERVER_ENVIRONMENT = {
+    "host": "KARAOKE_HOST",
+    "port": "KARAOKE_PORT",
+    "threads": "KARAOKE_THREADS",
+    "max_event_streams": "KARAOKE_MAX_EVENT_STREAMS",
+    "debug": "KARAOKE_DEBUG",
+    "redis_url": "KARAOKE_REDIS_URL",
+    "profile_dir": "KARAOKE_PROFILE_DIR",
+    "profile_sample_rate": "KARAOKE_PROFILE_SAMPLE_RATE",
+    "pick_trace_size": "KARAOKE_PICK_TRACE_SIZE",
+}
+
+
+def config_file_path(environ: Mapping[str, str] = os.environ) -> str:
+    return environ.get("KARAOKE_CONFIG", DEFAULT_CONFIG_FILE)
+
+
+def read_config_file(path: str) -> dict[str, Any]:
+    """The parsed config file, or nothing if there's no file at `path`."""
+    try:
+        with open(path, "rb") as file:
+            return tomllib.load(file)
+    except FileNotFoundError:
+        return {}
+
+
+def _parse(value: Any, kind: type, name: str) -> Any:
+    if kind is bool and isinstance(value, str):
+        if value.lower() in ("1", "true", "yes", "on"):
+            return True
+        if value.lower() in ("0", "false", "no", "off", ""):
+            return False
+        raise ValueError(f"Invalid value for {name}: {value!r}")
+    try:
+        return kind(value)
+    except ValueError:
+        raise ValueError(f"Invalid value for {name}: {value!r}")
+
+
+def _load_section(
+    config_class: type[T],
+    section_name: str,
+    environment: dict[str, str],
+    path: Optional[str],
+    environ: Mapping[str, str],
+) -> T:
+    section = read_config_file(path or config_file_path(environ)).get(
+        section_name, {}
+    )
+    known = {
+        field.name: field for field in fields(config_class)  # type: ignore
+    }
+    if unknown := set(section) - set(known):
+        raise ValueError(f"Unknown {section_name} settings: {sorted(unknown)}")
+
+    values: dict[str, Any] = {}
+    for name, field in known.items():
+        value = environ.get(environment[name], section.get(name))
+        if value is not None:
+            values[name] = _parse(value, field.type, name)  # type: ignore
+    return config_class(**values)
+
+
+def load_database_config(
+    path: Optional[str] = None, environ: Mapping[str, str] = os.environ
+) -> DatabaseConfig:
+    return _load_section(
+        DatabaseConfig, "database", DATABASE_ENVIRONMENT, path, environ
+    )
+
+
+def load_server_config(
+    path: Optional[str] = None, environ: Mapping[str, str] = os.environ
+) -> ServerConfig:
+    return _load_section(
+        ServerConfig, "server", SERVER_ENVIRONMENT, path, environ
+    )
@@ -0,0 +1,74 @@
+from pathlib import Path
+
+from pytest import raises
+
+from karaoke.config import (
+    DatabaseConfig,
+    ServerConfig,
+    load_database_config,
+    load_server_config,
+)
+
+
+def write_config(tmp_path: Path, text: str) -> str:
+    path = tmp_path / "karaoke.toml"
+    path.write_text(text)
+    return str(path)
+
+
+def test_defaults(tmp_path: Path) -> None:
+    missing = str(tmp_path / "missing.toml")
+    assert load_database_config(missing, environ={}) == DatabaseConfig()
+
+
+def test_environment_overrides_file(tmp_path: Path) -> None:
+    path = write_config(
+        tmp_path,
+        '[database]\nurl = "postgresql:///karaoke"\npool_size = 20\n',
+    )
+
+    config = load_database_config(
+        environ={
+            "KARAOKE_CONFIG": path,
+            "KARAOKE_DB_POOL_SIZE": "3",
+            "KARAOKE_DB_ECHO": "true",
+        }
+    )
+
+    assert config == DatabaseConfig(
+        url="postgresql:///karaoke", pool_size=3, echo=True
+    )
+
+
+def test_invalid_settings(tmp_path: Path) -> None:
+    path = write_config(tmp_path, "[database]\npool = 3\n")
+    with raises(ValueError, match="Unknown database settings"):
+        load_database_config(path, environ={})
+
+    with raises(ValueError, match="Invalid value for pool_size"):
+        load_database_config(
+            path=str(tmp_path / "missing.toml"),
+            environ={"KARAOKE_DB_POOL_SIZE": "many"},
+        )
+
+
+def test_server_config(tmp_path: Path) -> None:
+    path = write_config(tmp_path, "[server]\nport = 8000\nthreads = 8\n")
+
+    config = load_server_config(
+        path,
+        environ={
+            "KARAOKE_DEBUG": "1",
+            "KARAOKE_REDIS_URL": "redis://localhost/1",
+        },
+    )
+
+    assert config == ServerConfig(
+        port=8000, threads=8, debug=True, redis_url="redis://localhost/1"
+    )
+    with raises(ValueError, match="Invalid value for profile_sample_rate"):
+        load_server_config(
+            path, environ={"KARAOKE_PROFILE_SAMPLE_RATE": "1.5"}
+        )
+    with raises(ValueError, match="Invalid value for pick_trace_size"):
+        load_server_config(path, environ={"KARAOKE_PICK_TRACE_SIZE": "-1"})
@@ -0,0 +1,40 @@
+"""Database fixtures shared by the tests.
+
+Tests run against in-memory SQLite, or against the database at
+`$KARAOKE_TEST_DB_URL` if it's set, e.g. a local PostgreSQL server::
+
+    createdb karaoke_test
+    KARAOKE_TEST_DB_URL=postgresql+psycopg:///karaoke_test pytest
+
+That database's tables are dropped and recreated for every test.
+"""
+
+from typing import Iterator, Optional
+import os
+
+from pytest import fixture
+from sqlalchemy import Engine
+from sqlalchemy.orm import Session, sessionmaker
+
+from karaoke.core.base import Base
+from karaoke.core.session import KaraokeSession  # noqa: F401 (all tables)
+from karaoke.db import create_db_engine
+
+TEST_DB_URL: Optional[str] = os.environ.get("KARAOKE_TEST_DB_URL")
+
+
+@fixture
+def engine() -> Iterator[Engine]:
+    engine = create_db_engine(TEST_DB_URL or "sqlite://")
+    Base.metadata.drop_all(engine)
+    Base.metadata.create_all(engine)
+    yield engine
+    if TEST_DB_URL:
+        Base.metadata.drop_all(engine)
+    engine.dispose()
+
+
+@fixture
+def session(engine: Engine) -> Iterator[Session]:
+    with sessionmaker(bind=engine)() as session:
+        yield session
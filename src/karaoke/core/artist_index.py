@@ -0,0 +1,131 @@
+from bisect import bisect_left, insort
+from typing import Optional
+import re
+import threading
+import time
+
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+
+from karaoke.core.song import Song
+from karaoke.core.song_search import strip_diacritics
+
+# Seconds before the index is reloaded, to pick up songs added by other
+# processes or the CLI.
+MAX_AGE = 300.0
+
+
+def fold(text: str) -> str:
+    """`text` as it's compared when completing: no case or diacritics."""
+    return strip_diacritics(text).casefold()
+
+
+def _word_starts(artist: str) -> list[str]:
+    """Every suffix of the folded name that starts a word.
+
+    "The Beatles" can then be completed from "the" and from "beat".
+    """
+    folded = fold(artist)
+    return [folded[match.start() :] for match in re.finditer(r"\w+", folded)]
+
+
+class ArtistIndex:
+    """Artist names kept in memory for prefix autocompletion.
+
+    Names are kept as a sorted array of (word start, name) pairs, so a
+    completion is a binary search plus a scan of the results, whatever the
+    size of the catalog. The index is loaded from the database on first
+    use and reloaded every `max_age` seconds (never, if it's None). Call
+    `add` and `remove` when a song's artist is added or goes away.
+    """
+
+    def __init__(self, max_age: Optional[float] = MAX_AGE) -> None:
+        self._max_age = max_age
+        self._lock = threading.Lock()
+        # Number of songs by each artist, None until loaded.
+        self._song_counts: Optional[dict[str, int]] = None
+        self._keys: list[tuple[str, str]] = []
+        self._loaded_at = 0.0
+        # Bumped by every change, so a load can tell whether it missed one.
+        self._generation = 0
+
+    def complete(
+        self, prefix: str, session: Session, *, limit: int
+    ) -> list[str]:
+        """Up to `limit` artists with a word starting with `prefix`.
+
+        Artists are ordered by the matching word, then by name.
+        """
+        self._load_if_stale(session)
+        key = fold(prefix)
+        artists: list[str] = []
+        with self._lock:
+            index = bisect_left(self._keys, (key,))
+            while index < len(self._keys) and len(artists) < limit:
+                word_start, artist = self._keys[index]
+                if not word_start.startswith(key):
+                    break
+                if artist not in artists:
+                    artists.append(artist)
+                index += 1
+        return artists
+
+    def add(self, artist: str) -> None:
+        """Count another song by `artist`."""
+        with self._lock:
+            self._generation += 1
+            if self._song_counts is None:
+                return
+            self._song_counts[artist] = self._song_counts.get(artist, 0) + 1
+            if self._song_counts[artist] == 1:
+                for word_start in _word_starts(artist):
+                    insort(self._keys, (word_start, artist))
+
+    def remove(self, artist: str) -> None:
+        """Count one song less by `artist`, dropping it after its last."""
+        with self._lock:
+            self._generation += 1
+            if self._song_counts is None or artist not in self._song_counts:
+                return
+            self._song_counts[artist] -= 1
+            if self._song_counts[artist] > 0:
+                return
+            del self._song_counts[artist]
+            for word_start in _word_starts(artist):
+                index = bisect_left(self._keys, (word_start, artist))
+                if self._keys[index : index + 1] == [(word_start, artist)]:
+                    del self._keys[index]
+
+    def invalidate(self) -> None:
+        """Reload from the database on next use."""
+        with self._lock:
+            self._generation += 1
+            self._song_counts = None
+
+    def _load_if_stale(self, session: Session) -> None:
+        with self._lock:
+            if self._song_counts is not None and (
+                self._max_age is None
+                or time.monotonic() - self._loaded_at < self._max_age
+            ):
+                return
+            generation = self._generation
+
+        song_counts: dict[str, int] = dict(
+            session.query(Song.artist, func.count())
+            .group_by(Song.artist)
+            .all()
+        )
+        keys = sorted(
+            (word_start, artist)
+            for artist in song_counts
+            for word_start in _word_starts(artist)
+        )
+        with self._lock:
+            if self._generation != generation:
+                # The query may have run before that change was committed.
+                # Keep what we had and load again next time.
+                return
+            self._song_counts = song_counts
+            self._keys = keys
+            self._loaded_at = time.monotonic()
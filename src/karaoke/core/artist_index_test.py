@@ -0,0 +1,54 @@
+from sqlalchemy import event
+from sqlalchemy.orm import ORMExecuteState, Session
+
+from karaoke.core.artist_index import ArtistIndex
+from karaoke.core.song import Song
+
+
+def test_complete(session: Session) -> None:
+    session.add_all(
+        Song(title=f"song{i}", artist=artist, video_link="")
+        for i, artist in enumerate(
+            ["The Beatles", "Beyoncé", "Beyoncé", "אריק איינשטיין", "ABBA"]
+        )
+    )
+    session.commit()
+    index = ArtistIndex()
+
+    assert index.complete("be", session, limit=10) == [
+        "The Beatles",
+        "Beyoncé",
+    ]
+    assert index.complete("BEYONCE", session, limit=10) == ["Beyoncé"]
+    assert index.complete("איי", session, limit=10) == ["אריק איינשטיין"]
+    assert index.complete("", session, limit=2) == ["ABBA", "The Beatles"]
+    assert index.complete("x", session, limit=10) == []
+
+    index.add("Beck")
+    index.remove("Beyoncé")
+    assert index.complete("be", session, limit=10) == [
+        "The Beatles",
+        "Beck",
+        "Beyoncé",
+    ]
+    index.remove("Beyoncé")
+    index.remove("The Beatles")
+    assert index.complete("be", session, limit=10) == ["Beck"]
+
+    index.invalidate()
+    assert index.complete("be", session, limit=1) == ["The Beatles"]
+
+
+def test_load_missing_a_change_is_discarded(session: Session) -> None:
+    session.add(Song(title="song", artist="The Beatles", video_link=""))
+    session.commit()
+    index = ArtistIndex()
+
+    @event.listens_for(session, "do_orm_execute", once=True)
+    def add_song_meanwhile(state: ORMExecuteState) -> None:
+        index.add("Beck")
+
+    assert index.complete("be", session, limit=10) == []
+    session.add(Song(title="song", artist="Beck", video_link=""))
+    session.commit()
+    assert index.complete("be", session, limit=10) == ["The Beatles", "Beck"]
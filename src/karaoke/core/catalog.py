@@ -0,0 +1,184 @@
+from dataclasses import dataclass
+from typing import IO, Iterable, Iterator
+import csv
+import itertools
+import json
+import unicodedata
+
+from sqlalchemy import insert, select
+from sqlalchemy.orm import Session
+
+from karaoke.core.rating import Rating, rate_songs
+from karaoke.core.song import Song, parse_youtube_id
+
+# Columns of an exported catalog, and the ones an import needs.
+SONG_FIELDS = ("title", "artist", "video_link")
+
+# Columns of a ratings file. Ratings are given by name, e.g. NEED_THE_MIC.
+RATING_FIELDS = ("user_id", "song_id", "rating")
+
+FORMATS = ("csv", "jsonl")
+
+# Rows written per executemany.
+BATCH_SIZE = 1000
+
+
+@dataclass
+class ImportResult:
+    imported: int = 0
+    # Songs that were already in the catalog, or earlier in the same file.
+    duplicates: int = 0
+
+
+def format_from_path(path: str) -> str:
+    for catalog_format in FORMATS:
+        if path.lower().endswith(f".{catalog_format}"):
+            return catalog_format
+    raise ValueError(f"Can't tell the format of {path}, expected {FORMATS}")
+
+
+def song_key(artist: str, title: str) -> tuple[str, str]:
+    """What makes two songs the same, ignoring case and spacing."""
+
+    def normalize(text: str) -> str:
+        return " ".join(unicodedata.normalize("NFKC", text).casefold().split())
+
+    return normalize(artist), normalize(title)
+
+
+def _read_rows(
+    file: IO[str], catalog_format: str, fields: tuple[str, ...], what: str
+) -> Iterator[dict[str, str]]:
+    if catalog_format == "csv":
+        rows: Iterable[dict[str, str]] = csv.DictReader(file)
+    elif catalog_format == "jsonl":
+        rows = (json.loads(line) for line in file if line.strip())
+    else:
+        raise ValueError(f"Unknown format {catalog_format}")
+
+    for line_number, row in enumerate(rows, start=1):
+        if missing := [
+            field for field in fields if row.get(field) in (None, "")
+        ]:
+            raise ValueError(
+                f"{what} {line_number} has no {', '.join(missing)}"
+            )
+        yield {field: str(row[field]).strip() for field in fields}
+
+
+def read_songs(file: IO[str], catalog_format: str) -> Iterator[dict[str, str]]:
+    return _read_rows(file, catalog_format, SONG_FIELDS, "Song")
+
+
+def read_ratings(
+    file: IO[str], catalog_format: str
+) -> Iterator[tuple[int, int, Rating]]:
+    """(user ID, song ID, rating) for each line of a ratings file."""
+    for line_number, row in enumerate(
+        _read_rows(file, catalog_format, RATING_FIELDS, "Rating"), start=1
+    ):
+        try:
+            rating = Rating[row["rating"]]
+            user_id, song_id = int(row["user_id"]), int(row["song_id"])
+        except (KeyError, ValueError):
+            raise ValueError(f"Rating {line_number} is invalid: {row}")
+        yield user_id, song_id, rating
+
+
+def write_songs(
+    songs: Iterable[dict[str, str]], file: IO[str], catalog_format: str
+) -> int:
+    count = 0
+    if catalog_format == "csv":
+        writer = csv.DictWriter(file, fieldnames=SONG_FIELDS)
+        writer.writeheader()
+        for song in songs:
+            writer.writerow(song)
+            count += 1
+    elif catalog_format == "jsonl":
+        for song in songs:
+            file.write(json.dumps(song, ensure_ascii=False) + "\n")
+            count += 1
+    else:
+        raise ValueError(f"Unknown format {catalog_format}")
+    return count
+
+
+def import_songs(
+    songs: Iterable[dict[str, str]],
+    session: Session,
+    *,
+    batch_size: int = BATCH_SIZE,
+) -> ImportResult:
+    """Add `songs` to the catalog, skipping ones that are already there.
+
+    Songs are inserted in batches and committed once at the end, so a
+    failed import leaves the catalog unchanged.
+    """
+    result = ImportResult()
+    known_keys: set[tuple[str, str]] = {
+        song_key(artist, title)
+        for artist, title in session.execute(select(Song.artist, Song.title))
+    }
+
+    def new_songs() -> Iterator[dict[str, str]]:
+        for song in songs:
+            key = song_key(song["artist"], song["title"])
+            if key in known_keys:
+                result.duplicates += 1
+                continue
+            known_keys.add(key)
+            yield song
+
+    songs_iter = new_songs()
+    while batch := list(itertools.islice(songs_iter, batch_size)):
+        session.execute(
+            insert(Song),
+            [
+                {
+                    **song,
+                    # Bulk inserts skip `Song`'s validator.
+                    "youtube_id": parse_youtube_id(song["video_link"]),
+                }
+                for song in batch
+            ],
+        )
+        result.imported += len(batch)
+
+    session.commit()
+    return result
+
+
+def import_ratings(
+    ratings: Iterable[tuple[int, int, Rating]],
+    session: Session,
+    *,
+    batch_size: int = BATCH_SIZE,
+) -> int:
+    """Apply (user ID, song ID, rating) triples in one transaction.
+
+    Ratings are upserted `batch_size` at a time. Returns how many were read.
+    """
+    count = 0
+    ratings_iter = iter(ratings)
+    while batch := list(itertools.islice(ratings_iter, batch_size)):
+        by_user: dict[int, list[tuple[int, Rating]]] = {}
+        for user_id, song_id, rating in batch:
+            by_user.setdefault(user_id, []).append((song_id, rating))
+        for user_id, user_ratings in by_user.items():
+            rate_songs(user_id, user_ratings, session=session)
+        count += len(batch)
+
+    session.commit()
+    return count
+
+
+def export_songs(session: Session) -> Iterator[dict[str, str]]:
+    """Every song in the catalog, by ID, streamed in batches."""
+    rows = session.execute(
+        select(Song.title, Song.artist, Song.video_link)
+        .order_by(Song.id)
+        .execution_options(yield_per=BATCH_SIZE)
+    )
+    for title, artist, video_link in rows:
+        yield {"title": title, "artist": artist, "video_link": video_link}
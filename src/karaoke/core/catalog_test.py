@@ -0,0 +1,93 @@
+import io
+
+from pytest import mark, raises
+from sqlalchemy.orm import Session
+
+from karaoke.core.catalog import (
+    export_songs,
+    import_ratings,
+    import_songs,
+    read_ratings,
+    read_songs,
+    write_songs,
+)
+from karaoke.core.rating import Rating
+from karaoke.core.song import Song
+from karaoke.core.user import User
+
+CSV = """title,artist,video_link
+My Shot,Hamilton,_vr5w9PefnM
+my  shot,HAMILTON ,https://www.youtube.com/watch?v=_vr5w9PefnM
+Wait for it,Hamilton,https://link.to/video.mp4
+"""
+
+
+def test_import_dedupes_and_batches(session: Session) -> None:
+    session.add(Song(title="Wait For It", artist="Hamilton", video_link=""))
+    session.commit()
+
+    result = import_songs(
+        read_songs(io.StringIO(CSV), "csv"), session, batch_size=1
+    )
+
+    assert (result.imported, result.duplicates) == (1, 2)
+    song = session.query(Song).filter_by(title="My Shot").one()
+    assert song.youtube_id == "_vr5w9PefnM"
+
+
+@mark.parametrize("catalog_format", ["csv", "jsonl"])
+def test_export_round_trips(session: Session, catalog_format: str) -> None:
+    import_songs(read_songs(io.StringIO(CSV), "csv"), session)
+
+    file = io.StringIO()
+    assert write_songs(export_songs(session), file, catalog_format) == 2
+
+    file.seek(0)
+    assert list(read_songs(file, catalog_format)) == [
+        {
+            "title": "My Shot",
+            "artist": "Hamilton",
+            "video_link": "_vr5w9PefnM",
+        },
+        {
+            "title": "Wait for it",
+            "artist": "Hamilton",
+            "video_link": "https://link.to/video.mp4",
+        },
+    ]
+
+
+def test_missing_field() -> None:
+    with raises(ValueError, match="Song 1 has no video_link"):
+        list(read_songs(io.StringIO('{"title": "a", "artist": "b"}'), "jsonl"))
+
+
+def test_import_ratings(session: Session) -> None:
+    import_songs(read_songs(io.StringIO(CSV), "csv"), session)
+    user = User(name="Amir")
+    session.add(user)
+    session.commit()
+
+    ratings = io.StringIO(
+        "user_id,song_id,rating\n"
+        f"{user.id},1,SING_ALONG\n"
+        f"{user.id},2,DONT_KNOW\n"
+        f"{user.id},1,NEED_THE_MIC\n"
+    )
+    assert import_ratings(read_ratings(ratings, "csv"), session) == 3
+
+    assert {rating.song_id: rating.rating for rating in user.ratings} == {
+        1: Rating.NEED_THE_MIC,
+        2: Rating.DONT_KNOW,
+    }
+    assert [
+        (song.rating_score, song.rating_count)
+        for song in session.query(Song).order_by(Song.id)
+    ] == [(5, 1), (-1, 1)]
+
+
+def test_invalid_rating() -> None:
+    with raises(ValueError, match="Rating 1 is invalid"):
+        list(
+            read_ratings(io.StringIO("user_id,song_id,rating\n1,1,A\n"), "csv")
+        )
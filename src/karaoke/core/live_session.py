@@ -0,0 +1,565 @@
+from collections import deque
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from typing import Any, Callable, Iterator, Optional
+import atexit
+import heapq
+import logging
+import threading
+import time
+
+from sqlalchemy import update
+from sqlalchemy.orm import Session
+
+from karaoke.core import metrics
+from karaoke.core.rating import RATING_SCORES
+from karaoke.core.rating_matrix import RatingMatrix
+from karaoke.core.selection import Member, PickTrace, pick_song
+from karaoke.core.session import (
+    KaraokeSession,
+    KaraokeSessionSong,
+    KaraokeSessionUser,
+    SESSION_TTL,
+    SNOOZE_TTL,
+    load_rating_matrix,
+)
+
+logger = logging.getLogger(__name__)
+
+# Seconds between background flushes of live session state to the database.
+FLUSH_INTERVAL = 1.0
+
+
+@dataclass
+class PendingChanges:
+    """What a `LiveSessionState.flush` wrote, until it's committed."""
+
+    song_ids: set[int]
+    user_ids: set[int]
+    session: bool
+
+
+@dataclass
+class LiveSessionState:
+    """In-memory copy of a running karaoke session.
+
+    Player transitions are applied here and written back to the
+    `karaoke_session_*` tables later by `flush`. The database stays the
+    source of truth: a state can always be rebuilt with `load`.
+    """
+
+    karaoke_session_id: int
+    display_id: str
+    # Song IDs in queue order.
+    queue: list[int]
+    members: dict[int, Member]
+    played: set[int] = field(default_factory=set)
+    # See `KaraokeSession.played_count`.
+    played_count: int = 0
+    # `snoozed_until` of the songs that are currently snoozed, and a min-heap
+    # of (snoozed_until, song_id) to find the ones that just woke up.
+    snoozed_until: dict[int, int] = field(default_factory=dict)
+    _snooze_heap: list[tuple[int, int]] = field(default_factory=list)
+    current_song_id: Optional[int] = None
+    # None when ratings changed and the matrix needs to be reloaded.
+    rating_matrix: Optional[RatingMatrix] = None
+    # Traces of the latest picks, oldest first. None when tracing is off.
+    pick_traces: Optional[deque[PickTrace]] = None
+    lock: threading.RLock = field(default_factory=threading.RLock)
+    _dirty_song_ids: set[int] = field(default_factory=set)
+    _dirty_user_ids: set[int] = field(default_factory=set)
+    # Whether `played_count` or `current_song_id` changed.
+    _dirty_session: bool = False
+    # Bumped every time a changed state is shared with other processes, see
+    # `RedisLiveSessionRegistry`.
+    version: int = 0
+    # Set when the registry dropped this state. Whoever still holds it must
+    # get the new one instead of changing this one.
+    evicted: bool = False
+    # `time.monotonic()` of the last `LiveSessionRegistry.get`.
+    last_used: float = field(default_factory=time.monotonic)
+
+    def __post_init__(self) -> None:
+        self._snooze_heap = [
+            (snoozed_until, song_id)
+            for song_id, snoozed_until in self.snoozed_until.items()
+        ]
+        heapq.heapify(self._snooze_heap)
+
+    @classmethod
+    def load(
+        cls, karaoke_session: KaraokeSession, session: Session
+    ) -> "LiveSessionState":
+        state = cls(
+            karaoke_session_id=karaoke_session.id,
+            display_id=karaoke_session.display_id,
+            queue=[song.song_id for song in karaoke_session.songs],
+            members={
+                user.user_id: Member(
+                    user_id=user.user_id,
+                    score=user.score,
+                    stepped_out=user.stepped_out,
+                )
+                for user in karaoke_session.users
+            },
+            played={
+                song.song_id for song in karaoke_session.songs if song.played
+            },
+            played_count=karaoke_session.played_count,
+            snoozed_until={
+                song.song_id: song.snoozed_until
+                for song in karaoke_session.songs
+                if song.is_snoozed(karaoke_session.played_count)
+            },
+            current_song_id=karaoke_session.current_song_id,
+        )
+        state.reload_ratings(session)
+        return state
+
+    def to_snapshot(self) -> dict[str, Any]:
+        """Everything but the ratings, as JSON-compatible values.
+
+        Changes that weren't flushed yet are included, so whoever restores
+        the snapshot can flush them.
+        """
+        return {
+            "karaoke_session_id": self.karaoke_session_id,
+            "display_id": self.display_id,
+            "queue": self.queue,
+            "members": [
+                [member.user_id, member.score, member.stepped_out]
+                for member in self.members.values()
+            ],
+            "played": sorted(self.played),
+            "played_count": self.played_count,
+            "snoozed_until": sorted(self.snoozed_until.items()),
+            "current_song_id": self.current_song_id,
+            "dirty_song_ids": sorted(self._dirty_song_ids),
+            "dirty_user_ids": sorted(self._dirty_user_ids),
+            "dirty_session": self._dirty_session,
+        }
+
+    @classmethod
+    def from_snapshot(
+        cls, snapshot: dict[str, Any], version: int = 0
+    ) -> "LiveSessionState":
+        """Restore a `to_snapshot` result. Ratings still need to be loaded."""
+        return cls(
+            karaoke_session_id=snapshot["karaoke_session_id"],
+            display_id=snapshot["display_id"],
+            queue=snapshot["queue"],
+            members={
+                user_id: Member(user_id, score, stepped_out)
+                for user_id, score, stepped_out in snapshot["members"]
+            },
+            played=set(snapshot["played"]),
+            played_count=snapshot["played_count"],
+            snoozed_until=dict(snapshot["snoozed_until"]),
+            current_song_id=snapshot["current_song_id"],
+            _dirty_song_ids=set(snapshot["dirty_song_ids"]),
+            _dirty_user_ids=set(snapshot["dirty_user_ids"]),
+            _dirty_session=snapshot["dirty_session"],
+            version=version,
+        )
+
+    def reload_ratings(self, session: Session) -> None:
+        self.rating_matrix = load_rating_matrix(
+            karaoke_session_id=self.karaoke_session_id,
+            user_ids=list(self.members),
+            song_ids=self.queue,
+            session=session,
+        )
+
+    @property
+    def is_dirty(self) -> bool:
+        return bool(
+            self._dirty_song_ids or self._dirty_user_ids or self._dirty_session
+        )
+
+    @property
+    def ratings(self) -> RatingMatrix:
+        """`rating_matrix`, which `LiveSessionRegistry.get` reloads."""
+        if self.rating_matrix is None:
+            raise RuntimeError(f"Ratings of {self.display_id} aren't loaded")
+        return self.rating_matrix
+
+    def _snooze(self, song_id: int, snoozed_until: int) -> None:
+        self.snoozed_until[song_id] = snoozed_until
+        heapq.heappush(self._snooze_heap, (snoozed_until, song_id))
+
+    def _set_current_song(self, song_id: Optional[int]) -> None:
+        self.current_song_id = song_id
+        self._dirty_session = True
+
+    def mark_current_song_as_played(self) -> None:
+        if (song_id := self.current_song_id) is None:
+            return
+
+        self.played.add(song_id)
+        self._dirty_song_ids.add(song_id)
+        self._set_current_song(None)
+
+        # Update user scores.
+        for member in self.members.values():
+            member.score += RATING_SCORES[
+                self.ratings.get_rating(member.user_id, song_id)
+            ]
+            self._dirty_user_ids.add(member.user_id)
+
+        self.played_count += 1
+
+        # Wake up the songs whose snooze just ran out. Nothing needs to be
+        # written for them: `snoozed_until` is relative to `played_count`.
+        heap = self._snooze_heap
+        while heap and heap[0][0] <= self.played_count:
+            snoozed_until, song_id = heapq.heappop(heap)
+            # Skip entries left behind when a song was snoozed again.
+            if self.snoozed_until.get(song_id) == snoozed_until:
+                del self.snoozed_until[song_id]
+
+    def skip_current_song(self) -> None:
+        if (song_id := self.current_song_id) is None:
+            return
+        self.played.add(song_id)
+        self._dirty_song_ids.add(song_id)
+        self._set_current_song(None)
+        metrics.SONGS_SKIPPED.inc()
+
+    def snooze_current_song(self) -> None:
+        if (song_id := self.current_song_id) is None:
+            return
+        metrics.SONGS_SNOOZED.inc()
+        self._set_current_song(None)
+        self._snooze(song_id, self.played_count + SNOOZE_TTL)
+        self._dirty_song_ids.add(song_id)
+
+    def replace_current_song(self, song_id: int) -> None:
+        self._set_current_song(song_id if song_id in self.queue else None)
+
+    def set_stepped_out(self, user_id: int, stepped_out: bool) -> bool:
+        """Returns False if the user isn't part of the session."""
+        if (member := self.members.get(user_id)) is None:
+            return False
+        member.stepped_out = stepped_out
+        self._dirty_user_ids.add(user_id)
+        return True
+
+    def get_next_song(self) -> Optional[int]:
+        """Pick the next song and make it current. Returns its ID."""
+        if self.current_song_id is not None:
+            logger.info("Current song is still playing.")
+            return None
+
+        with metrics.GET_NEXT_SONG_SECONDS.time():
+            candidates: list[int] = [
+                song_id
+                for song_id in self.queue
+                if song_id not in self.played
+                if song_id not in self.snoozed_until
+            ]
+            trace: Optional[PickTrace] = None
+            if self.pick_traces is not None:
+                trace = PickTrace(candidates=len(candidates))
+                self.pick_traces.append(trace)
+            song_id = pick_song(
+                candidates, self.members.values(), self.ratings, trace
+            )
+        if song_id is not None:
+            self._set_current_song(song_id)
+        return song_id
+
+    @property
+    def queue_size(self) -> int:
+        """Songs in the queue that haven't been played yet."""
+        return len(self.queue) - len(self.played)
+
+    def flush(self, session: Session) -> PendingChanges:
+        """Write changed rows back to the database (without committing).
+
+        The rows are no longer dirty afterwards. If the write isn't
+        committed, pass the result to `restore` to mark them dirty again.
+        """
+        with self.lock:
+            song_rows = [
+                {
+                    "karaoke_session_id": self.karaoke_session_id,
+                    "song_id": song_id,
+                    "played": song_id in self.played,
+                    "snoozed_until": self.snoozed_until.get(song_id, 0),
+                }
+                for song_id in self._dirty_song_ids
+            ]
+            session_values = (
+                {
+                    "played_count": self.played_count,
+                    "current_song_id": self.current_song_id,
+                }
+                if self._dirty_session
+                else None
+            )
+            user_rows = [
+                {
+                    "karaoke_session_id": self.karaoke_session_id,
+                    "user_id": user_id,
+                    "score": self.members[user_id].score,
+                    "stepped_out": self.members[user_id].stepped_out,
+                }
+                for user_id in self._dirty_user_ids
+                if user_id in self.members
+            ]
+            pending = PendingChanges(
+                song_ids=self._dirty_song_ids,
+                user_ids=self._dirty_user_ids,
+                session=self._dirty_session,
+            )
+            self._dirty_song_ids = set()
+            self._dirty_user_ids = set()
+            self._dirty_session = False
+
+        try:
+            if session_values is not None:
+                session.execute(
+                    update(KaraokeSession)
+                    .where(KaraokeSession.id == self.karaoke_session_id)
+                    .values(**session_values)
+                )
+            if song_rows:
+                session.execute(update(KaraokeSessionSong), song_rows)
+            if user_rows:
+                session.execute(update(KaraokeSessionUser), user_rows)
+        except BaseException:
+            self.restore(pending)
+            raise
+        return pending
+
+    def restore(self, pending: PendingChanges) -> None:
+        """Mark the rows of a `flush` that wasn't committed dirty again."""
+        with self.lock:
+            self._dirty_song_ids |= pending.song_ids
+            self._dirty_user_ids |= pending.user_ids
+            self._dirty_session |= pending.session
+
+
+class LiveSessionRegistry:
+    """Live state of every active session in this process, by display ID.
+
+    States are loaded from the database on first use and flushed back in
+    the background every `flush_interval` seconds (or only when `flush` is
+    called, if `flush_interval` is None). If `pick_trace_size` is set, each
+    state keeps a `PickTrace` of that many of its latest picks. The flusher
+    also drops the states that weren't used for `SESSION_TTL`.
+
+    Read states with `get` and change them inside `transaction`. Change a
+    session's users or queue in the database inside `evicting`. A process
+    that shares sessions with other processes should use
+    `RedisLiveSessionRegistry` instead, which has the same interface.
+    """
+
+    def __init__(
+        self,
+        session_factory: Callable[[], Session],
+        flush_interval: Optional[float] = FLUSH_INTERVAL,
+        pick_trace_size: int = 0,
+    ) -> None:
+        self._session_factory = session_factory
+        self._flush_interval = flush_interval
+        self._pick_trace_size = pick_trace_size
+        self._states: dict[str, LiveSessionState] = {}
+        # Held while a session is loaded or evicted, by display ID.
+        self._load_locks: dict[str, threading.Lock] = {}
+        self._lock = threading.Lock()
+        self._flusher: Optional[threading.Thread] = None
+        # Called with a display ID and event names when another process
+        # changed that session (see `publish`).
+        self.on_remote_events: Optional[Callable[..., None]] = None
+
+    def get(
+        self, display_id: str, session: Session
+    ) -> Optional[LiveSessionState]:
+        with self._lock:
+            state = self._states.get(display_id)
+
+        if state is None:
+            with self._load_lock(display_id):
+                with self._lock:
+                    state = self._states.get(display_id)
+                if state is None:
+                    if (state := self._load(display_id, session)) is None:
+                        return None
+                    state = self._cache(state)
+
+        state.last_used = time.monotonic()
+        with state.lock:
+            if state.rating_matrix is None:
+                state.reload_ratings(session)
+        return state
+
+    @contextmanager
+    def transaction(
+        self, display_id: str, session: Session
+    ) -> Iterator[Optional[LiveSessionState]]:
+        """Change a session's state, one change per session at a time.
+
+        Yields None if there's no such session.
+        """
+        while (state := self.get(display_id, session)) is not None:
+            with state.lock:
+                # It may have been evicted while we waited for it.
+                if not state.evicted:
+                    yield state
+                    return
+        yield None
+
+    def publish(self, display_id: str, *events: str) -> None:
+        """Pass `events` to `on_remote_events` in the other processes."""
+
+    @contextmanager
+    def evicting(self, display_id: str) -> Iterator[None]:
+        """Flush and forget a session, and reload it only after the block.
+
+        Change the session's users or queue in the database inside the
+        block, so nobody loads the session halfway through the change.
+        """
+        with self._load_lock(display_id):
+            self._evict(display_id)
+            yield
+
+    def evict(self, display_id: str) -> None:
+        """Flush and forget a session, so it's reloaded from the database."""
+        with self.evicting(display_id):
+            pass
+
+    def states(self) -> list[LiveSessionState]:
+        with self._lock:
+            return list(self._states.values())
+
+    def ratings_changed(self, user_id: int, *events: str) -> list[str]:
+        """Reload ratings in the sessions `user_id` is part of.
+
+        Returns the display IDs of those sessions. Other processes get
+        `events` for the sessions they reload.
+        """
+        display_ids: list[str] = []
+        for state in self.states():
+            if user_id in state.members:
+                with state.lock:
+                    state.rating_matrix = None
+                display_ids.append(state.display_id)
+        return display_ids
+
+    def flush(self) -> None:
+        self._flush_states(
+            [state for state in self.states() if state.is_dirty]
+        )
+
+    def evict_idle(self) -> None:
+        """Forget the flushed states that weren't used for `SESSION_TTL`.
+
+        Their sessions are over or expired. They're reloaded if they're used
+        after all.
+        """
+        used_after = time.monotonic() - SESSION_TTL.total_seconds()
+        for state in self.states():
+            if state.last_used > used_after:
+                continue
+            with self._load_lock(state.display_id), state.lock:
+                if (
+                    state.evicted
+                    or state.is_dirty
+                    or state.last_used > used_after
+                ):
+                    continue
+                self._drop(state)
+                with self._lock:
+                    del self._load_locks[state.display_id]
+
+    def _load(
+        self, display_id: str, session: Session
+    ) -> Optional[LiveSessionState]:
+        karaoke_session: Optional[KaraokeSession] = (
+            session.query(KaraokeSession)
+            .filter_by(display_id=display_id)
+            .first()
+        )
+        if karaoke_session is None:
+            return None
+        return LiveSessionState.load(karaoke_session, session)
+
+    @contextmanager
+    def _load_lock(self, display_id: str) -> Iterator[None]:
+        """Hold the lock taken to load or evict a session."""
+        while True:
+            with self._lock:
+                lock = self._load_locks.setdefault(
+                    display_id, threading.Lock()
+                )
+            with lock:
+                with self._lock:
+                    # `evict_idle` may have dropped it while we waited.
+                    current = self._load_locks.get(display_id)
+                if current is lock:
+                    yield
+                    return
+
+    def _evict(self, display_id: str) -> None:
+        with self._lock:
+            state = self._states.get(display_id)
+        if state is not None:
+            with state.lock:
+                self._flush_states([state])
+                self._drop(state)
+
+    def _drop(self, state: LiveSessionState) -> None:
+        """Forget `state`, if it's still the cached one. Hold its lock."""
+        state.evicted = True
+        with self._lock:
+            if self._states.get(state.display_id) is state:
+                del self._states[state.display_id]
+
+    def _cache(self, state: LiveSessionState) -> LiveSessionState:
+        """Keep `state` unless another thread got there first."""
+        if self._pick_trace_size and state.pick_traces is None:
+            state.pick_traces = deque(maxlen=self._pick_trace_size)
+        with self._lock:
+            state = self._states.setdefault(state.display_id, state)
+        self._start_flusher()
+        return state
+
+    def _flush_states(self, states: list[LiveSessionState]) -> None:
+        if not states:
+            return
+        flushed: list[tuple[LiveSessionState, PendingChanges]] = []
+        with self._session_factory() as session:
+            try:
+                for state in states:
+                    flushed.append((state, state.flush(session)))
+                session.commit()
+            except BaseException:
+                # Keep the changes for the next flush.
+                for state, pending in flushed:
+                    state.restore(pending)
+                raise
+
+    def _start_flusher(self) -> None:
+        if self._flush_interval is None or self._flusher is not None:
+            return
+        with self._lock:
+            if self._flusher is not None:
+                return
+            self._flusher = threading.Thread(
+                target=self._run_flusher,
+                args=(self._flush_interval,),
+                name="live-session-flusher",
+            )
+            self._flusher.daemon = True
+            self._flusher.start()
+        atexit.register(self.flush)
+
+    def _run_flusher(self, interval: float) -> None:
+        while True:
+            time.sleep(interval)
+            try:
+                self.flush()
+                self.evict_idle()
+            except Exception:
+                logger.exception("Failed to flush live session state")
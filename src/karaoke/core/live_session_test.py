@@ -0,0 +1,267 @@
+from typing import Optional
+import random
+import threading
+
+from pytest import fixture, raises
+from sqlalchemy import Engine
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm import Session, sessionmaker
+
+from karaoke.core.live_session import LiveSessionRegistry, LiveSessionState
+from karaoke.core.rating import Rating, UserSongRating
+from karaoke.core.session import SESSION_TTL, KaraokeSession
+from karaoke.core.song import Song
+from karaoke.core.user import User
+from karaoke.core.utils import create_karaoke_session
+
+
+@fixture
+def session_factory(engine: Engine) -> sessionmaker[Session]:
+    return sessionmaker(bind=engine)
+
+
+@fixture
+def karaoke_session_id(session_factory: sessionmaker[Session]) -> str:
+    rng = random.Random(0)
+    with session_factory() as session:
+        users = [User(name=f"user{i}") for i in range(6)]
+        songs = [
+            Song(title=f"song{i}", artist="artist", video_link="")
+            for i in range(40)
+        ]
+        session.add_all([*users, *songs])
+        session.commit()
+        session.add_all(
+            UserSongRating(
+                user_id=user.id,
+                song_id=song.id,
+                rating=rng.choice(list(Rating)[1:]),
+            )
+            for user in users
+            for song in songs
+        )
+        session.commit()
+
+        random.seed(0)
+        karaoke_session = create_karaoke_session(
+            [user.id for user in users], session
+        )
+        return karaoke_session.display_id
+
+
+def test_picks_match_orm_session(
+    session_factory: sessionmaker[Session], karaoke_session_id: str
+) -> None:
+    with session_factory() as session:
+        karaoke_session = (
+            session.query(KaraokeSession)
+            .filter_by(display_id=karaoke_session_id)
+            .one()
+        )
+        state = LiveSessionState.load(karaoke_session, session)
+        state.set_stepped_out(karaoke_session.users[0].user_id, True)
+        karaoke_session.users[0].stepped_out = True
+
+        live_picks: list[int] = []
+        random.seed(1)
+        for i in range(30):
+            if (song_id := state.get_next_song()) is None:
+                state.mark_current_song_as_played()
+                continue
+            live_picks.append(song_id)
+            if i % 3 == 0:
+                state.snooze_current_song()
+            else:
+                state.mark_current_song_as_played()
+
+        orm_picks: list[int] = []
+        random.seed(1)
+        for i in range(30):
+            if (
+                song := karaoke_session.get_next_song(session=session)
+            ) is None:
+                karaoke_session.mark_current_song_as_played(session=session)
+                continue
+            orm_picks.append(song.id)
+            if i % 3 == 0:
+                karaoke_session.snooze_current_song(session=session)
+            else:
+                karaoke_session.mark_current_song_as_played(session=session)
+
+        assert live_picks == orm_picks
+        assert {
+            member.user_id: member.score for member in state.members.values()
+        } == {user.user_id: user.score for user in karaoke_session.users}
+
+
+def test_flushed_state_is_recovered(
+    session_factory: sessionmaker[Session], karaoke_session_id: str
+) -> None:
+    registry = LiveSessionRegistry(session_factory, flush_interval=None)
+    with session_factory() as session:
+        state = registry.get(karaoke_session_id, session)
+        assert state is not None
+        for _ in range(3):
+            state.get_next_song()
+            state.mark_current_song_as_played()
+        state.get_next_song()
+        state.snooze_current_song()
+        current_song_id = state.get_next_song()
+        state.set_stepped_out(next(iter(state.members)), True)
+
+    registry.flush()
+    assert not state.is_dirty
+
+    # Simulate a restart.
+    with session_factory() as session:
+        recovered = LiveSessionRegistry(session_factory).get(
+            karaoke_session_id, session
+        )
+    assert recovered is not None
+    assert recovered.current_song_id == current_song_id
+    assert recovered.played == state.played
+    assert recovered.played_count == state.played_count == 3
+    assert recovered.snoozed_until == state.snoozed_until
+    assert recovered.members == state.members
+
+
+def test_failed_flush_is_retried(
+    session_factory: sessionmaker[Session], karaoke_session_id: str
+) -> None:
+    class LockedSession(Session):
+        def commit(self) -> None:
+            raise OperationalError("COMMIT", {}, Exception("locked"))
+
+    locked = True
+
+    def flaky_session_factory() -> Session:
+        if locked:
+            return LockedSession(bind=session_factory.kw["bind"])
+        return session_factory()
+
+    registry = LiveSessionRegistry(flaky_session_factory, flush_interval=None)
+    with session_factory() as session:
+        state = registry.get(karaoke_session_id, session)
+        assert state is not None
+        state.get_next_song()
+        state.mark_current_song_as_played()
+        current_song_id = state.get_next_song()
+
+    with raises(OperationalError):
+        registry.flush()
+    assert state.is_dirty
+
+    locked = False
+    registry.flush()
+    assert not state.is_dirty
+    with session_factory() as session:
+        recovered = LiveSessionRegistry(session_factory).get(
+            karaoke_session_id, session
+        )
+    assert recovered is not None
+    assert recovered.current_song_id == current_song_id
+    assert recovered.played == state.played
+
+
+def test_unknown_session(session_factory: sessionmaker[Session]) -> None:
+    registry = LiveSessionRegistry(session_factory, flush_interval=None)
+    with session_factory() as session:
+        assert registry.get("ZZZZ", session) is None
+
+
+def test_pick_traces(
+    session_factory: sessionmaker[Session], karaoke_session_id: str
+) -> None:
+    registry = LiveSessionRegistry(
+        session_factory, flush_interval=None, pick_trace_size=2
+    )
+    with session_factory() as session:
+        state = registry.get(karaoke_session_id, session)
+        assert state is not None
+        picks: list[Optional[int]] = []
+        for _ in range(3):
+            picks.append(state.get_next_song())
+            state.mark_current_song_as_played()
+
+    assert state.pick_traces is not None
+    assert [trace.song_id for trace in state.pick_traces] == picks[1:]
+    trace = state.pick_traces[-1]
+    assert len(trace.members) == 6
+    assert trace.prunes
+    assert trace.prunes[0].user_id == trace.members[0].user_id
+    assert trace.prunes[-1].candidates_left <= trace.candidates
+    assert trace.as_dict()["song_id"] == picks[-1]
+
+
+def test_no_pick_traces_by_default(
+    session_factory: sessionmaker[Session], karaoke_session_id: str
+) -> None:
+    registry = LiveSessionRegistry(session_factory, flush_interval=None)
+    with session_factory() as session:
+        state = registry.get(karaoke_session_id, session)
+        assert state is not None
+        state.get_next_song()
+        assert state.pick_traces is None
+
+
+def test_no_load_while_evicting(
+    session_factory: sessionmaker[Session], karaoke_session_id: str
+) -> None:
+    registry = LiveSessionRegistry(session_factory, flush_interval=None)
+    with session_factory() as session:
+        old_state = registry.get(karaoke_session_id, session)
+        session.add(late_user := User(name="late"))
+        session.commit()
+        karaoke_session = (
+            session.query(KaraokeSession)
+            .filter_by(display_id=karaoke_session_id)
+            .one()
+        )
+
+        loaded: list[Optional[LiveSessionState]] = []
+
+        def load() -> None:
+            with session_factory() as other_session:
+                loaded.append(registry.get(karaoke_session_id, other_session))
+
+        with registry.evicting(karaoke_session_id):
+            reader = threading.Thread(target=load)
+            reader.start()
+            reader.join(timeout=0.2)
+            # It waits for the new member instead of caching the old ones.
+            assert reader.is_alive()
+            karaoke_session.add_user_to_session(late_user.id, session=session)
+        reader.join()
+
+        assert loaded[0] is not None
+        assert late_user.id in loaded[0].members
+        assert old_state is not None and old_state.evicted
+        with registry.transaction(karaoke_session_id, session) as state:
+            assert state is loaded[0]
+
+
+def test_idle_sessions_are_evicted(
+    session_factory: sessionmaker[Session], karaoke_session_id: str
+) -> None:
+    registry = LiveSessionRegistry(session_factory, flush_interval=None)
+    with session_factory() as session:
+        state = registry.get(karaoke_session_id, session)
+        assert state is not None
+        song_id = state.get_next_song()
+        state.last_used -= SESSION_TTL.total_seconds()
+
+        registry.evict_idle()
+        # Not before its changes are flushed.
+        assert registry.states() == [state]
+
+        registry.flush()
+        registry.evict_idle()
+        assert registry.states() == []
+        assert state.evicted
+        assert registry._load_locks == {}
+
+        reloaded = registry.get(karaoke_session_id, session)
+        assert reloaded is not None and reloaded is not state
+        assert reloaded.current_song_id == song_id
+        registry.evict_idle()
+        assert registry.states() == [reloaded]
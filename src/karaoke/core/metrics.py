@@ -0,0 +1,259 @@
+"""Counters and histograms of song selection, in Prometheus text format.
+
+The metrics live in this process and are rendered by `render` (the server
+serves them at `/metrics`). Work done inside `paused()`, e.g. simulating a
+playlist, isn't recorded.
+"""
+
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Callable, Iterator, Optional
+import bisect
+import math
+import threading
+import time
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# Upper bounds of the default histogram buckets, in seconds.
+LATENCY_BUCKETS = (
+    0.0005,
+    0.001,
+    0.0025,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+)
+
+_paused: ContextVar[bool] = ContextVar("metrics_paused", default=False)
+
+
+@contextmanager
+def paused() -> Iterator[None]:
+    """Don't record anything in the current thread until this exits."""
+    token = _paused.set(True)
+    try:
+        yield
+    finally:
+        _paused.reset(token)
+
+
+def _format_value(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    return repr(float(value)) if value != int(value) else str(int(value))
+
+
+def _format_labels(labels: dict[str, str]) -> str:
+    if not labels:
+        return ""
+
+    def escape(value: str) -> str:
+        return (
+            value.replace("\\", r"\\").replace('"', r"\"").replace("\n", r"\n")
+        )
+
+    return (
+        "{"
+        + ",".join(f'{key}="{escape(value)}"' for key, value in labels.items())
+        + "}"
+    )
+
+
+class Metric:
+    type_name = "untyped"
+
+    def __init__(self, name: str, description: str) -> None:
+        self.name = name
+        self.description = description
+        self._lock = threading.Lock()
+
+    def samples(self) -> list[tuple[str, dict[str, str], float]]:
+        """(name, labels, value) of every sample of this metric."""
+        raise NotImplementedError
+
+    def render(self) -> str:
+        lines = [
+            f"# HELP {self.name} {self.description}",
+            f"# TYPE {self.name} {self.type_name}",
+        ]
+        for name, labels, value in self.samples():
+            lines.append(
+                f"{name}{_format_labels(labels)} {_format_value(value)}"
+            )
+        return "\n".join(lines) + "\n"
+
+
+class Counter(Metric):
+    type_name = "counter"
+
+    def __init__(self, name: str, description: str) -> None:
+        super().__init__(name, description)
+        self._value = 0.0
+
+    @property
+    def value(self) -> float:
+        return self._value
+
+    def inc(self, amount: float = 1.0) -> None:
+        if _paused.get():
+            return
+        with self._lock:
+            self._value += amount
+
+    def samples(self) -> list[tuple[str, dict[str, str], float]]:
+        return [(self.name, {}, self._value)]
+
+
+class Gauge(Metric):
+    """A value read when the metrics are rendered.
+
+    `collect` returns the value for each combination of `labels`, e.g.
+    `{("abc",): 3}` for `labels=("session",)`.
+    """
+
+    type_name = "gauge"
+
+    def __init__(
+        self,
+        name: str,
+        description: str,
+        collect: Callable[[], dict[tuple[str, ...], float]],
+        labels: tuple[str, ...] = (),
+    ) -> None:
+        super().__init__(name, description)
+        self._collect = collect
+        self._labels = labels
+
+    def samples(self) -> list[tuple[str, dict[str, str], float]]:
+        return [
+            (self.name, dict(zip(self._labels, label_values)), value)
+            for label_values, value in sorted(self._collect().items())
+        ]
+
+
+class Histogram(Metric):
+    type_name = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        description: str,
+        buckets: tuple[float, ...] = LATENCY_BUCKETS,
+    ) -> None:
+        super().__init__(name, description)
+        self._buckets = tuple(sorted(buckets))
+        # Observations per bucket (not cumulative), the last one is +Inf.
+        self._counts = [0] * (len(self._buckets) + 1)
+        self._sum = 0.0
+
+    @property
+    def count(self) -> int:
+        return sum(self._counts)
+
+    def observe(self, value: float) -> None:
+        if _paused.get():
+            return
+        with self._lock:
+            self._counts[bisect.bisect_left(self._buckets, value)] += 1
+            self._sum += value
+
+    @contextmanager
+    def time(self) -> Iterator[None]:
+        """Observe how many seconds the body takes."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start)
+
+    def samples(self) -> list[tuple[str, dict[str, str], float]]:
+        with self._lock:
+            counts = list(self._counts)
+            total = self._sum
+        samples: list[tuple[str, dict[str, str], float]] = []
+        cumulative = 0
+        for bound, count in zip(self._buckets + (math.inf,), counts):
+            cumulative += count
+            samples.append(
+                (
+                    f"{self.name}_bucket",
+                    {"le": _format_value(bound)},
+                    cumulative,
+                )
+            )
+        samples.append((f"{self.name}_sum", {}, total))
+        samples.append((f"{self.name}_count", {}, cumulative))
+        return samples
+
+
+class Registry:
+    def __init__(self) -> None:
+        self._metrics: dict[str, Metric] = {}
+        self._lock = threading.Lock()
+
+    def register(self, metric: Metric) -> Metric:
+        with self._lock:
+            if metric.name in self._metrics:
+                raise ValueError(f"Metric {metric.name} already registered")
+            self._metrics[metric.name] = metric
+        return metric
+
+    def unregister(self, name: str) -> None:
+        with self._lock:
+            self._metrics.pop(name, None)
+
+    def get(self, name: str) -> Optional[Metric]:
+        return self._metrics.get(name)
+
+    def render(self) -> str:
+        with self._lock:
+            metrics = list(self._metrics.values())
+        return "".join(metric.render() for metric in metrics)
+
+
+REGISTRY = Registry()
+
+
+def counter(name: str, description: str) -> Counter:
+    metric = Counter(name, description)
+    REGISTRY.register(metric)
+    return metric
+
+
+def histogram(
+    name: str, description: str, buckets: tuple[float, ...] = LATENCY_BUCKETS
+) -> Histogram:
+    metric = Histogram(name, description, buckets)
+    REGISTRY.register(metric)
+    return metric
+
+
+def render() -> str:
+    return REGISTRY.render()
+
+
+SONGS_PICKED = counter(
+    "karaoke_songs_picked_total", "Songs picked to be played next."
+)
+SONGS_SKIPPED = counter("karaoke_songs_skipped_total", "Songs skipped.")
+SONGS_SNOOZED = counter("karaoke_songs_snoozed_total", "Songs snoozed.")
+GET_NEXT_SONG_SECONDS = histogram(
+    "karaoke_get_next_song_seconds", "Time to pick the next song."
+)
+GENERATE_SONG_QUEUE_SECONDS = histogram(
+    "karaoke_generate_song_queue_seconds",
+    "Time to build a new session's song queue.",
+    buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0),
+)
+CANDIDATES_AFTER_PRUNE = histogram(
+    "karaoke_candidates_after_prune",
+    "Candidates left after every member pruned them, per pick.",
+    buckets=(1, 2, 3, 5, 10, 20, 50, 100, 200, 500, 1000),
+)
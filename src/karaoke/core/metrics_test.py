@@ -0,0 +1,72 @@
+from karaoke.core import metrics
+from karaoke.core.metrics import Counter, Gauge, Histogram, Registry
+from karaoke.core.rating import Rating
+from karaoke.core.rating_matrix import RatingMatrix
+from karaoke.core.selection import Member, pick_song
+
+
+def test_render() -> None:
+    registry = Registry()
+    counter = Counter("picks_total", "Songs picked.")
+    histogram = Histogram("pick_seconds", "Time to pick.", buckets=(0.1, 1))
+    registry.register(counter)
+    registry.register(histogram)
+    registry.register(
+        Gauge(
+            "queue_size",
+            "Songs left.",
+            lambda: {("b",): 2, ('say "hi"',): 1},
+            labels=("session",),
+        )
+    )
+
+    counter.inc()
+    counter.inc(2)
+    histogram.observe(0.05)
+    histogram.observe(0.5)
+    histogram.observe(3)
+
+    assert registry.render() == (
+        "# HELP picks_total Songs picked.\n"
+        "# TYPE picks_total counter\n"
+        "picks_total 3\n"
+        "# HELP pick_seconds Time to pick.\n"
+        "# TYPE pick_seconds histogram\n"
+        'pick_seconds_bucket{le="0.1"} 1\n'
+        'pick_seconds_bucket{le="1"} 2\n'
+        'pick_seconds_bucket{le="+Inf"} 3\n'
+        "pick_seconds_sum 3.55\n"
+        "pick_seconds_count 3\n"
+        "# HELP queue_size Songs left.\n"
+        "# TYPE queue_size gauge\n"
+        'queue_size{session="b"} 2\n'
+        'queue_size{session="say \\"hi\\""} 1\n'
+    )
+
+
+def test_paused() -> None:
+    counter = Counter("picks_total", "Songs picked.")
+    with metrics.paused():
+        counter.inc()
+    counter.inc()
+    assert counter.value == 1
+
+
+def test_pick_song_is_counted() -> None:
+    rating_matrix = RatingMatrix(
+        user_ids=[1],
+        song_ids=[10, 11, 12],
+        ratings=[
+            (1, 10, Rating.NEED_THE_MIC),
+            (1, 11, Rating.NEED_THE_MIC),
+            (1, 12, Rating.DONT_KNOW),
+        ],
+    )
+    picked = metrics.SONGS_PICKED.value
+    observed = metrics.CANDIDATES_AFTER_PRUNE.count
+
+    pick_song([10, 11, 12], [Member(user_id=1)], rating_matrix)
+
+    assert metrics.SONGS_PICKED.value == picked + 1
+    assert metrics.CANDIDATES_AFTER_PRUNE.count == observed + 1
+    assert 'karaoke_candidates_after_prune_bucket{le="2"}' in metrics.render()
@@ -1,6 +1,16 @@
-from sqlalchemy import ForeignKey
-from sqlalchemy.orm import Mapped, mapped_column, relationship
+from sqlalchemy import (
+    ForeignKey,
+    select,
+    insert,
+    update,
+    delete,
+    func,
+    case,
+)
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import Mapped, mapped_column, relationship, Session
 from enum import IntEnum
+from typing import Any, Callable, Iterable
 
 from karaoke.core.base import Base
 from karaoke.core.song import Song
@@ -15,6 +25,15 @@ class Rating(IntEnum):
     NEED_THE_MIC = 4
 
 
+# How much each rating adds to a song's score.
+RATING_SCORES: dict[Rating, int] = {
+    Rating.DONT_KNOW: -1,
+    Rating.SING_ALONG: 1,
+    Rating.CAN_TAKE_THE_MIC: 2,
+    Rating.NEED_THE_MIC: 5,
+}
+
+
 class UserSongRating(Base):
     __tablename__ = "user_song_rating"
 
@@ -30,3 +49,158 @@ class UserSongRating(Base):
 
     def __repr__(self) -> str:
         return f"UserSongRating(user_id={self.user_id}, song_id={self.song_id}, rating={self.rating})"
+
+
+# `RATING_SCORES` of `UserSongRating.rating`, in SQL.
+_RATING_SCORE = case(
+    *(
+        (UserSongRating.rating == rating, rating_score)
+        for rating, rating_score in RATING_SCORES.items()
+    ),
+    else_=0,
+)
+
+
+def refresh_rating_aggregates(
+    song_ids: Iterable[int], session: Session
+) -> None:
+    """Recompute `Song.rating_score` and `Song.rating_count` from scratch.
+
+    Only needed after bulk changes to ratings; `User.rate_song` keeps the
+    aggregates up to date incrementally.
+    """
+    score = (
+        select(func.coalesce(func.sum(_RATING_SCORE), 0))
+        .where(UserSongRating.song_id == Song.id)
+        .scalar_subquery()
+    )
+    count = (
+        select(func.count())
+        .where(UserSongRating.song_id == Song.id)
+        .scalar_subquery()
+    )
+    session.execute(
+        update(Song)
+        .where(Song.id.in_(list(song_ids)))
+        .values(rating_score=score, rating_count=count)
+    )
+
+
+def _add_user_ratings(
+    user_id: int, song_ids: list[int], sign: int, session: Session
+) -> None:
+    """Add the user's ratings of the songs, times `sign`, to their scores.
+
+    The ratings are read by the UPDATE itself, so they can't be outdated.
+    """
+    user_rating = (UserSongRating.user_id == user_id) & (
+        UserSongRating.song_id == Song.id
+    )
+    score = (
+        select(func.coalesce(func.sum(_RATING_SCORE), 0))
+        .where(user_rating)
+        .scalar_subquery()
+    )
+    count = select(func.count()).where(user_rating).scalar_subquery()
+    session.execute(
+        update(Song)
+        .where(Song.id.in_(song_ids))
+        .values(
+            rating_score=Song.rating_score + sign * score,
+            rating_count=Song.rating_count + sign * count,
+        )
+    )
+
+
+# Insert statements with ON CONFLICT support, by dialect.
+_UPSERT_INSERTS: dict[str, Callable[..., Any]] = {
+    "sqlite": sqlite.insert,
+    "postgresql": postgresql.insert,
+}
+
+
+def _upsert_ratings(rows: list[dict[str, Any]], session: Session) -> None:
+    """Insert or update one user's ratings, given as column values."""
+    dialect = session.get_bind().dialect.name
+    if (insert_ratings := _UPSERT_INSERTS.get(dialect)) is not None:
+        statement = insert_ratings(UserSongRating)
+        session.execute(
+            statement.on_conflict_do_update(
+                index_elements=[
+                    UserSongRating.user_id,
+                    UserSongRating.song_id,
+                ],
+                set_={"rating": statement.excluded.rating},
+            ),
+            rows,
+        )
+        return
+
+    # The caller holds the songs' locks, so none of these rows can appear
+    # before the insert.
+    existing_song_ids = set(
+        session.scalars(
+            select(UserSongRating.song_id)
+            .where(UserSongRating.user_id == rows[0]["user_id"])
+            .where(UserSongRating.song_id.in_([r["song_id"] for r in rows]))
+        )
+    )
+    if updates := [r for r in rows if r["song_id"] in existing_song_ids]:
+        session.execute(update(UserSongRating), updates)
+    if inserts := [r for r in rows if r["song_id"] not in existing_song_ids]:
+        session.execute(insert(UserSongRating), inserts)
+
+
+def rate_songs(
+    user_id: int,
+    ratings: Iterable[tuple[int, Rating]],
+    session: Session,
+) -> None:
+    """Set many of a user's ratings at once (without committing).
+
+    `ratings` are (song ID, rating) pairs; if a song appears more than once
+    the last rating wins, and UNKNOWN removes the rating. The ratings are
+    written with one upsert (where the database supports it), and the
+    songs' aggregates are adjusted in SQL, however many songs there are.
+    Concurrent calls for the same songs wait for each other.
+
+    Raises ValueError if any of the songs doesn't exist.
+    """
+    new_ratings: dict[int, Rating] = dict(ratings)
+    if not new_ratings:
+        return
+
+    song_ids = list(new_ratings)
+    existing_song_ids = set(
+        session.scalars(
+            select(Song.id).where(Song.id.in_(song_ids)).with_for_update()
+        )
+    )
+    if missing := [i for i in song_ids if i not in existing_song_ids]:
+        raise ValueError(f"No songs with IDs {missing}")
+
+    # Take the user's old ratings out of the aggregates, change them, and
+    # add them back in.
+    _add_user_ratings(user_id, song_ids, -1, session)
+
+    upserts = [
+        {"user_id": user_id, "song_id": song_id, "rating": rating}
+        for song_id, rating in new_ratings.items()
+        if rating != Rating.UNKNOWN
+    ]
+    if upserts:
+        _upsert_ratings(upserts, session)
+
+    removed_song_ids = [
+        song_id
+        for song_id, rating in new_ratings.items()
+        if rating == Rating.UNKNOWN
+    ]
+    if removed_song_ids:
+        session.execute(
+            delete(UserSongRating)
+            .where(UserSongRating.user_id == user_id)
+            .where(UserSongRating.song_id.in_(removed_song_ids))
+        )
+
+    _add_user_ratings(user_id, song_ids, 1, session)
@@ -0,0 +1,128 @@
+from array import array
+from types import ModuleType
+from typing import TYPE_CHECKING, Iterable, Optional
+
+from karaoke.core.rating import Rating, RATING_SCORES
+
+if TYPE_CHECKING:  # pragma: no cover
+    from numpy import ndarray
+
+np: Optional[ModuleType]
+try:
+    import numpy as np
+except ImportError:  # pragma: no cover
+    np = None
+
+# Score of each rating, indexed by the rating's value. A missing rating is
+# stored as DONT_KNOW, so UNKNOWN never actually appears in the matrix.
+SCORE_TABLE: list[int] = [
+    RATING_SCORES.get(rating, 0) for rating in sorted(Rating)
+]
+
+
+class RatingMatrix:
+    """Dense songs x users matrix of ratings for a karaoke session.
+
+    Combined scores, "know it" counts and "can take the mic" counts for many
+    songs are computed in one pass over the matrix. NumPy is used when it's
+    installed; otherwise the same compact buffer is scanned in Python.
+    """
+
+    def __init__(
+        self,
+        user_ids: Iterable[int],
+        song_ids: Iterable[int],
+        ratings: Iterable[tuple[int, int, Rating]],
+    ) -> None:
+        self.user_ids: list[int] = list(user_ids)
+        self.song_ids: list[int] = list(song_ids)
+        self._user_index: dict[int, int] = {
+            user_id: index for index, user_id in enumerate(self.user_ids)
+        }
+        self._song_index: dict[int, int] = {
+            song_id: index for index, song_id in enumerate(self.song_ids)
+        }
+
+        # Song-major, so each song's ratings are contiguous.
+        user_count = len(self.user_ids)
+        self._data = array("b", [Rating.DONT_KNOW]) * (
+            len(self.song_ids) * user_count
+        )
+        for user_id, song_id, rating in ratings:
+            user_index = self._user_index.get(user_id)
+            song_index = self._song_index.get(song_id)
+            if user_index is None or song_index is None:
+                continue
+            self._data[song_index * user_count + user_index] = rating
+
+        self._matrix: Optional["ndarray"] = None
+        if np is not None:
+            self._matrix = np.frombuffer(self._data, dtype=np.int8).reshape(
+                len(self.song_ids), user_count
+            )
+            self._score_table = np.array(SCORE_TABLE, dtype=np.int32)
+
+    def get_rating(self, user_id: int, song_id: int) -> Rating:
+        return Rating(
+            self._data[
+                self._song_index[song_id] * len(self.user_ids)
+                + self._user_index[user_id]
+            ]
+        )
+
+    def user_ratings(self, user_id: int, song_ids: list[int]) -> list[int]:
+        """One user's rating of each song, as ints."""
+        user_index = self._user_index[user_id]
+        if self._matrix is not None:
+            return self._matrix[self._rows(song_ids), user_index].tolist()
+
+        user_count = len(self.user_ids)
+        return [
+            self._data[self._song_index[song_id] * user_count + user_index]
+            for song_id in song_ids
+        ]
+
+    def _song_ratings(self, song_id: int) -> array:
+        user_count = len(self.user_ids)
+        start = self._song_index[song_id] * user_count
+        return self._data[start : start + user_count]
+
+    def combined_scores(self, song_ids: list[int]) -> list[int]:
+        """Sum of all users' rating scores, per song."""
+        if self._matrix is not None:
+            rows = self._matrix[self._rows(song_ids)]
+            return self._score_table[rows].sum(axis=1).tolist()
+
+        return [
+            sum(SCORE_TABLE[rating] for rating in self._song_ratings(song_id))
+            for song_id in song_ids
+        ]
+
+    def know_counts(self, song_ids: list[int]) -> list[int]:
+        """Number of users who know each song (SING_ALONG or better)."""
+        return self._count_at_least(song_ids, Rating.SING_ALONG)
+
+    def can_take_the_mic_counts(self, song_ids: list[int]) -> list[int]:
+        """Number of users who can take the mic for each song."""
+        return self._count_at_least(song_ids, Rating.CAN_TAKE_THE_MIC)
+
+    def _count_at_least(
+        self, song_ids: list[int], rating: Rating
+    ) -> list[int]:
+        if self._matrix is not None:
+            rows = self._matrix[self._rows(song_ids)]
+            return (rows >= rating).sum(axis=1).tolist()
+
+        return [
+            sum(1 for r in self._song_ratings(song_id) if r >= rating)
+            for song_id in song_ids
+        ]
+
+    def _rows(self, song_ids: list[int]) -> "ndarray":
+        # Only used with `_matrix`, which needs numpy.
+        assert np is not None
+        return np.fromiter(
+            (self._song_index[song_id] for song_id in song_ids),
+            dtype=np.intp,
+            count=len(song_ids),
+        )
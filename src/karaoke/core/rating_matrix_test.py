@@ -0,0 +1,54 @@
+import pytest
+from pytest import MonkeyPatch
+
+from karaoke.core import rating_matrix
+from karaoke.core.rating import Rating
+from karaoke.core.rating_matrix import RatingMatrix
+
+
+@pytest.fixture(params=["numpy", "fallback"])
+def matrix(
+    request: pytest.FixtureRequest, monkeypatch: MonkeyPatch
+) -> RatingMatrix:
+    if request.param == "fallback":
+        monkeypatch.setattr(rating_matrix, "np", None)
+    return RatingMatrix(
+        user_ids=[1, 2, 3],
+        song_ids=[10, 20, 30],
+        ratings=[
+            (1, 10, Rating.NEED_THE_MIC),
+            (2, 10, Rating.SING_ALONG),
+            (3, 10, Rating.DONT_KNOW),
+            (1, 20, Rating.CAN_TAKE_THE_MIC),
+            (2, 20, Rating.CAN_TAKE_THE_MIC),
+            # Ratings outside the session are ignored.
+            (4, 20, Rating.NEED_THE_MIC),
+            (1, 40, Rating.NEED_THE_MIC),
+        ],
+    )
+
+
+def test_get_rating(matrix: RatingMatrix) -> None:
+    assert matrix.get_rating(1, 10) == Rating.NEED_THE_MIC
+    # Missing ratings count as not knowing the song.
+    assert matrix.get_rating(3, 20) == Rating.DONT_KNOW
+    assert matrix.get_rating(2, 30) == Rating.DONT_KNOW
+
+
+def test_combined_scores(matrix: RatingMatrix) -> None:
+    assert matrix.combined_scores([10, 20, 30]) == [5, 3, -3]
+    assert matrix.combined_scores([30, 10]) == [-3, 5]
+    assert matrix.combined_scores([]) == []
+
+
+def test_counts(matrix: RatingMatrix) -> None:
+    assert matrix.know_counts([10, 20, 30]) == [2, 2, 0]
+    assert matrix.can_take_the_mic_counts([10, 20, 30]) == [1, 2, 0]
+
+
+def test_user_ratings(matrix: RatingMatrix) -> None:
+    assert matrix.user_ratings(2, [30, 10, 20]) == [
+        Rating.DONT_KNOW,
+        Rating.SING_ALONG,
+        Rating.CAN_TAKE_THE_MIC,
+    ]
@@ -0,0 +1,274 @@
+from contextlib import contextmanager
+from typing import Any, Callable, Iterator, Optional
+import json
+import logging
+import threading
+import uuid
+
+import redis
+from sqlalchemy.orm import Session
+
+from karaoke.core.live_session import (
+    FLUSH_INTERVAL,
+    LiveSessionRegistry,
+    LiveSessionState,
+)
+from karaoke.core.session import SESSION_TTL
+
+logger = logging.getLogger(__name__)
+
+KEY_PREFIX = "karaoke:live-session:"
+CHANNEL = "karaoke:live-sessions"
+
+# Seconds before the lock of a process that died mid-transition expires,
+# and seconds to wait for another process's transition to finish.
+LOCK_TIMEOUT = 10.0
+LOCK_WAIT = 5.0
+
+# Seconds to wait before resubscribing after losing the connection, and
+# between checks for `close` while listening.
+RESUBSCRIBE_DELAY = 1.0
+LISTEN_TIMEOUT = 1.0
+
+
+class RedisLiveSessionRegistry(LiveSessionRegistry):
+    """Live session states shared by several server processes through Redis.
+
+    Each process still keeps states in memory, but every transaction holds a
+    per-session Redis lock, starts from the latest version in Redis, and
+    stores the result back. Processes announce new versions on a pub/sub
+    channel, so the others drop their copies before the next read. Unflushed
+    changes travel with the state, so whichever process has the latest
+    version writes them to the database.
+    """
+
+    def __init__(
+        self,
+        client: redis.Redis,
+        session_factory: Callable[[], Session],
+        flush_interval: Optional[float] = FLUSH_INTERVAL,
+        pick_trace_size: int = 0,
+    ) -> None:
+        super().__init__(session_factory, flush_interval, pick_trace_size)
+        self._redis = client
+        # Tells this process's own messages apart from the others'.
+        self._origin = uuid.uuid4().hex
+        self._closed = threading.Event()
+        self._listener = threading.Thread(
+            target=self._run_listener, name="live-session-listener"
+        )
+        self._listener.daemon = True
+        self._listener.start()
+
+    @classmethod
+    def from_url(cls, url: str, **kwargs: Any) -> "RedisLiveSessionRegistry":
+        return cls(redis.Redis.from_url(url), **kwargs)
+
+    @contextmanager
+    def transaction(
+        self, display_id: str, session: Session
+    ) -> Iterator[Optional[LiveSessionState]]:
+        with self._redis.lock(
+            _lock_key(display_id),
+            timeout=LOCK_TIMEOUT,
+            blocking_timeout=LOCK_WAIT,
+        ):
+            if (state := self._latest(display_id, session)) is None:
+                yield None
+                return
+            with state.lock:
+                before = state.to_snapshot()
+                try:
+                    yield state
+                except BaseException:
+                    # The state may be half changed; start over from Redis.
+                    self._forget(display_id)
+                    raise
+                if state.to_snapshot() != before:
+                    # Versions keep counting up across evictions, so a copy
+                    # from before one never looks current.
+                    state.version = self._redis.incr(_version_key(display_id))
+                    self._store(state)
+                    self._send(display_id=display_id, version=state.version)
+
+    def publish(self, display_id: str, *events: str) -> None:
+        self._send(display_id=display_id, events=list(events))
+
+    @contextmanager
+    def evicting(self, display_id: str) -> Iterator[None]:
+        # Other processes wait for the lock before their next transaction,
+        # and only load the session once the change is committed.
+        with self._redis.lock(
+            _lock_key(display_id),
+            timeout=LOCK_TIMEOUT,
+            blocking_timeout=LOCK_WAIT,
+        ):
+            try:
+                with super().evicting(display_id):
+                    yield
+            finally:
+                # Drop what they read from the database in the meantime.
+                self._send(display_id=display_id, version=None)
+
+    def _evict(self, display_id: str) -> None:
+        if (snapshot := self._fetch(display_id)) is not None:
+            # Newer than (or the same as) any copy in this process.
+            state = LiveSessionState.from_snapshot(*snapshot)
+            if state.is_dirty:
+                self._flush_states([state])
+            with self._lock:
+                cached = self._states.get(display_id)
+            if cached is not None:
+                with cached.lock:
+                    self._drop(cached)
+        else:
+            super()._evict(display_id)
+        self._redis.delete(_key(display_id))
+
+    def ratings_changed(self, user_id: int, *events: str) -> list[str]:
+        self._send(ratings_user_id=user_id, events=list(events))
+        return super().ratings_changed(user_id)
+
+    def flush(self) -> None:
+        for state in self.states():
+            if not state.is_dirty:
+                continue
+            with self._redis.lock(
+                _lock_key(state.display_id),
+                timeout=LOCK_TIMEOUT,
+                blocking_timeout=LOCK_WAIT,
+            ), state.lock:
+                if self._stored_version(state.display_id) != state.version:
+                    # Another process has newer changes (including ours)
+                    # and flushes them itself.
+                    self._forget(state.display_id, state)
+                    continue
+                self._flush_states([state])
+                # Same version: only the pending changes were cleared.
+                self._store(state)
+
+    def close(self) -> None:
+        """Stop listening to the other processes."""
+        self._closed.set()
+        self._listener.join()
+
+    def _load(
+        self, display_id: str, session: Session
+    ) -> Optional[LiveSessionState]:
+        if (snapshot := self._fetch(display_id)) is not None:
+            return LiveSessionState.from_snapshot(*snapshot)
+        return super()._load(display_id, session)
+
+    def _latest(
+        self, display_id: str, session: Session
+    ) -> Optional[LiveSessionState]:
+        """The newest state, replacing the cached one if it's outdated."""
+        with self._lock:
+            cached = self._states.get(display_id)
+        stored_version = self._stored_version(display_id)
+        if cached is not None and stored_version == cached.version:
+            return self.get(display_id, session)
+
+        self._forget(display_id)
+        state = self.get(display_id, session)
+        if state is not None and cached is not None:
+            state.pick_traces = cached.pick_traces
+        return state
+
+    def _forget(
+        self, display_id: str, state: Optional[LiveSessionState] = None
+    ) -> None:
+        """Drop the cached state (only if it's still `state`, if given)."""
+        with self._lock:
+            if state is None or self._states.get(display_id) is state:
+                self._states.pop(display_id, None)
+
+    def _fetch(self, display_id: str) -> Optional[tuple[dict[str, Any], int]]:
+        stored = self._redis.hmget(_key(display_id), ["version", "state"])
+        if stored[0] is None or stored[1] is None:
+            return None
+        return json.loads(stored[1]), int(stored[0])
+
+    def _stored_version(self, display_id: str) -> Optional[int]:
+        version = self._redis.hget(_key(display_id), "version")
+        return None if version is None else int(version)
+
+    def _store(self, state: LiveSessionState) -> None:
+        key = _key(state.display_id)
+        pipeline = self._redis.pipeline()
+        pipeline.hset(
+            key,
+            mapping={
+                "version": state.version,
+                "state": json.dumps(state.to_snapshot()),
+            },
+        )
+        pipeline.expire(key, SESSION_TTL)
+        pipeline.expire(_version_key(state.display_id), SESSION_TTL)
+        pipeline.execute()
+
+    def _send(self, **message: Any) -> None:
+        self._redis.publish(
+            CHANNEL, json.dumps({"origin": self._origin, **message})
+        )
+
+    def _receive(self, message: dict[str, Any]) -> None:
+        if message.get("origin") == self._origin:
+            return
+
+        display_ids: list[str] = []
+        if "ratings_user_id" in message:
+            display_ids = super().ratings_changed(message["ratings_user_id"])
+        elif "display_id" in message:
+            display_id = message["display_id"]
+            display_ids = [display_id]
+            if "version" in message:
+                with self._lock:
+                    cached = self._states.get(display_id)
+                if cached is not None and (
+                    message["version"] is None
+                    or cached.version < message["version"]
+                ):
+                    self._forget(display_id, cached)
+
+        if message.get("events") and self.on_remote_events is not None:
+            for display_id in display_ids:
+                self.on_remote_events(display_id, *message["events"])
+
+    def _run_listener(self) -> None:
+        reconnecting = False
+        while not self._closed.is_set():
+            try:
+                with self._redis.pubsub(  # type: ignore[no-untyped-call]
+                    ignore_subscribe_messages=True
+                ) as pubsub:
+                    pubsub.subscribe(CHANNEL)
+                    if reconnecting:
+                        # Messages sent while we weren't listening are lost,
+                        # so nothing cached can be trusted anymore.
+                        with self._lock:
+                            self._states.clear()
+                        reconnecting = False
+                    while not self._closed.is_set():
+                        message = pubsub.get_message(timeout=LISTEN_TIMEOUT)
+                        if (
+                            message is not None
+                            and message["type"] == "message"
+                        ):
+                            self._receive(json.loads(message["data"]))
+            except Exception:
+                logger.exception("Lost the live session channel")
+                reconnecting = True
+                self._closed.wait(RESUBSCRIBE_DELAY)
+
+
+def _key(display_id: str) -> str:
+    return KEY_PREFIX + display_id
+
+
+def _lock_key(display_id: str) -> str:
+    return f"{KEY_PREFIX}{display_id}:lock"
+
+
+def _version_key(display_id: str) -> str:
+    return f"{KEY_PREFIX}{display_id}:version"
@@ -0,0 +1,250 @@
+"""Tests for sharing live sessions through Redis.
+
+They run against the Redis server at `$KARAOKE_TEST_REDIS_URL` (which is
+flushed), or against a `redis-server` spawned for the test if there's one on
+the PATH, or else against fakeredis (from the test dependencies). They're
+only skipped if none of these is available.
+"""
+
+from functools import partial
+from typing import Callable, Iterator, Optional
+import os
+import queue
+import shutil
+import socket
+import subprocess
+import threading
+import time
+
+import pytest
+import redis
+from pytest import fixture
+from sqlalchemy.orm import Session, sessionmaker
+
+from karaoke.core.live_session import LiveSessionRegistry
+from karaoke.core.live_session_test import (  # noqa: F401 (fixtures)
+    karaoke_session_id,
+    session_factory,
+)
+from karaoke.core.redis_live_session import (
+    CHANNEL,
+    RedisLiveSessionRegistry,
+)
+from karaoke.core.session import KaraokeSession
+from karaoke.core.user import User
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+RedisFactory = Callable[[], redis.Redis]
+
+
+@fixture
+def redis_factory() -> Iterator[RedisFactory]:
+    """Makes clients of one Redis server, like separate processes would."""
+    if url := os.environ.get("KARAOKE_TEST_REDIS_URL"):
+        redis.Redis.from_url(url).flushdb()
+        yield partial(redis.Redis.from_url, url)
+        return
+
+    if (server := shutil.which("redis-server")) is None:
+        fakeredis = pytest.importorskip(
+            "fakeredis",
+            reason="Needs redis-server, KARAOKE_TEST_REDIS_URL or fakeredis",
+        )
+        fake_server = fakeredis.FakeServer()
+        yield lambda: fakeredis.FakeRedis(server=fake_server)
+        return
+
+    port = _free_port()
+    process = subprocess.Popen(
+        [server, "--port", str(port), "--save", "", "--appendonly", "no"],
+        stdout=subprocess.DEVNULL,
+    )
+    url = f"redis://127.0.0.1:{port}/0"
+    client = redis.Redis.from_url(url)
+    deadline = time.monotonic() + 5
+    while True:
+        try:
+            client.ping()
+            break
+        except redis.ConnectionError:
+            if time.monotonic() > deadline:
+                process.kill()
+                raise
+            time.sleep(0.05)
+    yield partial(redis.Redis.from_url, url)
+    process.terminate()
+    process.wait()
+
+
+@fixture
+def registries(
+    redis_factory: RedisFactory,
+    session_factory: sessionmaker[Session],  # noqa: F811
+) -> Iterator[list[RedisLiveSessionRegistry]]:
+    """Two registries standing in for two server processes."""
+    registries = [
+        RedisLiveSessionRegistry(
+            redis_factory(),
+            session_factory=session_factory,
+            flush_interval=None,
+        )
+        for _ in range(2)
+    ]
+    # Wait until both listen, or they'd miss the first messages.
+    client = redis_factory()
+    while client.pubsub_numsub(CHANNEL)[0][1] < len(registries):
+        time.sleep(0.01)
+    yield registries
+    for registry in registries:
+        registry.close()
+
+
+def _next_song(
+    registry: LiveSessionRegistry,
+    display_id: str,
+    session_factory: sessionmaker[Session],  # noqa: F811
+) -> Optional[int]:
+    with session_factory() as session:
+        with registry.transaction(display_id, session) as state:
+            assert state is not None
+            state.mark_current_song_as_played()
+            return state.get_next_song()
+
+
+def test_transitions_are_shared(
+    registries: list[RedisLiveSessionRegistry],
+    session_factory: sessionmaker[Session],  # noqa: F811
+    karaoke_session_id: str,  # noqa: F811
+) -> None:
+    first, second = registries
+    picks = [
+        _next_song(registry, karaoke_session_id, session_factory)
+        for registry in [first, second, first, second]
+    ]
+
+    assert len(set(picks)) == len(picks)
+    with session_factory() as session:
+        for registry in registries:
+            state = registry.get(karaoke_session_id, session)
+            assert state is not None
+            assert state.current_song_id == picks[-1]
+            assert set(picks[:-1]) <= state.played
+
+
+def test_latest_version_is_flushed(
+    registries: list[RedisLiveSessionRegistry],
+    session_factory: sessionmaker[Session],  # noqa: F811
+    karaoke_session_id: str,  # noqa: F811
+) -> None:
+    first, second = registries
+    _next_song(first, karaoke_session_id, session_factory)
+    song_id = _next_song(second, karaoke_session_id, session_factory)
+
+    # The first registry's copy is outdated, so it leaves flushing to the
+    # second one.
+    first.flush()
+    second.flush()
+
+    with session_factory() as session:
+        karaoke_session = (
+            session.query(KaraokeSession)
+            .filter_by(display_id=karaoke_session_id)
+            .one()
+        )
+        assert karaoke_session.current_song_id == song_id
+        assert karaoke_session.played_count == 1
+
+
+def test_evict_reloads_from_database(
+    registries: list[RedisLiveSessionRegistry],
+    session_factory: sessionmaker[Session],  # noqa: F811
+    karaoke_session_id: str,  # noqa: F811
+) -> None:
+    first, second = registries
+    song_id = _next_song(first, karaoke_session_id, session_factory)
+
+    second.evict(karaoke_session_id)
+
+    with session_factory() as session:
+        karaoke_session = (
+            session.query(KaraokeSession)
+            .filter_by(display_id=karaoke_session_id)
+            .one()
+        )
+        assert karaoke_session.current_song_id == song_id
+        with first.transaction(karaoke_session_id, session) as state:
+            assert state is not None
+            assert state.current_song_id == song_id
+            assert state.version == 0
+
+
+def test_events_reach_other_processes(
+    registries: list[RedisLiveSessionRegistry],
+    session_factory: sessionmaker[Session],  # noqa: F811
+    karaoke_session_id: str,  # noqa: F811
+) -> None:
+    first, second = registries
+    received: queue.Queue[tuple[str, ...]] = queue.Queue()
+    first.on_remote_events = lambda *args: received.put(("first", *args))
+    second.on_remote_events = lambda *args: received.put(("second", *args))
+    with session_factory() as session:
+        first.get(karaoke_session_id, session)
+        second.get(karaoke_session_id, session)
+
+    first.publish(karaoke_session_id, "song")
+    assert received.get(timeout=5) == ("second", karaoke_session_id, "song")
+
+    user_id = next(iter(first.states()[0].members))
+    assert second.ratings_changed(user_id, "ratings") == [karaoke_session_id]
+    assert received.get(timeout=5) == (
+        "first",
+        karaoke_session_id,
+        "ratings",
+    )
+    assert first.states()[0].rating_matrix is None
+    assert received.empty()
+
+
+def test_other_processes_wait_while_evicting(
+    registries: list[RedisLiveSessionRegistry],
+    session_factory: sessionmaker[Session],  # noqa: F811
+    karaoke_session_id: str,  # noqa: F811
+) -> None:
+    first, second = registries
+    with session_factory() as session:
+        second.get(karaoke_session_id, session)
+        session.add(late_user := User(name="late"))
+        session.commit()
+        late_user_id = late_user.id
+        karaoke_session = (
+            session.query(KaraokeSession)
+            .filter_by(display_id=karaoke_session_id)
+            .one()
+        )
+
+        members: list[set[int]] = []
+
+        def read_members() -> None:
+            with session_factory() as other_session:
+                with second.transaction(
+                    karaoke_session_id, other_session
+                ) as state:
+                    assert state is not None
+                    members.append(set(state.members))
+
+        with first.evicting(karaoke_session_id):
+            reader = threading.Thread(target=read_members)
+            reader.start()
+            reader.join(timeout=0.2)
+            # It waits for the new member instead of using its old copy.
+            assert reader.is_alive()
+            karaoke_session.add_user_to_session(late_user_id, session=session)
+        reader.join()
+
+    assert late_user_id in members[0]
@@ -0,0 +1,193 @@
+from dataclasses import asdict, dataclass, field
+from typing import Any, Iterable, Optional
+import random
+
+from karaoke.core import metrics
+from karaoke.core.rating import Rating
+from karaoke.core.rating_matrix import RatingMatrix
+
+
+@dataclass
+class Member:
+    """The parts of a session user that song selection looks at."""
+
+    user_id: int
+    score: int = 0
+    stepped_out: bool = False
+
+
+@dataclass
+class PruneStep:
+    user_id: int
+    # Rating the kept candidates share, None if the member rated none of
+    # them in a useful way and kept them all.
+    rating: Optional[Rating]
+    candidates_left: int
+
+
+@dataclass
+class PickTrace:
+    """Why `pick_song` picked what it did.
+
+    Only built when asked for (see `pick_song`'s `trace`), so picking a song
+    costs nothing extra otherwise.
+    """
+
+    candidates: int
+    # Members in the order they got to prune the candidates.
+    members: list[Member] = field(default_factory=list)
+    prunes: list[PruneStep] = field(default_factory=list)
+    song_id: Optional[int] = None
+    combined_score: Optional[int] = None
+
+    def as_dict(self) -> dict[str, Any]:
+        return {
+            "candidates": self.candidates,
+            "members": [asdict(member) for member in self.members],
+            "prunes": [
+                {
+                    "user_id": step.user_id,
+                    "rating": step.rating.name if step.rating else None,
+                    "candidates_left": step.candidates_left,
+                }
+                for step in self.prunes
+            ],
+            "song_id": self.song_id,
+            "combined_score": self.combined_score,
+        }
+
+
+def order_members(members: Iterable[Member]) -> list[Member]:
+    """Order in which members get to prune the candidates.
+
+    Stepped-out members go first, then present members from lowest score to
+    highest.
+    """
+    stepped_out_members: list[Member] = []
+    present_members: list[Member] = []
+
+    for member in members:
+        if member.stepped_out:
+            stepped_out_members.append(member)
+        else:
+            present_members.append(member)
+
+    # Shuffle the present users before sorting so that we don't always pick
+    # the user with the lowest ID in the case of a tie (`sorted` is
+    # stable).
+    random.shuffle(present_members)
+    sorted_present_members: list[Member] = sorted(
+        present_members, key=lambda member: member.score
+    )
+
+    return stepped_out_members + sorted_present_members
+
+
+def prune_candidates_for_user(
+    candidates: list[int],
+    member: Member,
+    rating_matrix: RatingMatrix,
+    trace: Optional[PickTrace] = None,
+) -> list[int]:
+    """Keep only the candidates the member rated best."""
+
+    rating_order = [
+        Rating.NEED_THE_MIC,
+        Rating.CAN_TAKE_THE_MIC,
+        Rating.SING_ALONG,
+        Rating.DONT_KNOW,
+    ]
+    # For users who stepped out, we want to choose songs they don't know.
+    if member.stepped_out:
+        rating_order.reverse()
+
+    user_ratings = rating_matrix.user_ratings(member.user_id, candidates)
+    for rating in rating_order:
+        pruned_candidates: list[int] = [
+            song_id
+            for song_id, user_rating in zip(candidates, user_ratings)
+            if user_rating == rating
+        ]
+        if pruned_candidates:
+            if trace is not None:
+                trace.prunes.append(
+                    PruneStep(member.user_id, rating, len(pruned_candidates))
+                )
+            return pruned_candidates
+
+    # This user wouldn't benefit from any of the candidates, so we'll
+    # just return the original list
+    if trace is not None:
+        trace.prunes.append(PruneStep(member.user_id, None, len(candidates)))
+    return candidates
+
+
+def pick_song(
+    candidates: list[int],
+    members: Iterable[Member],
+    rating_matrix: RatingMatrix,
+    trace: Optional[PickTrace] = None,
+) -> Optional[int]:
+    """Pick the next song ID out of `candidates`, or None if there are none.
+
+    If a `trace` is given, the members' order, what each of them pruned and
+    the pick are recorded in it.
+    """
+    sorted_members = order_members(members)
+    if trace is not None:
+        trace.members = [
+            Member(member.user_id, member.score, member.stepped_out)
+            for member in sorted_members
+        ]
+
+    if not candidates:
+        return None
+
+    for member in sorted_members:
+        candidates = prune_candidates_for_user(
+            candidates, member, rating_matrix, trace
+        )
+        if len(candidates) == 1:
+            break
+
+    if not candidates:
+        raise RuntimeError("This should never happen")
+    metrics.CANDIDATES_AFTER_PRUNE.observe(len(candidates))
+    metrics.SONGS_PICKED.inc()
+
+    # Highest combined score wins; ties go to the earliest candidate.
+    scores = rating_matrix.combined_scores(candidates)
+    picked_index = max(range(len(candidates)), key=scores.__getitem__)
+    if trace is not None:
+        trace.song_id = candidates[picked_index]
+        trace.combined_score = int(scores[picked_index])
+    return candidates[picked_index]
+
+
+def initial_snoozes(
+    song_ids: list[int],
+    rating_matrix: RatingMatrix,
+    know_counts: dict[int, int],
+    know_count_threshold: int,
+    top_n: int = 10,
+) -> dict[int, int]:
+    """Songs to snooze before a session starts, and for how many songs.
+
+    The top `top_n` songs by combined score are spread out over the start of
+    the session, and songs that fewer than `know_count_threshold` people
+    know are held back a while.
+    """
+    snoozes: dict[int, int] = {}
+
+    scores = rating_matrix.combined_scores(song_ids)
+    top_indices = sorted(
+        range(len(song_ids)), key=scores.__getitem__, reverse=True
+    )[:top_n]
+    for index, song_index in enumerate(reversed(top_indices)):
+        snoozes[song_ids[song_index]] = random.randrange(5, 20 - index)
+
+    for song_id in song_ids:
+        if know_counts.get(song_id, 0) < know_count_threshold:
+            snoozes[song_id] = random.randrange(10, 20)
+
+    return snoozes
@@ -3,16 +3,29 @@ from sqlalchemy import (
     String,
     select,
     func,
-    text,
     case,
+    delete,
+    insert,
+    update,
 )
+from sqlalchemy.exc import IntegrityError
 from typing import Optional
-from sqlalchemy.orm import Mapped, mapped_column, relationship, Session
+from sqlalchemy.orm import (
+    Mapped,
+    mapped_column,
+    relationship,
+    Session,
+    aliased,
+)
+from datetime import datetime, timedelta, timezone
 import random
 import logging
 
+from karaoke.core import metrics
 from karaoke.core.base import Base
-from karaoke.core.rating import UserSongRating, Rating
+from karaoke.core.rating import UserSongRating, Rating, RATING_SCORES
+from karaoke.core.rating_matrix import RatingMatrix
+from karaoke.core.selection import Member, initial_snoozes, pick_song
 from karaoke.core.song import Song
 from karaoke.core.user import User
 
@@ -21,6 +34,12 @@ logger = logging.getLogger(__name__)
 # Number of songs to hold off when snoozing a song.
 SNOOZE_TTL = 5
 
+# Sessions older than this give up their display ID for reuse.
+SESSION_TTL = timedelta(days=1)
+
+# Random display IDs to try before giving up on creating a session.
+MAX_DISPLAY_ID_ATTEMPTS = 100
+
 
 class KaraokeSessionUser(Base):
     __tablename__ = "karaoke_session_user"
@@ -50,8 +69,101 @@ class KaraokeSessionSong(Base):
     )
     song: Mapped[Song] = relationship()
     played: Mapped[bool] = mapped_column()
-    current_song: Mapped[bool] = mapped_column(default=False)
-    snooze_ttl: Mapped[int] = mapped_column(default=0)
+    # The song is snoozed until the session's `played_count` reaches this.
+    snoozed_until: Mapped[int] = mapped_column(default=0)
+
+    def is_snoozed(self, played_count: int) -> bool:
+        return self.snoozed_until > played_count
+
+
+def load_rating_matrix(
+    karaoke_session_id: Optional[int],
+    user_ids: list[int],
+    song_ids: list[int],
+    session: Session,
+) -> RatingMatrix:
+    """Load the ratings of `user_ids` for the songs in a session's queue.
+
+    With no `karaoke_session_id`, all of the users' ratings are read and
+    the ones for songs outside `song_ids` are dropped.
+    """
+    query = select(
+        UserSongRating.user_id,
+        UserSongRating.song_id,
+        UserSongRating.rating,
+    ).where(UserSongRating.user_id.in_(user_ids))
+    if karaoke_session_id is not None:
+        query = query.where(
+            UserSongRating.song_id.in_(
+                select(KaraokeSessionSong.song_id).where(
+                    KaraokeSessionSong.karaoke_session_id == karaoke_session_id
+                )
+            )
+        )
+    return RatingMatrix(user_ids, song_ids, session.execute(query))
+
+
+def select_queue_song_ids(
+    user_ids: list[int],
+    session: Session,
+    *,
+    known_by: Optional[int] = None,
+) -> list[int]:
+    """IDs of the songs a session for `user_ids` should queue, in order.
+
+    A song is queued if at least two of the users know it and at least one
+    of them can take the mic. With `known_by`, only songs that user knows
+    are considered.
+    """
+    know_count = func.count()
+    can_take_the_mic_count = func.count(
+        case(
+            (UserSongRating.rating == Rating.CAN_TAKE_THE_MIC, 1),
+            (UserSongRating.rating == Rating.NEED_THE_MIC, 1),
+            else_=None,
+        )
+    )
+    # Aggregates are repeated in HAVING rather than referred to by label,
+    # which PostgreSQL doesn't allow.
+    songs_ids_query = (
+        select(UserSongRating.song_id)
+        .where(UserSongRating.user_id.in_(user_ids))
+        .where(UserSongRating.rating != Rating.DONT_KNOW)
+    )
+    if known_by is not None:
+        known_rating = aliased(UserSongRating)
+        songs_ids_query = songs_ids_query.where(
+            UserSongRating.song_id.in_(
+                select(known_rating.song_id)
+                .where(known_rating.user_id == known_by)
+                .where(known_rating.rating != Rating.DONT_KNOW)
+            )
+        )
+    songs_ids_query = (
+        songs_ids_query.group_by(UserSongRating.song_id)
+        .having(know_count > 1)  # At least 2 people know it
+        .having(can_take_the_mic_count > 0)  # At least 1 person can sing it
+        .order_by(UserSongRating.song_id)
+    )
+
+    song_ids = list(session.scalars(songs_ids_query))
+    return song_ids
+
+
+def load_know_counts(song_ids: list[int], session: Session) -> dict[int, int]:
+    """Number of users (in or out of the session) who know each song."""
+    return dict(
+        session.execute(
+            select(UserSongRating.song_id, func.count())
+            .where(UserSongRating.song_id.in_(song_ids))
+            .where(
+                UserSongRating.rating.not_in(
+                    [Rating.DONT_KNOW, Rating.UNKNOWN]
+                )
+            )
+            .group_by(UserSongRating.song_id)
+        ).all()
+    )
 
 
 def generate_id() -> str:
@@ -59,6 +171,10 @@ def generate_id() -> str:
     return "".join(random.choices(letters, k=4))
 
 
+def utcnow() -> datetime:
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
 class KaraokeSession(Base):
     __tablename__ = "karaoke_session"
 
@@ -67,15 +183,71 @@ class KaraokeSession(Base):
         String(4), nullable=True, unique=True
     )
     users: Mapped[list[KaraokeSessionUser]] = relationship()
-    songs: Mapped[list[KaraokeSessionSong]] = relationship()
+    songs: Mapped[list[KaraokeSessionSong]] = relationship(
+        order_by=KaraokeSessionSong.song_id
+    )
+    # Number of songs marked as played (skips don't count). Snoozes are
+    # measured against this.
+    played_count: Mapped[int] = mapped_column(default=0)
+    # The song that's playing now, if any. Always one of `songs`.
+    current_song_id: Mapped[Optional[int]] = mapped_column(
+        ForeignKey("song.id"), nullable=True, index=True
+    )
+    # UTC. Once the session is older than `SESSION_TTL`, its display ID
+    # can be handed out again.
+    created_at: Mapped[datetime] = mapped_column(default=utcnow)
+
+    # Not persisted; built on demand and dropped when users or songs change.
+    _rating_matrix = None  # type: Optional[RatingMatrix]
+
+    def get_rating_matrix(self) -> RatingMatrix:
+        if self._rating_matrix is None:
+            session = Session.object_session(self)
+            if session is None:
+                raise RuntimeError(f"{self} isn't attached to a session")
+            self._rating_matrix = load_rating_matrix(
+                karaoke_session_id=self.id,
+                user_ids=[user.user_id for user in self.users],
+                song_ids=[song.song_id for song in self.songs],
+                session=session,
+            )
+        return self._rating_matrix
+
+    def invalidate_rating_matrix(self) -> None:
+        self._rating_matrix = None
 
     def generate_display_id(self, session: Session) -> None:
-        display_id = generate_id()
-        all_sessions = session.query(KaraokeSession).all()
-        all_display_ids = [ks.display_id for ks in all_sessions]
-        while display_id in all_display_ids:
+        """Insert the session and give it a random, unused display ID.
+
+        Each attempt takes the ID away from its previous session if that
+        one expired, and then claims it, relying on the unique constraint to
+        reject IDs that are still in use. This doesn't depend on the number
+        of past sessions.
+        """
+        session.add(self)
+        session.flush()
+
+        expired_before = utcnow() - SESSION_TTL
+        for _ in range(MAX_DISPLAY_ID_ATTEMPTS):
             display_id = generate_id()
-        self.display_id = display_id
+            try:
+                with session.begin_nested():
+                    session.execute(
+                        update(KaraokeSession)
+                        .where(KaraokeSession.display_id == display_id)
+                        .where(KaraokeSession.created_at < expired_before)
+                        .values(display_id=None)
+                    )
+                    session.execute(
+                        update(KaraokeSession)
+                        .where(KaraokeSession.id == self.id)
+                        .values(display_id=display_id)
+                    )
+                return
+            except IntegrityError:
+                logger.info("Display ID %s is taken, retrying", display_id)
+
+        raise RuntimeError("Couldn't find a free display ID")
 
     def add_user_to_session(self, user_id: int, session: Session) -> None:
         session_user = KaraokeSessionUser(
@@ -84,7 +256,15 @@ class KaraokeSession(Base):
         )
         session.add(session_user)
         session.commit()
-        self.generate_song_queue(session=session)
+        self.invalidate_rating_matrix()
+
+        # Only songs the new user knows can have become eligible.
+        user_ids = [user.user_id for user in self.users]
+        self._add_songs_to_queue(
+            select_queue_song_ids(user_ids, session=session, known_by=user_id),
+            session=session,
+        )
+        self._snooze_songs_before_start(session=session)
 
     def remove_user_from_session(self, user_id: int, session: Session) -> None:
         # Remove the user from the session.
@@ -95,265 +275,187 @@ class KaraokeSession(Base):
         )
         session.delete(session_user)
         session.commit()
+        self.invalidate_rating_matrix()
 
-    def generate_song_queue(self, session: Session) -> None:
+        # Only songs the leaving user knew can have become ineligible. Songs
+        # that were played or are playing now stay.
         user_ids = [user.user_id for user in self.users]
-
-        songs_ids_query = (
-            select(
-                UserSongRating.song_id,
-                func.count("*").label("know_this_song_count"),
-                func.count(
-                    case(
-                        (UserSongRating.rating == Rating.CAN_TAKE_THE_MIC, 1),
-                        (UserSongRating.rating == Rating.NEED_THE_MIC, 1),
-                        else_=None,
-                    )
-                ).label("can_take_the_mic_count"),
+        known_song_ids = set(
+            session.scalars(
+                select(UserSongRating.song_id)
+                .where(UserSongRating.user_id == user_id)
+                .where(UserSongRating.rating != Rating.DONT_KNOW)
             )
-            .select_from(UserSongRating)
-            .where(UserSongRating.user_id.in_(user_ids))
-            .where(UserSongRating.rating != Rating.DONT_KNOW)
-            .group_by(UserSongRating.song_id)
-            .having(
-                text("know_this_song_count > 1")
-            )  # At least 2 people know it
-            .having(
-                text("can_take_the_mic_count > 0")
-            )  # At least 1 person can sing it
-            .subquery()
         )
-
-        logger.info(f"{session.query(songs_ids_query).all()=}")
-        song_ids = (row[0] for row in session.query(songs_ids_query).all())
-
-        # In case we're regenerating the song queue because a new user joined,
-        # we need to be careful not to re-add songs that are already in the queue.
-        existing_song_ids = [song.song_id for song in self.songs]
-
-        added_count = 0
-        for song_id in song_ids:
-            if song_id in existing_song_ids:
-                continue
-            kss = KaraokeSessionSong(
-                karaoke_session_id=self.id, song_id=song_id, played=False
+        still_eligible = set(
+            select_queue_song_ids(user_ids, session=session, known_by=user_id)
+        )
+        dropped_song_ids = [
+            song.song_id
+            for song in self.songs
+            if not song.played
+            if song.song_id != self.current_song_id
+            if song.song_id in known_song_ids
+            if song.song_id not in still_eligible
+        ]
+        if dropped_song_ids:
+            session.execute(
+                delete(KaraokeSessionSong)
+                .where(KaraokeSessionSong.karaoke_session_id == self.id)
+                .where(KaraokeSessionSong.song_id.in_(dropped_song_ids))
             )
-            self.songs.append(kss)
-            session.add(kss)
-            added_count += 1
+            session.commit()
+            session.expire(self, ["songs"])
+        logger.info("Removed %d songs from the queue.", len(dropped_song_ids))
 
-        logger.warn(f"Added {added_count} songs to the queue.")
+    def generate_song_queue(self, session: Session) -> None:
+        with metrics.GENERATE_SONG_QUEUE_SECONDS.time():
+            user_ids = [user.user_id for user in self.users]
+            self._add_songs_to_queue(
+                select_queue_song_ids(user_ids, session=session),
+                session=session,
+            )
+            self._snooze_songs_before_start(session=session)
+
+    def _add_songs_to_queue(
+        self, song_ids: list[int], session: Session
+    ) -> None:
+        existing_song_ids = {song.song_id for song in self.songs}
+        new_song_ids = [
+            song_id for song_id in song_ids if song_id not in existing_song_ids
+        ]
+        if new_song_ids:
+            session.execute(
+                insert(KaraokeSessionSong),
+                [
+                    {
+                        "karaoke_session_id": self.id,
+                        "song_id": song_id,
+                        "played": False,
+                    }
+                    for song_id in new_song_ids
+                ],
+            )
+        logger.info("Added %d songs to the queue.", len(new_song_ids))
 
         session.commit()
+        session.expire(self, ["songs"])
+        self.invalidate_rating_matrix()
 
+    def _snooze_songs_before_start(self, session: Session) -> None:
         # Snooze some songs for a better experience, but only if the session hasn't started yet.
         if self.get_played_songs_count() == 0:
-            self.snooze_top_songs(10)
-            self.snooze_obscure_songs(know_count_threshold=len(user_ids) // 2)
+            user_ids = [user.user_id for user in self.users]
+            queued_song_ids = [song.song_id for song in self.songs]
+            snoozes = initial_snoozes(
+                queued_song_ids,
+                self.get_rating_matrix(),
+                know_counts=load_know_counts(queued_song_ids, session),
+                know_count_threshold=len(user_ids) // 2,
+            )
+            for song in self.songs:
+                if song.song_id in snoozes:
+                    song.snoozed_until = (
+                        self.played_count + snoozes[song.song_id]
+                    )
             session.commit()
 
-    def snooze_top_songs(self, n):
-        """Snooze the top `n` songs for a more balanced session."""
-        sorted_candidates = list(self.songs)
-        sorted_candidates.sort(
-            key=lambda s: self.get_combined_score(s), reverse=True
-        )
-        for index, song in enumerate(reversed(sorted_candidates[:n])):
-            song.snooze_ttl = random.randrange(5, 20 - index)
-
-    def snooze_obscure_songs(self, know_count_threshold):
-        """Snooze songs that only a few people know."""
-
-        for song in self.songs:
-            know_count = 0
-            for rating in song.song.ratings:
-                if rating.rating not in (Rating.DONT_KNOW, Rating.UNKNOWN):
-                    know_count += 1
-            if know_count < know_count_threshold:
-                song.snooze_ttl = random.randrange(10, 20)
-
     def get_played_songs_count(self):
         return len([song for song in self.songs if song.played])
 
-    def prune_candidates_for_user(
-        self,
-        candidates: list[KaraokeSessionSong],
-        user: KaraokeSessionUser,
-    ) -> list[KaraokeSessionSong]:
-        logger.info(
-            f"Pruning {len(candidates)} candidates for {user.user.name}"
-        )
-        logger.info(f"\t{user.user.name} has {len(user.user.ratings)} ratings")
-        pruned_candidates: list[KaraokeSessionSong] = []
-
-        user_ratings = {
-            song_rating.song_id: song_rating.rating
-            for song_rating in user.user.ratings
-        }
-
-        rating_order = [
-            Rating.NEED_THE_MIC,
-            Rating.CAN_TAKE_THE_MIC,
-            Rating.SING_ALONG,
-            Rating.DONT_KNOW,
-        ]
-        # For users who stepped out, we want to choose songs they don't know.
-        if user.stepped_out:
-            rating_order.reverse()
-
-        for rating in rating_order:
-            logger.info(f"\tSearching for rating {rating}")
-            for song in candidates:
-                if user_ratings.get(song.song_id, Rating.DONT_KNOW) == rating:
-                    logger.info(
-                        f"\t\tMatched: {song.song.title} by {song.song.artist}"
-                    )
-                    pruned_candidates.append(song)
-
-            if pruned_candidates:
-                if len(pruned_candidates) == len(candidates):
-                    logger.info(f"\tAll songs matched, not pruning.")
-                return pruned_candidates
-            else:
-                logger.info(f"\t\tNo songs found with rating {rating}")
-
-        # This user wouldn't benefit from any of the candidates, so we'll
-        # just return the original list
-        logger.info(
-            f"\t{user.user.name} doesn't know any of the candidates, not pruning."
-        )
-        return candidates
-
     @staticmethod
     def get_rating_score(rating: Rating) -> int:
-        return {
-            Rating.DONT_KNOW: -1,
-            Rating.SING_ALONG: 1,
-            Rating.CAN_TAKE_THE_MIC: 2,
-            Rating.NEED_THE_MIC: 5,
-        }[rating]
+        return RATING_SCORES[rating]
 
     def get_combined_score(self, song: KaraokeSessionSong) -> int:
-        score = 0
-        for user in self.users:
-            score += self.get_rating_score(
-                {
-                    rating.user: rating.rating for rating in song.song.ratings
-                }.get(user.user, Rating.DONT_KNOW)
-            )
-        return score
+        return self.get_rating_matrix().combined_scores([song.song_id])[0]
+
+    def sort_by_combined_score(
+        self, songs: list[KaraokeSessionSong]
+    ) -> list[KaraokeSessionSong]:
+        """Sort songs by combined score, highest first (stable)."""
+        scores = self.get_rating_matrix().combined_scores(
+            [song.song_id for song in songs]
+        )
+        score_by_song_id = dict(zip((song.song_id for song in songs), scores))
+        return sorted(
+            songs, key=lambda s: score_by_song_id[s.song_id], reverse=True
+        )
 
     def mark_current_song_as_played(self, *, session: Session) -> None:
         if (current_song := self.get_current_song(session=session)) is None:
             return
 
         current_song.played = True
-        current_song.current_song = False
+        self.current_song_id = None
 
         # Update user scores.
-        song_ratings: dict[int, Rating] = {
-            rating.user_id: rating.rating
-            for rating in current_song.song.ratings
-        }
-
+        rating_matrix = self.get_rating_matrix()
         for user in self.users:
             user.score += self.get_rating_score(
-                song_ratings.get(user.user_id, Rating.DONT_KNOW)
+                rating_matrix.get_rating(user.user_id, current_song.song_id)
             )
 
-        # Decrement snooze TTL by 1 for all snoozed songs.
-        for song in self.songs:
-            if song.snooze_ttl > 0:
-                song.snooze_ttl -= 1
+        # Snoozed songs become available again as this goes up.
+        self.played_count += 1
 
     def get_current_song(
         self, *, session: Session
     ) -> Optional[KaraokeSessionSong]:
-        for song in self.songs:
-            if song.current_song:
-                logger.info(f"Found current song: {song.song.title}")
-                return song
+        if self.current_song_id is None:
+            return None
 
-        logger.info(f"No current song found.")
-        return None
+        return session.get(KaraokeSessionSong, (self.id, self.current_song_id))
 
     def replace_current_song(self, song_id, *, session: Session) -> None:
-        current_song = self.get_current_song(session=session)
-        if current_song is not None:
-            current_song.current_song = False
-        for song in self.songs:
-            if song.song_id == song_id:
-                song.current_song = True
+        if session.get(KaraokeSessionSong, (self.id, song_id)) is not None:
+            self.current_song_id = song_id
+        else:
+            self.current_song_id = None
 
     def skip_current_song(self, session: Session) -> None:
         if (current_song := self.get_current_song(session=session)) is None:
             return
         current_song.played = True
-        current_song.current_song = False
+        self.current_song_id = None
+        metrics.SONGS_SKIPPED.inc()
 
     def snooze_current_song(self, *, session: Session) -> None:
         if (current_song := self.get_current_song(session=session)) is None:
             return
-        current_song.current_song = False
-        current_song.snooze_ttl = SNOOZE_TTL
+        self.current_song_id = None
+        current_song.snoozed_until = self.played_count + SNOOZE_TTL
+        metrics.SONGS_SNOOZED.inc()
 
     def get_next_song(self, *, session: Session) -> Optional[Song]:
         if self.get_current_song(session=session) is not None:
-            logger.info(f"Current song is still playing.")
+            logger.info("Current song is still playing.")
             return None
 
-        candidates: list[KaraokeSessionSong] = [
-            song
+        candidates: list[int] = [
+            song.song_id
             for song in self.songs
             if not song.played
-            if not song.snooze_ttl
+            if not song.is_snoozed(self.played_count)
+        ]
+        members: list[Member] = [
+            Member(
+                user_id=user.user_id,
+                score=user.score,
+                stepped_out=user.stepped_out,
+            )
+            for user in self.users
         ]
 
-        stepped_out_users: list[KaraokeSessionUser] = []
-        present_users: list[KaraokeSessionUser] = []
-
-        for user in self.users:
-            if user.stepped_out:
-                stepped_out_users.append(user)
-            else:
-                present_users.append(user)
-
-        # Shuffle the present users before sorting so that we don't always pick
-        # the user with the lowest ID in the case of a tie (`sorted` is
-        # stable).
-        random.shuffle(present_users)
-        sorted_present_users: list[KaraokeSessionUser] = sorted(
-            present_users, key=lambda user: user.score
-        )
-
-        sorted_users = stepped_out_users + sorted_present_users
-
-        logger.info(
-            f"Getting next song from {len(candidates)} remaining unplayed songs"
-        )
-
-        if not candidates:
+        with metrics.GET_NEXT_SONG_SECONDS.time():
+            picked_song_id = pick_song(
+                candidates, members, self.get_rating_matrix()
+            )
+        if picked_song_id is None:
             return None
 
-        for user in sorted_users:
-            candidates = self.prune_candidates_for_user(candidates, user)
-            if len(candidates) == 1:
-                logger.info(f"Left with one candidate, stopping.")
-                break
-        else:
-            logger.info(f"Pruned for all users, Found {len(candidates)}")
-
-        if not candidates:
-            raise RuntimeError("This should never happen")
-
-        sorted_candidates = list(candidates)
-        sorted_candidates.sort(
-            key=lambda s: self.get_combined_score(s), reverse=True
+        picked: KaraokeSessionSong = next(
+            song for song in self.songs if song.song_id == picked_song_id
         )
-
-        picked: KaraokeSessionSong = sorted_candidates[0]
-        logger.warn(f"Picked song from {len(sorted_candidates)} candidates")
-        logger.info(f"Picked {picked.song.title}.")
-        logger.info(f"Combined score: {self.get_combined_score(picked)}")
-        picked.current_song = True
+        self.current_song_id = picked_song_id
         return picked.song
@@ -0,0 +1,72 @@
+from dataclasses import dataclass
+from typing import Optional
+
+from sqlalchemy.orm import Session
+
+from karaoke.core import metrics
+from karaoke.core.live_session import LiveSessionState
+from karaoke.core.selection import Member, initial_snoozes
+from karaoke.core.session import (
+    load_know_counts,
+    load_rating_matrix,
+    select_queue_song_ids,
+)
+
+
+@dataclass
+class PlaylistEntry:
+    song_id: int
+    # Every user's score right after the song was played, by user ID.
+    scores: dict[int, int]
+
+
+def simulate_playlist(
+    user_ids: list[int], session: Session, *, limit: Optional[int] = None
+) -> list[PlaylistEntry]:
+    """The songs a new session for `user_ids` would play, in order.
+
+    Assumes every picked song gets played. The queue and ratings are read
+    once and the session is played out in memory; nothing is written to the
+    database, and no metrics are recorded.
+    """
+    user_ids = list(user_ids)
+    song_ids = select_queue_song_ids(user_ids, session=session)
+    rating_matrix = load_rating_matrix(
+        karaoke_session_id=None,
+        user_ids=user_ids,
+        song_ids=song_ids,
+        session=session,
+    )
+    snoozes = initial_snoozes(
+        song_ids,
+        rating_matrix,
+        know_counts=load_know_counts(song_ids, session),
+        know_count_threshold=len(user_ids) // 2,
+    )
+
+    # Not backed by a session row, and never flushed.
+    state = LiveSessionState(
+        karaoke_session_id=-1,
+        display_id="",
+        queue=song_ids,
+        members={user_id: Member(user_id=user_id) for user_id in user_ids},
+        snoozed_until=snoozes,
+        rating_matrix=rating_matrix,
+    )
+
+    playlist: list[PlaylistEntry] = []
+    with metrics.paused():
+        while limit is None or len(playlist) < limit:
+            if (song_id := state.get_next_song()) is None:
+                break
+            state.mark_current_song_as_played()
+            playlist.append(
+                PlaylistEntry(
+                    song_id=song_id,
+                    scores={
+                        member.user_id: member.score
+                        for member in state.members.values()
+                    },
+                )
+            )
+    return playlist
@@ -0,0 +1,62 @@
+import random
+from unittest.mock import patch
+
+from pytest import fixture
+from sqlalchemy import func, select
+from sqlalchemy.orm import Session
+
+from karaoke.core.rating import Rating, UserSongRating
+from karaoke.core.session import KaraokeSession
+from karaoke.core.simulation import simulate_playlist
+from karaoke.core.song import Song
+from karaoke.core.user import User
+from karaoke.core.utils import create_karaoke_session
+
+
+@fixture
+def user_ids(session: Session) -> list[int]:
+    rng = random.Random(0)
+    users = [User(name=f"user{i}") for i in range(6)]
+    songs = [
+        Song(title=f"song{i}", artist="artist", video_link="")
+        for i in range(40)
+    ]
+    session.add_all([*users, *songs])
+    session.commit()
+    session.add_all(
+        UserSongRating(
+            user_id=user.id,
+            song_id=song.id,
+            rating=rng.choice(list(Rating)[1:]),
+        )
+        for user in users
+        for song in songs
+    )
+    session.commit()
+    return [user.id for user in users]
+
+
+def test_matches_orm_session(session: Session, user_ids: list[int]) -> None:
+    random.seed(0)
+    playlist = simulate_playlist(user_ids, session)
+    assert (
+        session.scalar(select(func.count()).select_from(KaraokeSession)) == 0
+    )
+
+    # Same random stream, without spending any of it on the display ID.
+    random.seed(0)
+    with patch("karaoke.core.session.generate_id", return_value="ABCD"):
+        karaoke_session = create_karaoke_session(user_ids, session)
+    orm_playlist: list[int] = []
+    while (song := karaoke_session.get_next_song(session=session)) is not None:
+        karaoke_session.mark_current_song_as_played(session=session)
+        orm_playlist.append(song.id)
+
+    assert [entry.song_id for entry in playlist] == orm_playlist
+    assert playlist[-1].scores == {
+        user.user_id: user.score for user in karaoke_session.users
+    }
+
+
+def test_limit(session: Session, user_ids: list[int]) -> None:
+    assert len(simulate_playlist(user_ids, session, limit=3)) == 3
@@ -1,13 +1,11 @@
-import logging
+import functools
+import re
 
-from sqlalchemy.orm import Mapped, mapped_column, relationship
-from sqlalchemy import String
+from sqlalchemy.orm import Mapped, mapped_column, relationship, validates
+from sqlalchemy import Connection, String, Index, event
 
 from karaoke.core.base import Base
-from typing import TYPE_CHECKING
-
-import pytube
-import pytube.extract
+from typing import Any, Optional, TYPE_CHECKING
 
 if TYPE_CHECKING:
     from karaoke.core.rating import UserSongRating
@@ -20,6 +18,14 @@ class Song(Base):
     title: Mapped[str] = mapped_column(String(100))
     artist: Mapped[str] = mapped_column(String(100))
     video_link: Mapped[str] = mapped_column(String(500))
+    # Parsed out of `video_link` whenever it's set, if it's a YouTube video.
+    youtube_id: Mapped[Optional[str]] = mapped_column(
+        String(11), nullable=True
+    )
+    # Sum of the scores of all ratings for this song, and how many there
+    # are. Kept up to date by `User.rate_song`.
+    rating_score: Mapped[int] = mapped_column(default=0)
+    rating_count: Mapped[int] = mapped_column(default=0)
     ratings: Mapped[list["UserSongRating"]] = relationship(
         back_populates="song",
         cascade="all, delete, delete-orphan",
@@ -33,10 +39,40 @@ class Song(Base):
             f"video_link={self.video_link})"
         )
 
+    @validates("video_link")
+    def _parse_youtube_id(self, key: str, video_link: str) -> str:
+        self.youtube_id = parse_youtube_id(video_link)
+        return video_link
+
     def get_video_link(self, embed_yt_videos: bool = False) -> str:
+        if self.youtube_id is not None:
+            return youtube_link(self.youtube_id, embed_yt_videos)
         return get_video_link(self.video_link, embed_yt_videos=embed_yt_videos)
 
 
+# Used to find the highest-scoring songs without sorting the whole catalog.
+Index("ix_song_rating_score", Song.rating_score.desc(), Song.id)
+
+
+# The full-text search index is created and dropped along with the table.
+@event.listens_for(Song.__table__, "after_create")
+def _create_search_index(
+    target: Any, connection: Connection, **kwargs: Any
+) -> None:
+    from karaoke.core.song_search import create_search_index
+
+    create_search_index(connection)
+
+
+@event.listens_for(Song.__table__, "before_drop")
+def _drop_search_index(
+    target: Any, connection: Connection, **kwargs: Any
+) -> None:
+    from karaoke.core.song_search import drop_search_index
+
+    drop_search_index(connection)
+
+
 def is_youtube_url(url: str) -> bool:
     return "youtube.com" in url or "youtu.be" in url
 
@@ -45,22 +81,36 @@ def is_http(url: str) -> bool:
     return "http" in url
 
 
-def get_video_link(url: str, embed_yt_videos: bool = False) -> str:
+# Same pattern pytube uses to find the video ID in a URL.
+YOUTUBE_ID_PATTERN = re.compile(r"(?:v=|\/)([0-9A-Za-z_-]{11}).*")
+
+
+def parse_youtube_id(url: str) -> Optional[str]:
+    """The YouTube video ID in `url`, or None if it's not a YouTube video.
+
+    `url` can also be a bare video ID. This is plain string parsing and
+    never touches the network.
+    """
     if (is_http(url) or "." in url) and not is_youtube_url(url):
-        return url
+        return None
 
-    try:
-        video_id: str = (
-            pytube.extract.video_id(url) if is_youtube_url(url) else url
-        )
-    except Exception:
-        return url
+    if not is_youtube_url(url):
+        url = f"https://www.youtube.com/watch?v={url}"
+    if (match := YOUTUBE_ID_PATTERN.search(url)) is None:
+        return None
+    return match.group(1)
 
-    try:
-        yt: pytube.YouTube = pytube.YouTube.from_id(video_id)
-        return yt.embed_url if embed_yt_videos else yt.watch_url
-    except Exception:
-        logging.getLogger(__name__).warning(
-            f"Could not get video link for {url=}, {video_id=}"
-        )
+
+def youtube_link(video_id: str, embed_yt_videos: bool = False) -> str:
+    if embed_yt_videos:
+        return f"https://www.youtube.com/embed/{video_id}"
+    return f"https://youtube.com/watch?v={video_id}"
+
+
+# Songs added before `youtube_id` existed are parsed on every render, so
+# keep the most recent results around.
+@functools.lru_cache(maxsize=4096)
+def get_video_link(url: str, embed_yt_videos: bool = False) -> str:
+    if (video_id := parse_youtube_id(url)) is None:
         return url
+    return youtube_link(video_id, embed_yt_videos)
@@ -0,0 +1,180 @@
+"""Full-text search over song titles and artists.
+
+On SQLite, songs are indexed by the FTS5 table `song_search`. Triggers on
+`song` keep it in sync with every insert, update and delete, whichever code
+path makes them. The `unicode61` tokenizer folds case and strips Latin
+diacritics, and queries are also stripped of Hebrew vowel points, so "cafe"
+finds "Café" and "שִׁיר" finds "שיר". Other databases fall back to substring
+matching.
+
+A migration that recreates the `song` table (e.g. `batch_alter_table` on
+SQLite) drops the triggers with it, and must call `create_search_index`
+again.
+"""
+
+import re
+import unicodedata
+
+from sqlalchemy import (
+    ColumnElement,
+    Connection,
+    and_,
+    column,
+    false,
+    or_,
+    select,
+    table,
+    text,
+)
+from sqlalchemy.orm import Session
+
+from karaoke.core.song import Song
+
+SEARCH_TABLE = "song_search"
+
+# The index and the tables FTS5 keeps it in, none of which are models.
+SEARCH_TABLES = frozenset(
+    [SEARCH_TABLE]
+    + [
+        f"{SEARCH_TABLE}_{suffix}"
+        for suffix in ["data", "idx", "docsize", "config"]
+    ]
+)
+
+_search_table = table(SEARCH_TABLE, column("rowid"), column("rank"))
+
+_CREATE_STATEMENTS = [
+    f"""
+    CREATE VIRTUAL TABLE IF NOT EXISTS {SEARCH_TABLE} USING fts5(
+        title, artist,
+        content='song', content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2'
+    )
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS {SEARCH_TABLE}_insert
+    AFTER INSERT ON song BEGIN
+        INSERT INTO {SEARCH_TABLE} (rowid, title, artist)
+        VALUES (new.id, new.title, new.artist);
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS {SEARCH_TABLE}_delete
+    AFTER DELETE ON song BEGIN
+        INSERT INTO {SEARCH_TABLE} ({SEARCH_TABLE}, rowid, title, artist)
+        VALUES ('delete', old.id, old.title, old.artist);
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS {SEARCH_TABLE}_update
+    AFTER UPDATE OF title, artist ON song BEGIN
+        INSERT INTO {SEARCH_TABLE} ({SEARCH_TABLE}, rowid, title, artist)
+        VALUES ('delete', old.id, old.title, old.artist);
+        INSERT INTO {SEARCH_TABLE} (rowid, title, artist)
+        VALUES (new.id, new.title, new.artist);
+    END
+    """,
+    # Index whatever is already in `song`.
+    f"INSERT INTO {SEARCH_TABLE} ({SEARCH_TABLE}) VALUES ('rebuild')",
+]
+
+_DROP_STATEMENTS = [
+    f"DROP TRIGGER IF EXISTS {SEARCH_TABLE}_insert",
+    f"DROP TRIGGER IF EXISTS {SEARCH_TABLE}_delete",
+    f"DROP TRIGGER IF EXISTS {SEARCH_TABLE}_update",
+    f"DROP TABLE IF EXISTS {SEARCH_TABLE}",
+]
+
+
+def is_indexed(connection: Connection) -> bool:
+    """Whether songs on this connection's database have a search index."""
+    return connection.dialect.name == "sqlite"
+
+
+def create_search_index(connection: Connection) -> None:
+    """Create the index and its triggers, and index the existing songs."""
+    if is_indexed(connection):
+        for statement in _CREATE_STATEMENTS:
+            connection.exec_driver_sql(statement)
+
+
+def drop_search_index(connection: Connection) -> None:
+    if is_indexed(connection):
+        for statement in _DROP_STATEMENTS:
+            connection.exec_driver_sql(statement)
+
+
+def strip_diacritics(text: str) -> str:
+    """`text` without diacritics or Hebrew vowel points, NFKC-normalized."""
+    decomposed = unicodedata.normalize("NFKD", text)
+    stripped = "".join(
+        char for char in decomposed if unicodedata.category(char) != "Mn"
+    )
+    return unicodedata.normalize("NFC", stripped)
+
+
+def search_terms(query: str) -> list[str]:
+    """The words of `query`, without diacritics or vowel points.
+
+    FTS5 operators and punctuation are dropped, so any user input is safe
+    to match on. Case is left to the tokenizer.
+    """
+    return re.findall(r"\w+", strip_diacritics(query))
+
+
+def _match_expression(terms: list[str]) -> str:
+    # Every word must appear, the last ones typed so far as prefixes.
+    return " ".join(f'"{term}"*' for term in terms)
+
+
+def song_search_filter(query: str, session: Session) -> ColumnElement[bool]:
+    """A filter for the songs whose title or artist match every word."""
+    if not (terms := search_terms(query)):
+        return false()
+    if is_indexed(session.connection()):
+        return Song.id.in_(
+            select(_search_table.c.rowid).where(
+                text(f"{SEARCH_TABLE} MATCH :match").bindparams(
+                    match=_match_expression(terms)
+                )
+            )
+        )
+    return and_(
+        *(
+            or_(
+                Song.title.icontains(term, autoescape=True),
+                Song.artist.icontains(term, autoescape=True),
+            )
+            for term in terms
+        )
+    )
+
+
+def search_songs(
+    query: str, session: Session, *, limit: int, offset: int = 0
+) -> list[Song]:
+    """Songs matching `query`, best matches first.
+
+    Equally good matches are ordered by overall rating.
+    """
+    if not (terms := search_terms(query)):
+        return []
+    songs = session.query(Song)
+    if is_indexed(session.connection()):
+        songs = (
+            songs.join(_search_table, _search_table.c.rowid == Song.id)
+            .filter(
+                text(f"{SEARCH_TABLE} MATCH :match").bindparams(
+                    match=_match_expression(terms)
+                )
+            )
+            .order_by(_search_table.c.rank)
+        )
+    else:
+        songs = songs.filter(song_search_filter(query, session))
+    return (
+        songs.order_by(Song.rating_score.desc(), Song.id)
+        .offset(offset)
+        .limit(limit)
+        .all()
+    )
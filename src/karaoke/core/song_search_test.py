@@ -0,0 +1,59 @@
+from typing import Any
+
+import pytest
+from sqlalchemy import update
+from sqlalchemy.orm import Session
+
+from karaoke.core.song import Song
+from karaoke.core.song_search import search_songs, search_terms
+
+
+def titles(query: str, session: Session, **kwargs: Any) -> list[str]:
+    limit = kwargs.pop("limit", 10)
+    return [
+        song.title
+        for song in search_songs(query, session, limit=limit, **kwargs)
+    ]
+
+
+@pytest.fixture
+def songs(session: Session) -> list[Song]:
+    songs = [
+        Song(title="Hey Jude", artist="The Beatles", video_link=""),
+        Song(title="Jude", artist="Someone Else", video_link=""),
+        Song(title="Café del Mar", artist="Energy 52", video_link=""),
+        Song(title="שיר לשלום", artist="להקת הנח״ל", video_link=""),
+    ]
+    session.add_all(songs)
+    session.commit()
+    return songs
+
+
+def test_search_terms() -> None:
+    assert search_terms('Café "del" mar*') == ["Cafe", "del", "mar"]
+    assert search_terms("שִׁיר לַשָּׁלוֹם") == ["שיר", "לשלום"]
+    assert search_terms("ＡＢＣ NEAR(") == ["ABC", "NEAR"]
+    assert search_terms(" - ") == []
+
+
+def test_search(session: Session, songs: list[Song]) -> None:
+    assert titles("jud", session) == ["Jude", "Hey Jude"]
+    assert titles("beat JUDE", session) == ["Hey Jude"]
+    assert titles("cafe", session) == ["Café del Mar"]
+    assert titles("לשל", session) == ["שיר לשלום"]
+    assert titles("שִׁיר", session) == ["שיר לשלום"]
+    assert titles("OR", session) == []
+    assert titles("", session) == []
+    assert titles("jude", session, limit=1, offset=1) == ["Hey Jude"]
+
+
+def test_index_follows_changes(session: Session, songs: list[Song]) -> None:
+    songs[0].title = "Let It Be"
+    session.delete(songs[1])
+    session.execute(
+        update(Song).where(Song.id == songs[2].id).values(artist="Jude")
+    )
+    session.commit()
+
+    assert titles("jude", session) == ["Café del Mar"]
+    assert titles("let it", session) == ["Let It Be"]
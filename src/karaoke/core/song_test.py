@@ -1,4 +1,6 @@
-from karaoke.core.song import get_video_link
+from typing import Optional
+
+from karaoke.core.song import Song, get_video_link, parse_youtube_id
 import pytest
 
 
@@ -58,3 +60,34 @@ def test_get_video_link_no_embed(url: str, expected: str) -> None:
 )
 def test_get_video_link_with_embed(url: str, expected: str) -> None:
     assert get_video_link(url, embed_yt_videos=True) == expected
+
+
+@pytest.mark.parametrize(
+    ("url", "expected"),
+    [
+        ["https://www.youtube.com/watch?v=6_35a7sn6ds", "6_35a7sn6ds"],
+        ["https://youtu.be/6_35a7sn6ds?t=10", "6_35a7sn6ds"],
+        ["6_35a7sn6ds", "6_35a7sn6ds"],
+        ["https://www.youtube.com/watch?v=short", None],
+        ["https://link.to/video.mp4", None],
+    ],
+)
+def test_parse_youtube_id(url: str, expected: Optional[str]) -> None:
+    assert parse_youtube_id(url) == expected
+
+
+def test_youtube_id_follows_video_link() -> None:
+    song = Song(
+        title="Non-stop",
+        artist="Cast of Hamilton",
+        video_link="https://www.youtube.com/watch?v=6_35a7sn6ds",
+    )
+    assert song.youtube_id == "6_35a7sn6ds"
+    assert (
+        song.get_video_link(embed_yt_videos=True)
+        == "https://www.youtube.com/embed/6_35a7sn6ds"
+    )
+
+    song.video_link = "https://link.to/video.mp4"
+    assert song.youtube_id is None
+    assert song.get_video_link() == "https://link.to/video.mp4"
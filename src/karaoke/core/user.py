@@ -29,18 +29,7 @@ class User(Base):
         self, song: "Song", rating: "Rating", session: Session
     ) -> None:
         # Avoid circular import
-        from karaoke.core.rating import UserSongRating, Rating
-
-        # Delete any existing rating
-        session.query(UserSongRating).filter_by(
-            user_id=self.id, song_id=song.id
-        ).delete()
-
-        if rating != Rating.UNKNOWN:
-            user_rating: UserSongRating = UserSongRating(
-                user_id=self.id,
-                song_id=song.id,
-                rating=rating,
-            )
-            session.add(user_rating)
+        from karaoke.core.rating import rate_songs
+
+        rate_songs(self.id, [(song.id, rating)], session=session)
         session.commit()
@@ -1,43 +1,79 @@
-from typing import Optional
+from typing import Collection, Optional
 
+from sqlalchemy import and_, exists
 from sqlalchemy.orm import Session
 
 from karaoke.core.song import Song
-from karaoke.core.rating import UserSongRating
+from karaoke.core.song_search import song_search_filter
+from karaoke.core.rating import UserSongRating, Rating
 from karaoke.core.session import KaraokeSession, KaraokeSessionUser
 
 
 def get_overall_rating(song: Song, session: Session) -> int:
-    print(f"Calculating overall rating for {song.title}")
-    score: int = 0
-    ratings = session.query(UserSongRating).filter_by(song_id=song.id).all()
-    print(f"Found {len(ratings)} ratings for {song.title} ({song.id})")
-    for rating in ratings:
-        print(
-            f"Rating by user {rating.user_id}: {rating.rating} ({KaraokeSession.get_rating_score(rating.rating)})"
-        )
-        score += KaraokeSession.get_rating_score(rating.rating)
-        print(f"Accumulated score: {score}")
-    return score
+    return song.rating_score
 
 
 def get_any_unrated_song(user_id: int, session: Session) -> Optional[Song]:
-    songs = (
-        session.query(Song)
-        .outerjoin(
-            user_ratings := (
-                session.query(UserSongRating)
-                .filter_by(user_id=user_id)
-                .subquery()
-            )
+    """Return the highest-scoring song the user hasn't rated yet."""
+    songs = get_unrated_songs(user_id, session, limit=1)
+    return songs[0] if songs else None
+
+
+def get_unrated_songs(
+    user_id: int,
+    session: Session,
+    *,
+    limit: int,
+    exclude: Collection[int] = (),
+) -> list[Song]:
+    """Return up to `limit` songs the user hasn't rated, best scoring first.
+
+    Songs in `exclude` are skipped, e.g. ones already waiting to be rated.
+    """
+    query = session.query(Song).filter(
+        ~exists().where(
+            UserSongRating.user_id == user_id,
+            UserSongRating.song_id == Song.id,
         )
-        .filter(user_ratings.c.song_id.is_(None))
-        .all()
     )
+    if exclude:
+        query = query.filter(Song.id.not_in(exclude))
+    return query.order_by(Song.rating_score.desc(), Song.id).limit(limit).all()
 
-    return max(
-        songs, key=lambda song: get_overall_rating(song, session), default=None
+
+def get_songs_with_ratings(
+    user_id: int,
+    session: Session,
+    *,
+    after_id: Optional[int] = None,
+    limit: Optional[int] = None,
+    search: Optional[str] = None,
+) -> list[tuple[Song, Optional[Rating]]]:
+    """Return songs ordered by ID, each with the user's rating (if any).
+
+    Pages are keyed on the song ID: pass the last ID of the previous page as
+    `after_id` to get the next one. `search` matches artist or title, see
+    `song_search`.
+    """
+    query = (
+        session.query(Song, UserSongRating.rating)
+        .outerjoin(
+            UserSongRating,
+            and_(
+                UserSongRating.song_id == Song.id,
+                UserSongRating.user_id == user_id,
+            ),
+        )
+        .order_by(Song.id)
     )
+    if search:
+        query = query.filter(song_search_filter(search, session))
+    if after_id is not None:
+        query = query.filter(Song.id > after_id)
+    if limit is not None:
+        query = query.limit(limit)
+
+    return [(song, rating) for song, rating in query.all()]
 
 
 def create_karaoke_session(
@@ -45,7 +81,6 @@ def create_karaoke_session(
 ) -> KaraokeSession:
     karaoke_session = KaraokeSession()
     karaoke_session.generate_display_id(session)
-    session.add(karaoke_session)
     session.commit()
 
     for uid in user_ids:
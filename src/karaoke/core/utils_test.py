@@ -1,17 +1,19 @@
-from pytest import fixture
-from sqlalchemy import create_engine
-from sqlalchemy.orm import Session, sessionmaker
+from pytest import MonkeyPatch, mark, raises
+from sqlalchemy.orm import Session
 
-from karaoke.core.base import Base
 from karaoke.core.user import User
 from karaoke.core.song import Song
-
-
-@fixture
-def session() -> Session:
-    engine = create_engine("sqlite:///:memory:", echo=False)
-    Base.metadata.create_all(engine)
-    return sessionmaker(bind=engine)()
+from karaoke.core.rating import (
+    Rating,
+    UserSongRating,
+    rate_songs,
+    refresh_rating_aggregates,
+)
+from karaoke.core.utils import (
+    get_any_unrated_song,
+    get_songs_with_ratings,
+    get_unrated_songs,
+)
 
 
 def test_get_next_unrated_song(session: Session) -> None:
@@ -25,11 +27,133 @@ def test_get_next_unrated_song(session: Session) -> None:
 
     session.add_all(
         songs := [
-            song1 := Song(title="song1"),
-            song2 := Song(title="song2"),
-            song3 := Song(title="song3"),
-            song4 := Song(title="song4"),
+            song1 := Song(title="song1", artist="artist", video_link=""),
+            song2 := Song(title="song2", artist="artist", video_link=""),
+            song3 := Song(title="song3", artist="artist", video_link=""),
+            song4 := Song(title="song4", artist="artist", video_link=""),
+        ]
+    )
+
+    session.commit()
+
+    haim.rate_song(song2, Rating.NEED_THE_MIC, session=session)
+    daniel.rate_song(song2, Rating.DONT_KNOW, session=session)
+    haim.rate_song(song3, Rating.SING_ALONG, session=session)
+    daniel.rate_song(song3, Rating.CAN_TAKE_THE_MIC, session=session)
+    daniel.rate_song(song4, Rating.DONT_KNOW, session=session)
+
+    assert (song2.rating_score, song2.rating_count) == (4, 2)
+    assert (song3.rating_score, song3.rating_count) == (3, 2)
+    assert (song4.rating_score, song4.rating_count) == (-1, 1)
+
+    assert get_any_unrated_song(amir.id, session) == song2
+    assert get_any_unrated_song(haim.id, session) == song1
+
+    # Re-rating and un-rating update the aggregate.
+    daniel.rate_song(song2, Rating.SING_ALONG, session=session)
+    assert (song2.rating_score, song2.rating_count) == (6, 2)
+    haim.rate_song(song2, Rating.UNKNOWN, session=session)
+    assert (song2.rating_score, song2.rating_count) == (1, 1)
+    assert get_any_unrated_song(amir.id, session) == song3
+
+    for song in songs:
+        amir.rate_song(song, Rating.SING_ALONG, session=session)
+    assert get_any_unrated_song(amir.id, session) is None
+
+
+def test_refresh_rating_aggregates(session: Session) -> None:
+    session.add(amir := User(name="Amir"))
+    session.add(song := Song(title="song", artist="artist", video_link=""))
+    session.commit()
+    session.add(
+        UserSongRating(
+            user_id=amir.id, song_id=song.id, rating=Rating.NEED_THE_MIC
+        )
+    )
+    session.commit()
+    assert (song.rating_score, song.rating_count) == (0, 0)
+
+    refresh_rating_aggregates([song.id], session=session)
+    session.commit()
+    assert (song.rating_score, song.rating_count) == (5, 1)
+
+
+@mark.parametrize("upsert", [True, False])
+def test_rate_songs(
+    session: Session, monkeypatch: MonkeyPatch, upsert: bool
+) -> None:
+    if not upsert:
+        # As on databases without ON CONFLICT.
+        monkeypatch.setattr("karaoke.core.rating._UPSERT_INSERTS", {})
+    session.add(amir := User(name="Amir"))
+    session.add_all(
+        songs := [
+            Song(title=f"song{i}", artist="artist", video_link="")
+            for i in range(3)
         ]
     )
+    session.commit()
 
+    rate_songs(
+        amir.id,
+        [(song.id, Rating.SING_ALONG) for song in songs],
+        session=session,
+    )
+    rate_songs(
+        amir.id,
+        [(songs[0].id, Rating.NEED_THE_MIC), (songs[1].id, Rating.UNKNOWN)],
+        session=session,
+    )
     session.commit()
+
+    assert {rating.song_id: rating.rating for rating in amir.ratings} == {
+        songs[0].id: Rating.NEED_THE_MIC,
+        songs[2].id: Rating.SING_ALONG,
+    }
+    assert [(song.rating_score, song.rating_count) for song in songs] == [
+        (5, 1),
+        (0, 0),
+        (1, 1),
+    ]
+    assert get_unrated_songs(amir.id, session, limit=5) == [songs[1]]
+    assert (
+        get_unrated_songs(amir.id, session, limit=5, exclude=[songs[1].id])
+        == []
+    )
+
+    with raises(ValueError):
+        rate_songs(amir.id, [(1234, Rating.SING_ALONG)], session=session)
+
+
+def test_get_songs_with_ratings(session: Session) -> None:
+    session.add_all([amir := User(name="Amir"), haim := User(name="Haim")])
+    session.add_all(
+        songs := [
+            Song(title=f"song{i}", artist=f"artist{i % 2}", video_link="")
+            for i in range(5)
+        ]
+    )
+    session.commit()
+    amir.rate_song(songs[1], Rating.NEED_THE_MIC, session=session)
+    haim.rate_song(songs[1], Rating.DONT_KNOW, session=session)
+    haim.rate_song(songs[2], Rating.SING_ALONG, session=session)
+
+    assert get_songs_with_ratings(amir.id, session) == [
+        (songs[0], None),
+        (songs[1], Rating.NEED_THE_MIC),
+        (songs[2], None),
+        (songs[3], None),
+        (songs[4], None),
+    ]
+
+    first_page = get_songs_with_ratings(haim.id, session, limit=2)
+    assert first_page == [(songs[0], None), (songs[1], Rating.DONT_KNOW)]
+    assert get_songs_with_ratings(
+        haim.id, session, after_id=first_page[-1][0].id, limit=2
+    ) == [(songs[2], Rating.SING_ALONG), (songs[3], None)]
+
+    assert get_songs_with_ratings(haim.id, session, search="ARTIST1") == [
+        (songs[1], Rating.DONT_KNOW),
+        (songs[3], None),
+    ]
+    assert get_songs_with_ratings(haim.id, session, search="%") == []
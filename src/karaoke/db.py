@@ -0,0 +1,85 @@
+from typing import Any
+
+from sqlalchemy import create_engine, event, Engine
+from sqlalchemy.orm import Session, sessionmaker, scoped_session
+from sqlalchemy.pool import StaticPool
+
+from karaoke.config import DatabaseConfig, load_database_config
+
+# URL and pool settings, from the environment or the config file.
+DATABASE: DatabaseConfig = load_database_config()
+
+# Set on every new connection to a SQLite file. WAL lets readers carry on
+# while a write is in progress, and busy_timeout (ms) makes writers wait
+# for each other instead of failing with "database is locked".
+SQLITE_PRAGMAS = {
+    "journal_mode": "WAL",
+    "synchronous": "NORMAL",
+    "busy_timeout": 5000,
+    "mmap_size": 256 * 1024 * 1024,
+    # Negative means KiB rather than pages.
+    "cache_size": -64 * 1024,
+}
+
+
+def is_in_memory(url: str) -> bool:
+    return url.startswith("sqlite") and (
+        url.endswith(":memory:") or url.rstrip("/") == "sqlite:"
+    )
+
+
+def _set_sqlite_pragmas(dbapi_connection: Any, connection_record: Any) -> None:
+    cursor = dbapi_connection.cursor()
+    for name, value in SQLITE_PRAGMAS.items():
+        cursor.execute(f"PRAGMA {name} = {value}")
+    cursor.close()
+
+
+def create_db_engine(
+    url: str = DATABASE.url,
+    *,
+    pool_size: int = DATABASE.pool_size,
+    max_overflow: int = DATABASE.max_overflow,
+    pool_timeout: float = DATABASE.pool_timeout,
+    echo: bool = DATABASE.echo,
+) -> Engine:
+    """Create an engine with a connection pool suitable for the server.
+
+    In-memory SQLite databases only exist for the lifetime of a single
+    connection, so they share one connection across threads instead. SQLite
+    files get `SQLITE_PRAGMAS` on connect.
+    """
+    kwargs: dict[str, Any] = {"echo": echo}
+    if is_in_memory(url):
+        kwargs["poolclass"] = StaticPool
+        kwargs["connect_args"] = {"check_same_thread": False}
+    else:
+        kwargs["pool_size"] = pool_size
+        kwargs["max_overflow"] = max_overflow
+        kwargs["pool_timeout"] = pool_timeout
+        kwargs["pool_pre_ping"] = True
+        if url.startswith("sqlite"):
+            kwargs["connect_args"] = {"check_same_thread": False}
+
+    engine = create_engine(url, **kwargs)
+    if url.startswith("sqlite") and not is_in_memory(url):
+        event.listen(engine, "connect", _set_sqlite_pragmas)
+    return engine
+
+
+engine: Engine = create_db_engine()
+session_factory: sessionmaker[Session] = sessionmaker(bind=engine)
+
+# Thread-local session, created on first use in a request and removed when
+# the request ends (see `server.remove_db_session`).
+db_session: scoped_session[Session] = scoped_session(session_factory)
+
+
+def configure(url: str, **engine_kwargs: Any) -> Engine:
+    """Point the process-wide engine and session factory at `url`."""
+    global engine
+    db_session.remove()
+    engine.dispose()
+    engine = create_db_engine(url, **engine_kwargs)
+    session_factory.configure(bind=engine)
+    return engine
@@ -0,0 +1,50 @@
+from pathlib import Path
+from pytest import fixture
+from typing import Iterator
+
+from karaoke import db
+from karaoke.core.base import Base
+from karaoke.core.user import User
+
+
+@fixture
+def in_memory_db() -> Iterator[None]:
+    db.configure("sqlite:///:memory:")
+    Base.metadata.create_all(db.engine)
+    yield
+    db.configure(db.DATABASE.url)
+
+
+def test_engine_is_reused_across_sessions(in_memory_db: None) -> None:
+    engine = db.engine
+    with db.session_factory() as session:
+        session.add(User(name="Amir"))
+        session.commit()
+
+    with db.session_factory() as session:
+        assert session.get_bind() is engine
+        assert [user.name for user in session.query(User).all()] == ["Amir"]
+
+
+def test_request_session_is_removed_on_teardown(in_memory_db: None) -> None:
+    from karaoke.server import app
+
+    with app.app_context():
+        session = db.db_session()
+        assert db.db_session() is session
+
+    assert db.db_session() is not session
+    db.db_session.remove()
+
+
+def test_sqlite_file_pragmas(tmp_path: Path) -> None:
+    engine = db.create_db_engine(f"sqlite:///{tmp_path / 'karaoke.sqlite'}")
+    with engine.connect() as connection:
+        journal_mode, busy_timeout = (
+            connection.exec_driver_sql(f"PRAGMA {name}").scalar()
+            for name in ("journal_mode", "busy_timeout")
+        )
+    engine.dispose()
+
+    assert journal_mode == "wal"
+    assert busy_timeout == db.SQLITE_PRAGMAS["busy_timeout"]
@@ -0,0 +1,113 @@
+from collections import defaultdict
+from typing import Generator, Optional
+import queue
+import threading
+
+# Event names pushed to the companion and splash pages.
+SONG_CHANGED = "song-changed"
+SCORES_CHANGED = "scores-changed"
+MEMBERS_CHANGED = "members-changed"
+
+# Seconds between keep-alive comments on an idle stream. Writing them is
+# also how we notice that a client went away.
+KEEPALIVE_INTERVAL = 15.0
+
+# Milliseconds the browser waits before reconnecting a dropped stream.
+RECONNECT_DELAY = 2000
+
+# Events queued for a single subscriber before newer ones are dropped.
+MAX_QUEUED_EVENTS = 100
+
+
+class TooManyStreams(Exception):
+    """There's no room for another event stream in this process."""
+
+
+def format_event(event: str) -> str:
+    # Browsers ignore events without data.
+    return f"event: {event}\ndata: {{}}\n\n"
+
+
+class SessionEvents:
+    """Pushes karaoke session changes to Server-Sent Events subscribers.
+
+    Events only say what changed; clients fetch the new state themselves.
+    Subscribers are tracked per display ID and only within this process.
+    Each open stream holds a server thread, so there can be at most
+    `max_streams` subscribers at once (any number, if it's None).
+    """
+
+    def __init__(self, max_streams: Optional[int] = None) -> None:
+        self._subscribers: defaultdict[str, set[queue.Queue[str]]] = (
+            defaultdict(set)
+        )
+        self._max_streams = max_streams
+        self._stream_count = 0
+        self._lock = threading.Lock()
+
+    def subscribe(self, display_id: str) -> "queue.Queue[str]":
+        """A queue of the session's events. Raises `TooManyStreams`."""
+        subscriber: queue.Queue[str] = queue.Queue(maxsize=MAX_QUEUED_EVENTS)
+        with self._lock:
+            if (
+                self._max_streams is not None
+                and self._stream_count >= self._max_streams
+            ):
+                raise TooManyStreams()
+            self._subscribers[display_id].add(subscriber)
+            self._stream_count += 1
+        return subscriber
+
+    def unsubscribe(
+        self, display_id: str, subscriber: "queue.Queue[str]"
+    ) -> None:
+        with self._lock:
+            subscribers = self._subscribers.get(display_id)
+            if subscribers is None or subscriber not in subscribers:
+                return
+            subscribers.remove(subscriber)
+            self._stream_count -= 1
+            if not subscribers:
+                del self._subscribers[display_id]
+
+    def subscriber_count(self, display_id: str) -> int:
+        with self._lock:
+            return len(self._subscribers.get(display_id, ()))
+
+    def publish(self, display_id: str, *events: str) -> None:
+        with self._lock:
+            subscribers = list(self._subscribers.get(display_id, ()))
+        for subscriber in subscribers:
+            for event in events:
+                try:
+                    subscriber.put_nowait(event)
+                except queue.Full:
+                    # A client this far behind reloads everything when it
+                    # catches up anyway.
+                    pass
+
+    def stream(
+        self,
+        display_id: str,
+        subscriber: Optional["queue.Queue[str]"] = None,
+        keepalive: float = KEEPALIVE_INTERVAL,
+    ) -> Generator[str, None, None]:
+        """Yield the text/event-stream body for one client.
+
+        Pass the client's `subscriber` to subscribe before the stream starts,
+        otherwise it subscribes on the first iteration. Either way it's
+        unsubscribed when the stream is closed.
+        """
+        if subscriber is None:
+            subscriber = self.subscribe(display_id)
+        try:
+            yield f"retry: {RECONNECT_DELAY}\n\n"
+            while True:
+                try:
+                    event = subscriber.get(timeout=keepalive)
+                except queue.Empty:
+                    yield ": keep-alive\n\n"
+                    continue
+                yield format_event(event)
+        finally:
+            self.unsubscribe(display_id, subscriber)
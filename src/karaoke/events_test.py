@@ -0,0 +1,60 @@
+from pytest import raises
+
+from karaoke.events import (
+    SessionEvents,
+    TooManyStreams,
+    SONG_CHANGED,
+    SCORES_CHANGED,
+    format_event,
+)
+
+
+def test_stream_yields_published_events() -> None:
+    events = SessionEvents()
+    stream = events.stream("ABCD", keepalive=0.01)
+
+    assert next(stream).startswith("retry:")
+    events.publish("ABCD", SONG_CHANGED, SCORES_CHANGED)
+    events.publish("WXYZ", SONG_CHANGED)
+
+    assert next(stream) == format_event(SONG_CHANGED)
+    assert next(stream) == format_event(SCORES_CHANGED)
+    assert next(stream) == ": keep-alive\n\n"
+
+
+def test_closing_stream_unsubscribes() -> None:
+    events = SessionEvents()
+    stream = events.stream("ABCD")
+    next(stream)
+    assert events.subscriber_count("ABCD") == 1
+
+    stream.close()
+    assert events.subscriber_count("ABCD") == 0
+
+
+def test_slow_subscriber_drops_events() -> None:
+    events = SessionEvents()
+    subscriber = events.subscribe("ABCD")
+
+    for _ in range(subscriber.maxsize + 1):
+        events.publish("ABCD", SONG_CHANGED)
+
+    assert subscriber.qsize() == subscriber.maxsize
+
+
+def test_streams_are_capped() -> None:
+    events = SessionEvents(max_streams=2)
+    first = events.subscribe("ABCD")
+    events.subscribe("WXYZ")
+
+    with raises(TooManyStreams):
+        events.subscribe("ABCD")
+
+    events.unsubscribe("ABCD", first)
+    events.unsubscribe("ABCD", first)
+    stream = events.stream("ABCD", events.subscribe("ABCD"))
+    with raises(TooManyStreams):
+        events.subscribe("ABCD")
+    next(stream)
+    stream.close()
+    events.subscribe("ABCD")
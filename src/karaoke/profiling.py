@@ -0,0 +1,124 @@
+from collections import defaultdict
+from typing import Any, Callable, Iterable
+import cProfile
+import os
+import pstats
+import random
+import re
+import time
+
+# Requests with this header are always profiled (when profiling is on).
+PROFILE_HEADER = "X-Karaoke-Profile"
+
+# Call paths that took less than this (in seconds) are left out of the
+# collapsed stacks.
+MIN_STACK_TIME = 1e-6
+
+Function = tuple[str, int, str]
+
+
+def _frame_label(function: Function) -> str:
+    filename, line, name = function
+    if filename == "~":
+        # Built-ins, e.g. "<method 'execute' of 'sqlite3.Cursor' objects>".
+        return name.replace(";", ",")
+    return f"{name} ({os.path.basename(filename)}:{line})".replace(";", ",")
+
+
+def collapsed_stacks(stats: pstats.Stats) -> dict[str, int]:
+    """Microseconds spent in each call path, in flamegraph "collapsed" form.
+
+    cProfile only records caller/callee pairs, so each callee's time is
+    split between its callers in proportion to the time spent in it on
+    behalf of each of them.
+    """
+    raw: dict[Function, Any] = stats.stats  # type: ignore[attr-defined]
+    callees: defaultdict[Function, list[tuple[Function, float]]] = defaultdict(
+        list
+    )
+    for function, (_, _, _, _, callers) in raw.items():
+        for caller, (_, _, _, edge_time) in callers.items():
+            callees[caller].append((function, edge_time))
+
+    stacks: defaultdict[str, float] = defaultdict(float)
+
+    def walk(
+        function: Function, path: tuple[Function, ...], fraction: float
+    ) -> None:
+        own_time = raw[function][2]
+        path = path + (function,)
+        stacks[";".join(map(_frame_label, path))] += own_time * fraction
+        for callee, edge_time in callees.get(function, ()):
+            callee_total = raw[callee][3]
+            if callee in path or callee_total <= 0:
+                continue
+            callee_fraction = fraction * edge_time / callee_total
+            if callee_total * callee_fraction >= MIN_STACK_TIME:
+                walk(callee, path, callee_fraction)
+
+    for function, (_, _, _, _, callers) in raw.items():
+        if not callers:
+            walk(function, (), 1.0)
+
+    return {
+        stack: round(seconds * 1_000_000)
+        for stack, seconds in stacks.items()
+        if round(seconds * 1_000_000) > 0
+    }
+
+
+def write_collapsed_stacks(stats: pstats.Stats, path: str) -> None:
+    with open(path, "w") as file:
+        for stack, microseconds in sorted(collapsed_stacks(stats).items()):
+            file.write(f"{stack} {microseconds}\n")
+
+
+class ProfilerMiddleware:
+    """WSGI middleware that runs some requests under cProfile.
+
+    Each profiled request leaves two files in `directory`, named after the
+    request path: a `.prof` file for pstats/snakeviz and a `.collapsed` file
+    for flamegraph.pl or speedscope. Only the view runs under the profiler,
+    not the streaming of the response body.
+    """
+
+    def __init__(
+        self,
+        app: Callable[..., Iterable[bytes]],
+        directory: str,
+        sample_rate: float = 0.0,
+    ) -> None:
+        self._app = app
+        self._directory = directory
+        self._sample_rate = sample_rate
+        # Not the global `random`, so profiling doesn't change which songs
+        # get picked.
+        self._random = random.Random()
+        os.makedirs(directory, exist_ok=True)
+
+    def __call__(
+        self, environ: dict[str, Any], start_response: Callable
+    ) -> Iterable[bytes]:
+        if not self._should_profile(environ):
+            return self._app(environ, start_response)
+
+        profile = cProfile.Profile()
+        try:
+            return profile.runcall(self._app, environ, start_response)
+        finally:
+            self._write(profile, environ.get("PATH_INFO", "/"))
+
+    def _should_profile(self, environ: dict[str, Any]) -> bool:
+        header = "HTTP_" + PROFILE_HEADER.upper().replace("-", "_")
+        if environ.get(header):
+            return True
+        return self._random.random() < self._sample_rate
+
+    def _write(self, profile: cProfile.Profile, path_info: str) -> None:
+        route = re.sub(r"[^A-Za-z0-9_-]+", ".", path_info).strip(".")
+        base = os.path.join(
+            self._directory, f"{route or 'root'}.{time.time_ns()}"
+        )
+        stats = pstats.Stats(profile)
+        stats.dump_stats(f"{base}.prof")
+        write_collapsed_stacks(stats, f"{base}.collapsed")
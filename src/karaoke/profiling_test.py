@@ -0,0 +1,57 @@
+from pathlib import Path
+import os
+import pstats
+
+from flask import Flask
+
+from karaoke.profiling import PROFILE_HEADER, ProfilerMiddleware
+
+
+def busy(n: int) -> int:
+    return sum(i * i for i in range(n))
+
+
+def make_app(directory: str, sample_rate: float) -> Flask:
+    app = Flask(__name__)
+
+    @app.route("/api/next-video")
+    def next_video() -> str:
+        return str(busy(100_000))
+
+    app.wsgi_app = ProfilerMiddleware(  # type: ignore[method-assign]
+        app.wsgi_app, directory, sample_rate
+    )
+    return app
+
+
+def test_profiles_requests_with_header(tmp_path: Path) -> None:
+    client = make_app(str(tmp_path), sample_rate=0).test_client()
+
+    assert client.get("/api/next-video").status_code == 200
+    assert os.listdir(tmp_path) == []
+
+    client.get("/api/next-video", headers={PROFILE_HEADER: "1"})
+    files = sorted(os.listdir(tmp_path))
+    assert [os.path.splitext(name)[1] for name in files] == [
+        ".collapsed",
+        ".prof",
+    ]
+    assert all(name.startswith("api.next-video.") for name in files)
+
+    stats = pstats.Stats(os.path.join(tmp_path, files[1]))
+    assert any(name == "busy" for _, _, name in stats.stats)  # type: ignore
+
+    with open(os.path.join(tmp_path, files[0])) as file:
+        stacks = dict(line.rsplit(" ", 1) for line in file)
+    busy_stacks = [stack for stack in stacks if ";busy (" in stack]
+    assert busy_stacks
+    assert all(";next_video (" in stack for stack in busy_stacks)
+    assert all(int(microseconds) > 0 for microseconds in stacks.values())
+
+
+def test_samples_requests(tmp_path: Path) -> None:
+    client = make_app(str(tmp_path), sample_rate=1).test_client()
+
+    client.get("/api/next-video")
+
+    assert len(os.listdir(tmp_path)) == 2
@@ -0,0 +1,140 @@
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass
+from typing import Any, Iterator, Optional
+import threading
+import time
+
+from flask import Flask, Response, g, jsonify, request
+from sqlalchemy import Engine, event
+
+QUERY_COUNT_HEADER = "X-DB-Queries"
+QUERY_TIME_HEADER = "X-DB-Time"
+
+
+@dataclass
+class QueryStats:
+    """SQL statements run while handling one request."""
+
+    count: int = 0
+    seconds: float = 0.0
+
+
+@dataclass
+class RouteStats:
+    requests: int = 0
+    queries: int = 0
+    max_queries: int = 0
+    db_seconds: float = 0.0
+    request_seconds: float = 0.0
+
+    def add(self, stats: QueryStats, request_seconds: float) -> None:
+        self.requests += 1
+        self.queries += stats.count
+        self.max_queries = max(self.max_queries, stats.count)
+        self.db_seconds += stats.seconds
+        self.request_seconds += request_seconds
+
+    def as_dict(self) -> dict[str, Any]:
+        return {
+            "requests": self.requests,
+            "queries": self.queries,
+            "queries_per_request": self.queries / self.requests,
+            "max_queries": self.max_queries,
+            "db_ms_per_request": self.db_seconds * 1000 / self.requests,
+            "ms_per_request": self.request_seconds * 1000 / self.requests,
+        }
+
+
+# Stats of the request being handled in this thread, if any. Statements run
+# elsewhere (e.g. by background flushes) aren't attributed to anything.
+_current: ContextVar[Optional[QueryStats]] = ContextVar(
+    "query_stats", default=None
+)
+
+
+@event.listens_for(Engine, "before_cursor_execute")
+def _before_cursor_execute(conn: Any, *args: Any) -> None:
+    if _current.get() is not None:
+        conn.info.setdefault("query_start", []).append(time.perf_counter())
+
+
+@event.listens_for(Engine, "after_cursor_execute")
+def _after_cursor_execute(conn: Any, *args: Any) -> None:
+    if (stats := _current.get()) is None or not conn.info.get("query_start"):
+        return
+    stats.count += 1
+    stats.seconds += time.perf_counter() - conn.info["query_start"].pop()
+
+
+@contextmanager
+def track_queries() -> Iterator[QueryStats]:
+    """Count the SQL statements run in this context (an executemany is one).
+
+    Like a request, but e.g. for a benchmark or a CLI command.
+    """
+    stats = QueryStats()
+    token = _current.set(stats)
+    try:
+        yield stats
+    finally:
+        _current.reset(token)
+
+
+class QueryStatsCollector:
+    """Counts SQL statements and DB time per request and per route.
+
+    Every response gets `X-DB-Queries` and `X-DB-Time` (milliseconds)
+    headers, and `/debug/metrics` shows totals per route since startup.
+    """
+
+    def __init__(self) -> None:
+        self._routes: dict[str, RouteStats] = {}
+        self._lock = threading.Lock()
+
+    def init_app(self, app: Flask) -> None:
+        app.before_request(self._start_request)
+        app.after_request(self._finish_request)
+        app.teardown_request(self._stop_tracking)
+        app.add_url_rule(
+            "/debug/metrics", "debug_metrics", self._metrics_endpoint
+        )
+
+    def route_stats(self) -> dict[str, dict[str, Any]]:
+        with self._lock:
+            return {
+                route: stats.as_dict()
+                for route, stats in sorted(self._routes.items())
+            }
+
+    def reset(self) -> None:
+        with self._lock:
+            self._routes.clear()
+
+    def _start_request(self) -> None:
+        g.query_stats = QueryStats()
+        g.query_stats_token = _current.set(g.query_stats)
+        g.query_stats_start = time.perf_counter()
+
+    def _finish_request(self, response: Response) -> Response:
+        if (stats := g.pop("query_stats", None)) is None:
+            return response
+        request_seconds = time.perf_counter() - g.pop("query_stats_start")
+
+        response.headers[QUERY_COUNT_HEADER] = str(stats.count)
+        response.headers[QUERY_TIME_HEADER] = f"{stats.seconds * 1000:.3f}"
+
+        route = request.url_rule.rule if request.url_rule else "<unmatched>"
+        with self._lock:
+            self._routes.setdefault(route, RouteStats()).add(
+                stats, request_seconds
+            )
+        return response
+
+    def _stop_tracking(self, exception: Optional[BaseException]) -> None:
+        # Also runs when the request failed and `_finish_request` didn't.
+        if (token := g.pop("query_stats_token", None)) is not None:
+            _current.reset(token)
+
+    def _metrics_endpoint(self) -> Response:
+        return jsonify(self.route_stats())
@@ -0,0 +1,49 @@
+from flask import Flask
+from sqlalchemy import create_engine, text
+
+from karaoke.query_stats import (
+    QUERY_COUNT_HEADER,
+    QUERY_TIME_HEADER,
+    QueryStatsCollector,
+    track_queries,
+)
+
+
+def test_counts_queries_per_request_and_route() -> None:
+    engine = create_engine("sqlite://")
+    app = Flask(__name__)
+    collector = QueryStatsCollector()
+    collector.init_app(app)
+
+    @app.route("/users/<int:user_id>")
+    def user(user_id: int) -> str:
+        with engine.connect() as connection:
+            for _ in range(user_id):
+                connection.execute(text("SELECT 1"))
+        return "ok"
+
+    client = app.test_client()
+    response = client.get("/users/3")
+    assert response.headers[QUERY_COUNT_HEADER] == "3"
+    assert float(response.headers[QUERY_TIME_HEADER]) >= 0
+    client.get("/users/1")
+
+    # Statements outside of a request aren't counted.
+    with engine.connect() as connection:
+        connection.execute(text("SELECT 1"))
+
+    stats = client.get("/debug/metrics").get_json()["/users/<int:user_id>"]
+    assert stats["requests"] == 2
+    assert stats["queries"] == 4
+    assert stats["max_queries"] == 3
+
+
+def test_track_queries() -> None:
+    engine = create_engine("sqlite://")
+    with engine.connect() as connection:
+        with track_queries() as stats:
+            connection.execute(text("SELECT 1"))
+            connection.execute(text("SELECT 1"))
+        connection.execute(text("SELECT 1"))
+
+    assert stats.count == 2
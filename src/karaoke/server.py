@@ -3,39 +3,168 @@ import json
 
 import typing
 from flask import Flask, render_template, jsonify, request, Response, redirect
-from sqlalchemy import create_engine
-from sqlalchemy.orm import Session, sessionmaker
+from sqlalchemy.orm import Session
+from sqlalchemy.pool import QueuePool
+from karaoke import db
+from karaoke.db import db_session, session_factory
+from karaoke.core import metrics
+from karaoke.config import load_server_config
 from karaoke.core.session import (
     KaraokeSession,
     KaraokeSessionUser,
     KaraokeSessionSong,
 )
+from karaoke.core.live_session import LiveSessionRegistry, LiveSessionState
+from karaoke.query_stats import QueryStatsCollector
+from karaoke.profiling import ProfilerMiddleware
+from karaoke.events import (
+    SessionEvents,
+    TooManyStreams,
+    SONG_CHANGED,
+    SCORES_CHANGED,
+    MEMBERS_CHANGED,
+)
+from karaoke.core.simulation import simulate_playlist
 from karaoke.core.user import User
+from karaoke.core.artist_index import ArtistIndex
 from karaoke.core.song import Song
-from karaoke.core.utils import get_any_unrated_song, create_karaoke_session
-from karaoke.core.rating import UserSongRating, Rating
+from karaoke.core.song_search import search_songs
+from karaoke.core.utils import (
+    get_any_unrated_song,
+    get_unrated_songs,
+    create_karaoke_session,
+    get_songs_with_ratings,
+)
+from karaoke.core.rating import (
+    UserSongRating,
+    Rating,
+    rate_songs,
+    refresh_rating_aggregates,
+)
 from typing import Optional, Any, Callable
 import logging
 
 if typing.TYPE_CHECKING:  # pragma: no cover
     from werkzeug.wrappers import Response as BaseResponse
 
-LOCAL_DB = "sqlite:///karaoke.sqlite"
-
 logging.basicConfig(
     format="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
     level=logging.WARN,
 )
 logger = logging.getLogger(__name__)
 
+# Number of songs shown per page in /songs.
+SONGS_PAGE_SIZE = 100
+
+# Default and largest number of suggestions from /api/artists.
+ARTIST_SUGGESTIONS = 10
+MAX_ARTIST_SUGGESTIONS = 50
+
+# Default and largest page size of /api/search-songs.
+SEARCH_PAGE_SIZE = 20
+MAX_SEARCH_RESULTS = 100
+
+# Most unrated songs returned at once by /api/rate-songs and
+# /api/next-unrated-songs.
+MAX_UNRATED_SONGS = 50
+
+# Production server threads to keep free of event streams, for everything
+# else.
+MIN_FREE_THREADS = 8
+
 app = Flask(__name__)
 
+SERVER_CONFIG = load_server_config()
+
+# Running sessions are served from memory and written back in the background.
+live_sessions: LiveSessionRegistry
+if SERVER_CONFIG.redis_url:
+    from karaoke.core.redis_live_session import RedisLiveSessionRegistry
+
+    live_sessions = RedisLiveSessionRegistry.from_url(
+        SERVER_CONFIG.redis_url,
+        session_factory=session_factory,
+        pick_trace_size=SERVER_CONFIG.pick_trace_size,
+    )
+else:
+    live_sessions = LiveSessionRegistry(
+        session_factory, pick_trace_size=SERVER_CONFIG.pick_trace_size
+    )
+
+# Artist names for autocompletion on /add-song.
+artist_index = ArtistIndex()
+
+# Change notifications for the companion and splash pages.
+session_events = SessionEvents(max_streams=SERVER_CONFIG.max_event_streams)
+live_sessions.on_remote_events = session_events.publish
+
+
+def notify(display_id: str, *events: str) -> None:
+    """Send `events` to the session's pages, whichever process serves them."""
+    session_events.publish(display_id, *events)
+    live_sessions.publish(display_id, *events)
+
+
+# SQL statement counts and DB time per request, see `/debug/metrics`.
+query_stats = QueryStatsCollector()
+query_stats.init_app(app)
+
+
+# Gauges served at `/metrics` next to the ones in `karaoke.core.metrics`.
+def live_queue_sizes() -> dict[tuple[str, ...], float]:
+    return {
+        (state.display_id,): state.queue_size
+        for state in live_sessions.states()
+    }
+
+
+def db_pool_connections() -> dict[tuple[str, ...], float]:
+    # `db.configure` may have replaced the engine since startup.
+    pool = db.engine.pool
+    if not isinstance(pool, QueuePool):
+        return {}
+    return {
+        ("checked_out",): pool.checkedout(),
+        ("idle",): pool.checkedin(),
+        ("overflow",): max(pool.overflow(), 0),
+    }
+
+
+metrics.REGISTRY.register(
+    metrics.Gauge(
+        "karaoke_session_queue_size",
+        "Unplayed songs in the queue of each active session.",
+        live_queue_sizes,
+        labels=("session",),
+    )
+)
+metrics.REGISTRY.register(
+    metrics.Gauge(
+        "karaoke_db_pool_connections",
+        "Connections in the database pool, by state.",
+        db_pool_connections,
+        labels=("state",),
+    )
+)
+
+# cProfile some requests, see `ServerConfig.profile_dir`.
+if SERVER_CONFIG.profile_dir:
+    app.wsgi_app = ProfilerMiddleware(  # type: ignore[method-assign]
+        app.wsgi_app,
+        SERVER_CONFIG.profile_dir,
+        SERVER_CONFIG.profile_sample_rate,
+    )
+
+
+@app.teardown_appcontext
+def remove_db_session(exception: Optional[BaseException] = None) -> None:
+    # Return the request's connection to the pool.
+    db_session.remove()
+
 
 def with_db_session(f: Callable) -> Callable:
     def wrapper(*args: Any, **kwargs: Any) -> Any:
-        engine = create_engine(LOCAL_DB)
-        with sessionmaker(bind=engine)() as session:
-            return f(*args, **kwargs, session=session)
+        return f(*args, **kwargs, session=db_session())
 
     wrapper.__name__ = f.__name__
     return wrapper
@@ -132,45 +261,53 @@ def create_session(session: Session) -> Response | str:
     data = json.loads(request.data)
     user_ids = data["user_ids"]
     karaoke_session = create_karaoke_session(user_ids, session)
+    # The display ID may have been recycled from an expired session.
+    live_sessions.evict(karaoke_session.display_id)
     return jsonify({"session_id": karaoke_session.display_id})
 
 
 @app.route("/generate-static-playlist", methods=["POST"])
 @with_db_session
 def generate_static_playlist(session: Session) -> Response | str:
-    user_ids = json.loads(request.form.get("user_ids", "[]"))
-    karaoke_session = create_karaoke_session(user_ids, session)
-    users: list[User] = [
-        session_user.user for session_user in karaoke_session.users
-    ]
-    user_ratings: dict[int, dict[int, Rating]] = {
-        user.id: {
-            song_rating.song.id: song_rating.rating
-            for song_rating in user.ratings
-        }
-        for user in users
-    }
+    user_ids: list[int] = json.loads(request.form.get("user_ids", "[]"))
+    playlist = simulate_playlist(user_ids, session=session)
+    song_ids = [entry.song_id for entry in playlist]
 
-    def get_next_song() -> Optional[Song]:
-        next_song = karaoke_session.get_next_song(session=session)
-        if next_song is not None:
-            karaoke_session.mark_current_song_as_played(session=session)
-        return next_song
+    users_by_id: dict[int, User] = {
+        user.id: user
+        for user in session.query(User).filter(User.id.in_(user_ids))
+    }
+    users: list[User] = [users_by_id[user_id] for user_id in user_ids]
+    songs_by_id: dict[int, Song] = {
+        song.id: song
+        for song in session.query(Song).filter(Song.id.in_(song_ids))
+    }
+    user_ratings: dict[tuple[int, int], Rating] = {
+        (user_id, song_id): rating
+        for user_id, song_id, rating in session.query(
+            UserSongRating.user_id,
+            UserSongRating.song_id,
+            UserSongRating.rating,
+        )
+        .filter(UserSongRating.user_id.in_(user_ids))
+        .filter(UserSongRating.song_id.in_(song_ids))
+    }
 
-    songs: list[Song] = [s for s in iter(get_next_song, None)]
     songs_with_stats: list[dict[str, Any]] = []
-    for song in songs:
+    for entry in playlist:
+        song = songs_by_id[entry.song_id]
         songs_with_stats.append(
             {
                 "id": song.id,
                 "title": song.title,
                 "artist": song.artist,
                 "ratings": {
-                    user.name: user_ratings[user.id]
-                    .get(song.id, Rating.UNKNOWN)
-                    .value
+                    user.name: user_ratings.get(
+                        (user.id, song.id), Rating.UNKNOWN
+                    ).value
                     for user in users
                 },
+                "scores": {user.name: entry.scores[user.id] for user in users},
             }
         )
 
@@ -186,28 +323,80 @@ def list_songs(session: Session) -> Response | str:
     if (user := data.user) is None:
         return Response(status=400)
 
-    songs_with_ratings: list[dict[str, Any]] = []
-    songs: list[Song] = session.query(Song).all()
-    for song in songs:
-        user_rating: Optional[UserSongRating] = (
-            session.query(UserSongRating)
-            .filter_by(user_id=user.id, song_id=song.id)
-            .first()
+    search: str = request.args.get("q", "")
+    try:
+        after_id: Optional[int] = (
+            int(request.args["after"]) if "after" in request.args else None
         )
-        songs_with_ratings.append(
-            {
-                "id": song.id,
-                "title": song.title,
-                "artist": song.artist,
-                "video_link": song.get_video_link(embed_yt_videos=False),
-                "rating": (
-                    user_rating.rating.value
-                    if user_rating is not None
-                    else None
-                ),
-            }
+    except ValueError:
+        return Response(status=400)
+
+    # Fetch one extra row to know whether there's another page.
+    page = get_songs_with_ratings(
+        user_id=user.id,
+        session=session,
+        after_id=after_id,
+        limit=SONGS_PAGE_SIZE + 1,
+        search=search,
+    )
+    has_next_page = len(page) > SONGS_PAGE_SIZE
+    page = page[:SONGS_PAGE_SIZE]
+
+    songs_with_ratings: list[dict[str, Any]] = [
+        {
+            "id": song.id,
+            "title": song.title,
+            "artist": song.artist,
+            "video_link": song.get_video_link(embed_yt_videos=False),
+            "rating": rating.value if rating is not None else None,
+        }
+        for song, rating in page
+    ]
+    return render_template(
+        "songs.html",
+        songs=songs_with_ratings,
+        user=user,
+        search=search,
+        next_after_id=page[-1][0].id if has_next_page else None,
+    )
+
+
+@app.route("/api/search-songs")
+@with_db_session
+def search_songs_api(session: Session) -> Response:
+    """Songs matching `q` by title or artist, best matches first.
+
+    Pages are `limit` songs long, starting at `offset`. `next_offset` is
+    null on the last page.
+    """
+    search: str = request.args.get("q", "")
+    try:
+        offset = max(int(request.args.get("offset", 0)), 0)
+        limit = min(
+            int(request.args.get("limit", SEARCH_PAGE_SIZE)),
+            MAX_SEARCH_RESULTS,
         )
-    return render_template("songs.html", songs=songs_with_ratings, user=user)
+    except ValueError:
+        return Response(status=400)
+    if limit <= 0:
+        return Response(status=400)
+
+    # Fetch one extra row to know whether there's another page.
+    songs = search_songs(search, session, limit=limit + 1, offset=offset)
+    return jsonify(
+        {
+            "songs": [
+                {
+                    "id": song.id,
+                    "title": song.title,
+                    "artist": song.artist,
+                    "video_link": song.get_video_link(embed_yt_videos=False),
+                }
+                for song in songs[:limit]
+            ],
+            "next_offset": offset + limit if len(songs) > limit else None,
+        }
+    )
 
 
 @app.route("/songs-in-session")
@@ -217,21 +406,27 @@ def list_songs_in_session(session: Session) -> Response | str:
     if (karaoke_session := data.karaoke_session) is None:
         return Response(status=400)
 
-    session_songs = (
-        session.query(KaraokeSessionSong)
-        .filter_by(karaoke_session_id=karaoke_session.id)
-        .all()
-    )
+    if (
+        state := live_sessions.get(karaoke_session.display_id, session)
+    ) is None:
+        return Response(status=404)
+    songs_by_id: dict[int, Song] = {
+        song.id: song
+        for song in session.query(Song).filter(Song.id.in_(state.queue))
+    }
 
     songs = []
-    for song in session_songs:
+    for song_id in state.queue:
+        # Deleted since the session was loaded.
+        if (song := songs_by_id.get(song_id)) is None:
+            continue
         songs.append(
             {
-                "id": song.song.id,
-                "title": song.song.title,
-                "artist": song.song.artist,
-                "video_link": song.song.get_video_link(embed_yt_videos=False),
-                "played": song.played,
+                "id": song.id,
+                "title": song.title,
+                "artist": song.artist,
+                "video_link": song.get_video_link(embed_yt_videos=False),
+                "played": song_id in state.played,
             }
         )
 
@@ -292,55 +487,99 @@ def jsonify_song(song: Song, embed_yt_videos: bool) -> str:
 @app.route("/api/get-current-song")
 @with_db_session
 def get_current_song(session: Session) -> str:
-    data = RequestDbData.from_url_params(request.args, session=session)
-    if (karaoke_session := data.karaoke_session) is None:
+    session_id: str = request.args.get("s", "")
+    if (state := live_sessions.get(session_id, session)) is None:
         return Response(status=400)
 
-    if (
-        current_song := karaoke_session.get_current_song(session=session)
-    ) is None:
+    if (song_id := state.current_song_id) is None:
+        return no_song_playing()
+    if (song := session.get(Song, song_id)) is None:
+        # Deleted while playing.
         return no_song_playing()
 
-    return jsonify_song(current_song.song, embed_yt_videos=False)
+    return jsonify_song(song, embed_yt_videos=False)
+
+
+@app.route("/api/session-events")
+def get_session_events() -> Response:
+    session_id: str = request.args.get("s", "")
+    if session_id == "":
+        return Response(status=400)
+
+    try:
+        subscriber = session_events.subscribe(session_id)
+    except TooManyStreams:
+        # The pages poll for changes instead.
+        return Response(status=503)
+
+    response = Response(
+        session_events.stream(session_id, subscriber),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+    # In case the server closes the stream before it starts.
+    response.call_on_close(
+        lambda: session_events.unsubscribe(session_id, subscriber)
+    )
+    return response
+
+
+@app.route("/api/pick-trace")
+@with_db_session
+def get_pick_trace(session: Session) -> Response:
+    session_id: str = request.args.get("s", "")
+    if (state := live_sessions.get(session_id, session)) is None:
+        return Response(status=400)
+    if state.pick_traces is None:
+        return Response("Set KARAOKE_PICK_TRACE_SIZE to trace picks", 404)
+
+    with state.lock:
+        return jsonify([trace.as_dict() for trace in state.pick_traces])
 
 
 @app.route("/api/get-current-scores")
 @with_db_session
 def get_current_scores(session: Session) -> str:
-    data = RequestDbData.from_url_params(request.args, session=session)
-    if (karaoke_session := data.karaoke_session) is None:
+    session_id: str = request.args.get("s", "")
+    if (state := live_sessions.get(session_id, session)) is None:
         return Response(status=400)
 
+    user_names: dict[int, str] = dict(
+        session.query(User.id, User.name)
+        .filter(User.id.in_(state.members))
+        .all()
+    )
     scores: list[dict[str, Any]] = []
-    for user in karaoke_session.users:
+    for member in state.members.values():
         scores.append(
             {
-                "user_id": user.user_id,
-                "user_name": user.user.name,
-                "user_stepped_out": user.stepped_out,
-                "score": user.score,
+                "user_id": member.user_id,
+                "user_name": user_names[member.user_id],
+                "user_stepped_out": member.stepped_out,
+                "score": member.score,
             }
         )
 
     return json.dumps(scores)
 
 
+@app.route("/metrics")
+def get_metrics() -> Response:
+    return Response(metrics.render(), content_type=metrics.CONTENT_TYPE)
+
+
 @app.route("/api/mark-as-played-and-get-next")
 def mark_as_played_and_get_next() -> str:
-    def mark_song(
-        karaoke_session: KaraokeSession, *, session: Session
-    ) -> None:
-        karaoke_session.mark_current_song_as_played(session=session)
+    def mark_song(state: LiveSessionState) -> None:
+        state.mark_current_song_as_played()
 
     return next_video(mark_song, embed_yt_videos=True)
 
 
 @app.route("/next")
 def mark_as_played_and_redirect_to_next() -> str | Response:
-    def mark_song(
-        karaoke_session: KaraokeSession, *, session: Session
-    ) -> None:
-        karaoke_session.mark_current_song_as_played(session=session)
+    def mark_song(state: LiveSessionState) -> None:
+        state.mark_current_song_as_played()
 
     next_video(mark_song, embed_yt_videos=False)
     session_id: str = request.args.get("s", "")
@@ -354,12 +593,8 @@ def next_manual_song(session) -> str:
     if data.song is None or data.karaoke_session is None:
         return Response(status=400)
 
-    def mark_song(
-        karaoke_session: KaraokeSession, *, session: Session
-    ) -> None:
-        karaoke_session.replace_current_song(
-            song_id=data.song.id, session=session
-        )
+    def mark_song(state: LiveSessionState) -> None:
+        state.replace_current_song(song_id=data.song.id)
 
     next_video(mark_song, embed_yt_videos=False)
     return render_template(
@@ -369,20 +604,16 @@ def next_manual_song(session) -> str:
 
 @app.route("/api/snooze-and-get-next")
 def snooze_and_get_next() -> str:
-    def mark_song(
-        karaoke_session: KaraokeSession, *, session: Session
-    ) -> None:
-        karaoke_session.snooze_current_song(session=session)
+    def mark_song(state: LiveSessionState) -> None:
+        state.snooze_current_song()
 
     return next_video(mark_song, embed_yt_videos=True)
 
 
 @app.route("/snooze")
 def snooze() -> "BaseResponse":
-    def mark_song(
-        karaoke_session: KaraokeSession, *, session: Session
-    ) -> None:
-        karaoke_session.snooze_current_song(session=session)
+    def mark_song(state: LiveSessionState) -> None:
+        state.snooze_current_song()
 
     return redirect(
         json.loads(next_video(mark_song, embed_yt_videos=False)).get(
@@ -393,10 +624,8 @@ def snooze() -> "BaseResponse":
 
 @app.route("/api/skip-and-get-next")
 def skip_and_get_next() -> str:
-    def mark_song(
-        karaoke_session: KaraokeSession, *, session: Session
-    ) -> None:
-        karaoke_session.skip_current_song(session=session)
+    def mark_song(state: LiveSessionState) -> None:
+        state.skip_current_song()
 
     embed: bool = request.args.get("embed", True)
     if embed in (0, "0", "false", "False"):
@@ -406,10 +635,8 @@ def skip_and_get_next() -> str:
 
 @app.route("/skip")
 def skip() -> "BaseResponse":
-    def mark_song(
-        karaoke_session: KaraokeSession, *, session: Session
-    ) -> None:
-        karaoke_session.skip_current_song(session=session)
+    def mark_song(state: LiveSessionState) -> None:
+        state.skip_current_song()
 
     return redirect(
         json.loads(next_video(mark_song, embed_yt_videos=False)).get(
@@ -422,16 +649,40 @@ def skip() -> "BaseResponse":
 def next_video(
     mark_song: Callable, embed_yt_videos: bool, session: Session
 ) -> str:
-    data = RequestDbData.from_url_params(request.args, session=session)
-    if (karaoke_session := data.karaoke_session) is None:
-        return Response(status=400)
+    session_id: str = request.args.get("s", "")
+    # The song the caller is moving on from, empty if it has none. When the
+    # player and a phone both press "next", only the first press moves on;
+    # the other one gets the song that press picked. Without `current`, the
+    # press always moves on.
+    current: Optional[str] = request.args.get("current")
+    expected_song_id: Optional[int] = None
+    if current:
+        try:
+            expected_song_id = int(current)
+        except ValueError:
+            return Response(status=400)
 
-    mark_song(karaoke_session, session=session)
-    session.commit()
-    song: Optional[Song] = karaoke_session.get_next_song(session=session)
-    session.commit()
-    if song is None:
+    with live_sessions.transaction(session_id, session) as state:
+        if state is None:
+            return Response(status=400)
+        if current is not None and expected_song_id != state.current_song_id:
+            song_id: Optional[int] = state.current_song_id
+            changed = False
+        else:
+            mark_song(state)
+            song_id = state.get_next_song()
+            # Skip songs deleted since the session was loaded.
+            while song_id is not None and session.get(Song, song_id) is None:
+                state.skip_current_song()
+                song_id = state.get_next_song()
+            changed = True
+    if changed:
+        notify(session_id, SONG_CHANGED)
+    if song_id is None:
         return no_more_songs()
+    if (song := session.get(Song, song_id)) is None:
+        # Deleted after the other press picked it.
+        return no_song_playing()
 
     return jsonify_song(song, embed_yt_videos=embed_yt_videos)
 
@@ -450,14 +701,48 @@ def next_unrated_song(session: Session) -> Response:
     if song is None:
         return jsonify({"song_id": -1})
 
-    return jsonify(
-        {
-            "song_id": song.id,
-            "song_title": song.title,
-            "song_artist": song.artist,
-            "video_link": song.get_video_link(embed_yt_videos=True),
-        }
+    return jsonify(unrated_song_json(song))
+
+
+@app.route("/api/next-unrated-songs")
+@with_db_session
+def next_unrated_songs(session: Session) -> Response:
+    """The next `k` songs for the user to rate, best scoring first.
+
+    `exclude` is a comma-separated list of song IDs to skip: the ones the
+    page already has, including those whose ratings are still being sent.
+    """
+    data = RequestDbData.from_url_params(request.args, session=session)
+    if (user := data.user) is None:
+        return Response(status=400)
+
+    try:
+        count = min(int(request.args.get("k", 1)), MAX_UNRATED_SONGS)
+        exclude = [
+            int(song_id)
+            for song_id in request.args.get("exclude", "").split(",")
+            if song_id
+        ]
+    except ValueError:
+        return Response(status=400)
+
+    songs = (
+        get_unrated_songs(
+            user.id, session=session, limit=count, exclude=exclude
+        )
+        if count > 0
+        else []
     )
+    return jsonify({"songs": [unrated_song_json(song) for song in songs]})
+
+
+def unrated_song_json(song: Song) -> dict[str, Any]:
+    return {
+        "song_id": song.id,
+        "song_title": song.title,
+        "song_artist": song.artist,
+        "video_link": song.get_video_link(embed_yt_videos=True),
+    }
 
 
 @with_db_session
@@ -472,17 +757,13 @@ def set_step_out(
     if (user := data.user) is None:
         return Response(status=400)
 
-    user: Optional[KaraokeSessionUser] = (
-        session.query(KaraokeSessionUser)
-        .filter_by(user_id=user.id)
-        .filter_by(karaoke_session_id=karaoke_session.id)
-        .first()
-    )
-    if user is None:
-        return Response(status=400)
+    with live_sessions.transaction(
+        karaoke_session.display_id, session
+    ) as state:
+        if state is None or not state.set_stepped_out(user.id, step_out):
+            return Response(status=400)
 
-    user.stepped_out = step_out
-    session.commit()
+    notify(karaoke_session.display_id, SCORES_CHANGED)
     return Response(status=200)
 
 
@@ -511,7 +792,9 @@ def join_session(session: Session) -> Response:
     if (user := data.user) is None:
         return Response(status=400)
 
-    karaoke_session.add_user_to_session(user_id=user.id, session=session)
+    with live_sessions.evicting(karaoke_session.display_id):
+        karaoke_session.add_user_to_session(user_id=user.id, session=session)
+    notify(karaoke_session.display_id, MEMBERS_CHANGED)
     return Response(status=200)
 
 
@@ -528,10 +811,20 @@ def leave_session(session: Session) -> Response:
     if (user := data.user) is None:
         return Response(status=400)
 
-    karaoke_session.remove_user_from_session(user_id=user.id, session=session)
+    with live_sessions.evicting(karaoke_session.display_id):
+        karaoke_session.remove_user_from_session(
+            user_id=user.id, session=session
+        )
+    notify(karaoke_session.display_id, MEMBERS_CHANGED)
     return Response(status=200)
 
 
+def ratings_changed(user_id: int) -> None:
+    # The current song's ratings are sent along with the song.
+    for display_id in live_sessions.ratings_changed(user_id, SONG_CHANGED):
+        session_events.publish(display_id, SONG_CHANGED)
+
+
 @app.route("/api/rate-song", methods=["POST"])
 @with_db_session
 def rate_song(session: Session) -> Response:
@@ -545,9 +838,45 @@ def rate_song(session: Session) -> Response:
 
     # Delete any existing rating
     user.rate_song(song, rating, session=session)
+    ratings_changed(user.id)
     return Response(status=200)
 
 
+@app.route("/api/rate-songs", methods=["POST"])
+@with_db_session
+def rate_many_songs(session: Session) -> Response:
+    """Rate a batch of songs and get the next batch to rate.
+
+    Expects {"userId": ..., "ratings": [{"songId": ..., "rating": ...}],
+    "next": <number of unrated songs to return>}.
+    """
+    raw_data: dict[str, Any] = json.loads(request.data.decode("utf-8"))
+    data = RequestDbData.from_post_data(raw_data, session=session)
+    if (user := data.user) is None:
+        return Response(status=400)
+
+    try:
+        ratings: list[tuple[int, Rating]] = [
+            (int(rating["songId"]), Rating[rating["rating"]])
+            for rating in raw_data.get("ratings", [])
+        ]
+        next_count = min(int(raw_data.get("next", 0)), MAX_UNRATED_SONGS)
+        rate_songs(user.id, ratings, session=session)
+    except (KeyError, TypeError, ValueError):
+        session.rollback()
+        return Response(status=400)
+    session.commit()
+    if ratings:
+        ratings_changed(user.id)
+
+    songs = (
+        get_unrated_songs(user.id, session=session, limit=next_count)
+        if next_count > 0
+        else []
+    )
+    return jsonify({"songs": [unrated_song_json(song) for song in songs]})
+
+
 @app.route("/rate")
 def rate() -> Response | str:
     return render_template("rate.html")
@@ -555,17 +884,28 @@ def rate() -> Response | str:
 
 @app.route("/add-song")
 def add_song() -> Response | str:
-    engine = create_engine(LOCAL_DB)
-    with sessionmaker(bind=engine)() as session:
-        artists = [
-            result[0] for result in session.query(Song.artist).distinct().all()
-        ]
+    return render_template("add-song.html")
+
+
+@app.route("/api/artists")
+@with_db_session
+def complete_artist(session: Session) -> Response:
+    """Artists with a word starting with `q`, for autocompletion."""
+    prefix: str = request.args.get("q", "")
+    try:
+        limit = min(
+            int(request.args.get("limit", ARTIST_SUGGESTIONS)),
+            MAX_ARTIST_SUGGESTIONS,
+        )
+    except ValueError:
+        return Response(status=400)
 
-    return render_template("add-song.html", artists=artists)
+    return jsonify(artist_index.complete(prefix, session, limit=limit))
 
 
 @app.route("/api/add-song", methods=["POST"])
-def add_song_api() -> Response:
+@with_db_session
+def add_song_api(session: Session) -> Response:
     data: dict[str, str] = json.loads(request.data.decode("utf-8"))
     artist: Optional[str] = data.get("artist", None)
     title: Optional[str] = data.get("title", None)
@@ -573,24 +913,24 @@ def add_song_api() -> Response:
 
     print(f"Adding song: {artist} - {title} - {video_link}")
 
-    if None in (artist, title, video_link):
+    if artist is None or title is None or video_link is None:
         return Response(status=400)
 
-    engine = create_engine(LOCAL_DB)
-    with sessionmaker(bind=engine)() as session:
-        song: Song = Song(
-            artist=artist,
-            title=title,
-            video_link=video_link,
-        )
-        session.add(song)
-        session.commit()
+    song: Song = Song(
+        artist=artist,
+        title=title,
+        video_link=video_link,
+    )
+    session.add(song)
+    session.commit()
+    artist_index.add(artist)
 
     return Response(status=200)
 
 
 @app.route("/api/edit-song", methods=["POST"])
-def edit_song_api() -> Response:
+@with_db_session
+def edit_song_api(session: Session) -> Response:
     data: dict[str, str] = json.loads(request.data.decode("utf-8"))
     song_id: int = int(data.get("song_id", -1))
     artist: Optional[str] = data.get("artist", None)
@@ -599,27 +939,28 @@ def edit_song_api() -> Response:
 
     print(f"Editing song: {song_id} - {artist} - {title} - {video_link}")
 
-    if None in (artist, title, video_link):
+    if artist is None or title is None or video_link is None:
         return Response(status=400)
 
-    engine = create_engine(LOCAL_DB)
-    with sessionmaker(bind=engine)() as session:
-        song: Optional[Song] = (
-            session.query(Song).filter_by(id=song_id).first()
-        )
-        if song is None:
-            return Response(status=400)
+    song: Optional[Song] = session.query(Song).filter_by(id=song_id).first()
+    if song is None:
+        return Response(status=400)
 
-        song.artist = artist
-        song.title = title
-        song.video_link = video_link
-        session.commit()
+    old_artist = song.artist
+    song.artist = artist
+    song.title = title
+    song.video_link = video_link
+    session.commit()
+    if artist != old_artist:
+        artist_index.remove(old_artist)
+        artist_index.add(artist)
 
     return Response(status=200)
 
 
 @app.route("/api/delete-song", methods=["POST"])
-def delete_song_api() -> Response:
+@with_db_session
+def delete_song_api(session: Session) -> Response:
     data: dict[str, str] = json.loads(request.data.decode("utf-8"))
     song_id: int = int(data.get("song_id", -1))
 
@@ -628,19 +969,21 @@ def delete_song_api() -> Response:
     if song_id == -1:
         return Response(status=400)
 
-    engine = create_engine(LOCAL_DB)
-    with sessionmaker(bind=engine)() as session:
-        session.delete(session.query(Song).filter_by(id=song_id).first())
-        session.commit()
+    song: Optional[Song] = session.query(Song).filter_by(id=song_id).first()
+    if song is None:
+        return Response(status=400)
+    artist = song.artist
+    session.delete(song)
+    session.commit()
+    artist_index.remove(artist)
 
     return Response(status=200)
 
 
 @app.route("/start-session")
-def start_session() -> Response | str:
-    engine = create_engine(LOCAL_DB)
-    with sessionmaker(bind=engine)() as session:
-        users = session.query(User).all()
+@with_db_session
+def start_session(session: Session) -> Response | str:
+    users = session.query(User).all()
     return render_template("start-session.html", users=users)
 
 
@@ -651,21 +994,55 @@ def companion() -> Response | str:
 
 
 @app.route("/reset-ratings")
-def reset_ratings() -> Response | str:
+@with_db_session
+def reset_ratings(session: Session) -> Response | str:
     user_id: int = int(request.args.get("u", -1))
     if user_id == -1:
         return Response(status=400)
 
-    engine = create_engine(LOCAL_DB)
-    with sessionmaker(bind=engine)() as session:
-        session.query(UserSongRating).filter_by(user_id=user_id).delete()
-        session.commit()
+    rated_song_ids = [
+        row[0]
+        for row in session.query(UserSongRating.song_id)
+        .filter_by(user_id=user_id)
+        .all()
+    ]
+    session.query(UserSongRating).filter_by(user_id=user_id).delete()
+    refresh_rating_aggregates(rated_song_ids, session=session)
+    session.commit()
+    ratings_changed(user_id)
 
     return redirect("/rate")
 
 
 def start_server() -> None:
-    app.run(host="0.0.0.0", port=5000, debug=True)
+    """Serve the app with waitress, or Flask's dev server in debug mode.
+
+    Settings come from `karaoke.config.ServerConfig`. Other WSGI servers can
+    serve `karaoke.server:app` directly.
+    """
+    config = SERVER_CONFIG
+    if config.debug:
+        app.run(host=config.host, port=config.port, debug=True)
+        return
+
+    try:
+        import waitress
+    except ImportError:
+        raise SystemExit(
+            "Serving needs waitress (pip install waitress), or set"
+            " KARAOKE_DEBUG=1 to use the development server."
+        )
+    if config.threads < config.max_event_streams + MIN_FREE_THREADS:
+        raise SystemExit(
+            f"{config.threads} threads can't serve"
+            f" {config.max_event_streams} event streams and other requests:"
+            f" set KARAOKE_THREADS to at least"
+            f" {config.max_event_streams + MIN_FREE_THREADS}, or lower"
+            f" KARAOKE_MAX_EVENT_STREAMS."
+        )
+    waitress.serve(
+        app, host=config.host, port=config.port, threads=config.threads
+    )
 
 
 if __name__ == "__main__":
@@ -0,0 +1,168 @@
+import json
+from pathlib import Path
+from typing import Any, Iterator
+
+from flask.testing import FlaskClient
+from pytest import MonkeyPatch, fixture
+
+from karaoke import db
+from karaoke.benchmarks.synthetic import populate
+from karaoke.core.base import Base
+from karaoke.core.song import Song
+from karaoke.events import SessionEvents
+from karaoke.server import app, artist_index, live_sessions
+
+
+@fixture
+def client(tmp_path: Path) -> Iterator[FlaskClient]:
+    db.configure(f"sqlite:///{tmp_path / 'karaoke.sqlite'}")
+    Base.metadata.create_all(db.engine)
+    yield app.test_client()
+    for state in live_sessions.states():
+        live_sessions.evict(state.display_id)
+    artist_index.invalidate()
+    db.configure(db.DATABASE.url)
+
+
+def test_next_only_moves_on_once(client: FlaskClient) -> None:
+    with db.session_factory() as session:
+        user_ids = populate(session, users=4, songs=40, density=0.8)
+    session_id = client.post(
+        "/api/create-session", data=json.dumps({"user_ids": user_ids})
+    ).get_json(force=True)["session_id"]
+    next_url = f"/api/mark-as-played-and-get-next?s={session_id}"
+    first = client.get(next_url).get_json(force=True)["id"]
+
+    # The player and a phone both press "next" while `first` is playing.
+    second, again = (
+        client.get(f"{next_url}&current={first}").get_json(force=True)["id"]
+        for _ in range(2)
+    )
+
+    assert second != first
+    assert again == second
+    state = live_sessions.get(session_id, db.session_factory())
+    assert state is not None
+    assert state.played == {first}
+
+
+def test_start_only_picks_once(client: FlaskClient) -> None:
+    with db.session_factory() as session:
+        user_ids = populate(session, users=4, songs=40, density=0.8)
+    session_id = client.post(
+        "/api/create-session", data=json.dumps({"user_ids": user_ids})
+    ).get_json(force=True)["session_id"]
+    next_url = f"/api/mark-as-played-and-get-next?s={session_id}&current="
+
+    # Both pages press "next" before any song is playing.
+    first, again = (
+        client.get(next_url).get_json(force=True)["id"] for _ in range(2)
+    )
+
+    assert first != -1
+    assert again == first
+    state = live_sessions.get(session_id, db.session_factory())
+    assert state is not None
+    assert state.played == set()
+    assert state.played_count == 0
+    bad_current = f"/api/mark-as-played-and-get-next?s={session_id}&current=x"
+    assert client.get(bad_current).status_code == 400
+
+
+def test_next_unrated_songs_skip_excluded(client: FlaskClient) -> None:
+    with db.session_factory() as session:
+        user_id = populate(session, users=2, songs=40, density=0.5)[0]
+
+    def song_ids(query: str) -> list[int]:
+        response = client.get(f"/api/next-unrated-songs?u={user_id}&{query}")
+        return [song["song_id"] for song in response.get_json()["songs"]]
+
+    first = song_ids("k=4")
+    second = song_ids(f"k=4&exclude={','.join(map(str, first))}")
+
+    assert len(first) == len(second) == 4
+    assert first + second == song_ids("k=8")
+    bad_exclude = f"/api/next-unrated-songs?u={user_id}&exclude=x"
+    assert client.get(bad_exclude).status_code == 400
+
+
+def test_search_songs_pages(client: FlaskClient) -> None:
+    with db.session_factory() as session:
+        populate(session, users=2, songs=30, density=0.5)
+
+    def search(query: str) -> dict[str, Any]:
+        return client.get(f"/api/search-songs?q=song&{query}").get_json()
+
+    first = search("limit=2")
+    second = search(f"limit=2&offset={first['next_offset']}")
+
+    assert first["songs"] + second["songs"] == search("limit=4")["songs"]
+    assert len(search("offset=28")["songs"]) == 2
+    assert search("offset=28")["next_offset"] is None
+    assert client.get("/api/search-songs?limit=x").status_code == 400
+
+
+def test_artist_completion_follows_songs(client: FlaskClient) -> None:
+    def complete(prefix: str) -> list[str]:
+        return client.get(f"/api/artists?q={prefix}").get_json()
+
+    def post(path: str, **data: Any) -> None:
+        assert client.post(path, data=json.dumps(data)).status_code == 200
+
+    song = {"title": "Hey Jude", "video_link": "https://videos.example/1"}
+    post("/api/add-song", artist="The Beatles", **song)
+    assert complete("beat") == ["The Beatles"]
+
+    post("/api/add-song", artist="Beck", **song)
+    post("/api/edit-song", song_id=1, artist="Beyoncé", **song)
+    assert complete("be") == ["Beck", "Beyoncé"]
+
+    post("/api/delete-song", song_id=2)
+    assert complete("be") == ["Beyoncé"]
+
+
+def test_event_streams_are_capped(
+    client: FlaskClient, monkeypatch: MonkeyPatch
+) -> None:
+    monkeypatch.setattr(
+        "karaoke.server.session_events", SessionEvents(max_streams=1)
+    )
+    stream = client.get("/api/session-events?s=ABCD")
+
+    assert stream.status_code == 200
+    assert client.get("/api/session-events?s=ABCD").status_code == 503
+    stream.close()
+    assert client.get("/api/session-events?s=ABCD").status_code == 200
+
+
+def test_deleted_songs_are_skipped(client: FlaskClient) -> None:
+    with db.session_factory() as session:
+        user_ids = populate(session, users=4, songs=40, density=0.8)
+    session_id = client.post(
+        "/api/create-session", data=json.dumps({"user_ids": user_ids})
+    ).get_json(force=True)["session_id"]
+    next_url = f"/api/mark-as-played-and-get-next?s={session_id}"
+    first = client.get(next_url).get_json(force=True)["id"]
+    with db.session_factory() as session:
+        state = live_sessions.get(session_id, session)
+        assert state is not None
+        deleted = {first, *state.queue[::2]}
+        session.query(Song).filter(Song.id.in_(deleted)).delete()
+        session.commit()
+
+    current = client.get(f"/api/get-current-song?s={session_id}")
+    assert current.get_json(force=True)["id"] == -1
+    assert client.get(f"/songs-in-session?s={session_id}").status_code == 200
+    picks = []
+    while (song := client.get(next_url).get_json(force=True))["id"] != -1:
+        picks.append(song["id"])
+    assert picks
+    assert not deleted & set(picks)
+
+
+def test_songs_page_rejects_bad_cursor(client: FlaskClient) -> None:
+    with db.session_factory() as session:
+        user_id = populate(session, users=2, songs=10, density=0.5)[0]
+
+    assert client.get(f"/songs?u={user_id}&after=0").status_code == 200
+    assert client.get(f"/songs?u={user_id}&after=x").status_code == 400
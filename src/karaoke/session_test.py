@@ -1,26 +1,19 @@
 import logging
+from datetime import timedelta
 
 from karaoke.core.song import Song
 from karaoke.core.user import User
-from karaoke.core.base import Base
 from karaoke.core.rating import UserSongRating, Rating
 from karaoke.core.utils import create_karaoke_session
 from karaoke.core.session import (
     KaraokeSession,
     KaraokeSessionSong,
     KaraokeSessionUser,
+    SESSION_TTL,
+    utcnow,
 )
-from sqlalchemy import create_engine
-from sqlalchemy.orm import Session, sessionmaker
+from sqlalchemy.orm import Session
 from unittest.mock import patch, MagicMock
-from pytest import fixture
-
-
-@fixture
-def session() -> Session:
-    engine = create_engine("sqlite:///:memory:", echo=False)
-    Base.metadata.create_all(engine)
-    return sessionmaker(bind=engine)()
 
 
 def test_get_next_song(session: Session) -> None:
@@ -183,3 +176,82 @@ def test_session_song_queue(session: Session) -> None:
     )
 
     assert set(song.song_id for song in karaoke_session.songs) == {song1.id}
+
+
+def test_display_id_retries_taken_ids(session: Session) -> None:
+    taken = KaraokeSession(display_id="AAAA")
+    session.add(taken)
+    session.commit()
+
+    with patch(
+        "karaoke.core.session.generate_id", side_effect=["AAAA", "BBBB"]
+    ):
+        karaoke_session = create_karaoke_session([], session=session)
+
+    assert karaoke_session.display_id == "BBBB"
+    assert taken.display_id == "AAAA"
+
+
+def test_display_id_recycled_from_expired_session(session: Session) -> None:
+    expired = KaraokeSession(
+        display_id="AAAA",
+        created_at=utcnow() - SESSION_TTL - timedelta(minutes=1),
+    )
+    session.add(expired)
+    session.commit()
+
+    with patch("karaoke.core.session.generate_id", return_value="AAAA"):
+        karaoke_session = create_karaoke_session([], session=session)
+
+    assert karaoke_session.display_id == "AAAA"
+    session.refresh(expired)
+    assert expired.display_id is None
+
+
+def test_queue_follows_users_joining_and_leaving(session: Session) -> None:
+    users: list[User] = [
+        user1 := User(name="user1"),
+        user2 := User(name="user2"),
+        user3 := User(name="user3"),
+    ]
+    songs: list[Song] = [
+        song1 := Song(title="song1", artist="artist1", video_link="link1"),
+        song2 := Song(title="song2", artist="artist2", video_link="link2"),
+        song3 := Song(title="song3", artist="artist3", video_link="link3"),
+    ]
+    session.add_all([*users, *songs])
+    session.commit()
+
+    # Eligible no matter who of user1 and user2 are in the session.
+    rate_song(user1, song1, Rating.NEED_THE_MIC, session=session)
+    rate_song(user2, song1, Rating.CAN_TAKE_THE_MIC, session=session)
+    rate_song(user3, song1, Rating.SING_ALONG, session=session)
+    # Only eligible while user3 is in the session.
+    rate_song(user1, song2, Rating.CAN_TAKE_THE_MIC, session=session)
+    rate_song(user3, song2, Rating.SING_ALONG, session=session)
+    rate_song(user1, song3, Rating.CAN_TAKE_THE_MIC, session=session)
+    rate_song(user3, song3, Rating.SING_ALONG, session=session)
+
+    karaoke_session: KaraokeSession = create_karaoke_session(
+        [user1.id, user2.id], session=session
+    )
+    assert {song.song_id for song in karaoke_session.songs} == {song1.id}
+
+    karaoke_session.add_user_to_session(user3.id, session=session)
+    assert {song.song_id for song in karaoke_session.songs} == {
+        song1.id,
+        song2.id,
+        song3.id,
+    }
+
+    # Played songs stay in the queue.
+    played = session.get(KaraokeSessionSong, (karaoke_session.id, song3.id))
+    assert played is not None
+    played.played = True
+    session.commit()
+
+    karaoke_session.remove_user_from_session(user3.id, session=session)
+    assert {song.song_id for song in karaoke_session.songs} == {
+        song1.id,
+        song3.id,
+    }
@@ -155,6 +155,42 @@ function getCurrentScores(session_display_id) {
         .then(response => response.json());
 }
 
+// Milliseconds between polls when the server has no room for our stream.
+const SESSION_POLL_INTERVAL = 5000;
+// Polls before asking for a stream again.
+const SESSION_POLLS_PER_RETRY = 12;
+
+// Call onSongChanged / onScoresChanged when the session changes. Both are
+// also called whenever the stream (re)connects, since events may have been
+// missed in between.
+function subscribeToSessionEvents(session_display_id, onSongChanged, onScoresChanged) {
+    let events = new EventSource(`/api/session-events?s=${session_display_id}`);
+    events.addEventListener('open', onSongChanged);
+    events.addEventListener('song-changed', onSongChanged);
+    events.addEventListener('scores-changed', onScoresChanged);
+    events.addEventListener('members-changed', onScoresChanged);
+    events.addEventListener('error', () => {
+        // Browsers reconnect dropped streams by themselves, but give up on
+        // refused ones, e.g. when the server has too many open.
+        if (events.readyState === EventSource.CLOSED) {
+            pollSessionChanges(session_display_id, onSongChanged, onScoresChanged, 0);
+        }
+    });
+    return events;
+}
+
+function pollSessionChanges(session_display_id, onSongChanged, onScoresChanged, polls) {
+    if (polls === SESSION_POLLS_PER_RETRY) {
+        subscribeToSessionEvents(session_display_id, onSongChanged, onScoresChanged);
+        return;
+    }
+    setTimeout(() => {
+        onSongChanged();
+        onScoresChanged();
+        pollSessionChanges(session_display_id, onSongChanged, onScoresChanged, polls + 1);
+    }, SESSION_POLL_INTERVAL);
+}
+
 function getVideoEmbedInnerHtml(video_link, autoplay = false) {
     let autoplay_int = autoplay ? 1 : 0;
     return `<iframe width="100%" height="100%" src="${video_link}?autoplay=${autoplay}" frameborder="0" allowfullscreen allow="autoplay"></iframe>`;